@@ -1,15 +1,31 @@
 from app.models import BaseModel
+from app.registry import get_service
+from app.health_monitor import get_health_monitor
+from app.models.resilience import get_resilience
 
 class BaseController:
     """Базовый контроллер для всех контроллеров."""
     
     def __init__(self):
-        self.base_model = BaseModel()
+        self.base_model = get_service(BaseModel)
     
     def check_permify_status(self):
         """Проверяет статус сервера Permify."""
         return self.base_model.check_permify_status()
     
+    def get_permify_status(self):
+        """Возвращает статус Permify по результатам фоновых проверок, без запроса к серверу."""
+        status = get_health_monitor().get_status()
+        return bool(status["status"]), status["message"]
+    
+    def get_health_snapshot(self):
+        """Возвращает состояние Permify (REST и gRPC), Redis и автомата отказов."""
+        return get_health_monitor().snapshot()
+    
+    def get_resilience_metrics(self):
+        """Возвращает счетчики повторов, сроков и состояние автомата отказов запросов к Permify."""
+        return get_resilience(self.base_model.permify_host).metrics()
+    
     def make_api_request(self, endpoint, data, method="post"):
         """Выполняет API запрос к Permify через BaseModel."""
         return self.base_model.make_api_request(endpoint, data, method) 
\ No newline at end of file
@@ -1,47 +1,114 @@
 from .base_controller import BaseController
-from app.models import GroupModel
+from app.models import GroupModel, SchemaModel
+from app.registry import get_service
+from .read_cache import cached_read, invalidates_reads
+from .redis_controller import RedisController
 
 class GroupController(BaseController):
     """Контроллер для управления группами в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.group_model = GroupModel()
+        self.group_model = get_service(GroupModel)
+        self.schema_model = get_service(SchemaModel)
+        self.redis_controller = get_service(RedisController)
     
+    def _entity_actions(self, entity_types, tenant_id=None):
+        """Возвращает действия и отношения типов сущностей из скомпилированной схемы."""
+        success, compiled = self.schema_model.get_compiled_schema(tenant_id)
+        if not success:
+            return {}
+        return {entity_type: compiled.permissions(entity_type) + compiled.relations(entity_type)
+                for entity_type in entity_types if entity_type in compiled.entities}
+    
+    def invalidate_group_members(self, group_id, entities, tenant_id=None, members=None):
+        """Сбрасывает кэш решений всех участников группы для затронутых сущностей.
+        
+        Участники берутся из индекса отношений (или передаются, если группа уже удалена),
+        очистка выполняется одним конвейером для всех пользователей и сущностей.
+        """
+        if members is None:
+            members = self.group_model.relationship_model.get_group_members(group_id, tenant_id)
+        if not members or not entities:
+            return True, "Нет ключей для очистки"
+        
+        actions_by_type = self._entity_actions({entity_type for entity_type, _ in entities}, tenant_id)
+        return self.redis_controller.flush_users_on_entities(members, entities, actions_by_type)
+    
+    @cached_read("groups")
     def get_groups(self, tenant_id=None):
         """Получает список групп на основе связей в системе."""
         groups_dict = self.group_model.get_groups(tenant_id)
         # Преобразуем словарь в список для совместимости с представлением
         return list(groups_dict.values()) if isinstance(groups_dict, dict) else groups_dict
     
+    @invalidates_reads
     def create_group(self, group_id, name, tenant_id=None):
         """Создает новую группу."""
         return self.group_model.create_group(group_id, name, tenant_id)
     
+    @invalidates_reads
     def add_user_to_group(self, group_id, user_id, tenant_id=None):
         """Добавляет пользователя в группу."""
-        return self.group_model.add_user_to_group(group_id, user_id, tenant_id)
+        success, message = self.group_model.add_user_to_group(group_id, user_id, tenant_id)
+        if success:
+            # Сбрасываем кэш для пользователя при изменении его групп
+            self.redis_controller.flush_user_permissions(user_id)
+        return success, message
     
+    @invalidates_reads
     def remove_user_from_group(self, group_id, user_id, tenant_id=None):
         """Удаляет пользователя из группы."""
-        return self.group_model.remove_user_from_group(group_id, user_id, tenant_id)
+        success, message = self.group_model.remove_user_from_group(group_id, user_id, tenant_id)
+        if success:
+            # Сбрасываем кэш для пользователя при изменении его групп
+            self.redis_controller.flush_user_permissions(user_id)
+        return success, message
     
+    @invalidates_reads
     def assign_role_to_group(self, group_id, app_name, app_id, role, tenant_id=None):
         """Назначает роль (право) группе для приложения."""
-        return self.group_model.assign_role_to_group(group_id, app_name, app_id, role, tenant_id)
+        success, message = self.group_model.assign_role_to_group(group_id, app_name, app_id, role, tenant_id)
+        if success:
+            # Роль группы меняет решения всех ее участников по приложению
+            self.invalidate_group_members(group_id, [(app_name, app_id)], tenant_id)
+        return success, message
     
+    @invalidates_reads
     def remove_group_from_app(self, group_id, app_name, app_id, role, tenant_id=None):
         """Удаляет группу из приложения."""
-        return self.group_model.remove_group_from_app(group_id, app_name, app_id, role, tenant_id)
+        success, message = self.group_model.remove_group_from_app(group_id, app_name, app_id, role, tenant_id)
+        if success:
+            self.invalidate_group_members(group_id, [(app_name, app_id)], tenant_id)
+        return success, message
     
+    @invalidates_reads
     def remove_role_from_group(self, group_id, app_type, app_id, role, tenant_id=None):
         """Удаляет роль группы из приложения."""
-        return self.group_model.remove_role_from_group(group_id, app_type, app_id, role, tenant_id)
+        success, message = self.group_model.remove_role_from_group(group_id, app_type, app_id, role, tenant_id)
+        if success:
+            self.invalidate_group_members(group_id, [(app_type, app_id)], tenant_id)
+        return success, message
     
+    @invalidates_reads
     def delete_group(self, group_id, tenant_id=None):
         """Удаляет группу и все её отношения в системе."""
-        return self.group_model.delete_group_with_relations(group_id, tenant_id)
+        # Участников и сущности группы запоминаем до удаления ее отношений
+        relationship_model = self.group_model.relationship_model
+        members = relationship_model.get_group_members(group_id, tenant_id)
+        entities = relationship_model.get_group_entities(group_id, tenant_id) + [("group", group_id)]
+        
+        success, message = self.group_model.delete_group_with_relations(group_id, tenant_id)
+        if success:
+            self.invalidate_group_members(group_id, entities, tenant_id, members)
+        return success, message
     
+    @invalidates_reads
     def assign_multiple_roles_to_group(self, group_id, app_name, app_id, roles, tenant_id=None):
         """Назначает несколько ролей группе для приложения."""
-        return self.group_model.assign_multiple_roles_to_group(group_id, app_name, app_id, roles, tenant_id) 
\ No newline at end of file
+        success_count, error_count, errors = self.group_model.assign_multiple_roles_to_group(
+            group_id, app_name, app_id, roles, tenant_id)
+        if success_count:
+            # Один сброс кэша участников на все назначенные роли
+            self.invalidate_group_members(group_id, [(app_name, app_id)], tenant_id)
+        return success_count, error_count, errors 
\ No newline at end of file
@@ -0,0 +1,125 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Callable, Optional
+
+from app.models.resilience import request_budget
+from app.models.unit_of_work import unit_of_work
+
+
+class PrefetchResult:
+    """Результаты параллельной загрузки: значения успешных загрузок и причины остальных."""
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        # имя -> описание ошибки или превышения срока
+        self.failed: Dict[str, str] = {}
+        # имя -> длительность загрузки в секундах (для незавершенных - время ожидания)
+        self.durations: Dict[str, float] = {}
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Возвращает значение загрузки или default, если она не успела или завершилась ошибкой."""
+        return self.values.get(name, default)
+
+    def ok(self, name: str) -> bool:
+        return name in self.values
+
+
+class Prefetcher:
+    """Параллельная загрузка независимых данных для представлений.
+
+    Каждая загрузка выполняется в общем пуле потоков (PERMIFY_PREFETCH_WORKERS) со своим
+    сроком ожидания (по умолчанию PERMIFY_PREFETCH_TIMEOUT секунд). Загрузки стартуют
+    одновременно, поэтому время ожидания определяется самой медленной из них, а не суммой.
+    Не успевшая загрузка продолжает выполняться в фоне, но ее результат отбрасывается,
+    и представление отображает остальные данные.
+
+    Срок загрузки действует и как бюджет ее запросов (request_budget): после срока
+    чтения Permify прерываются, и брошенная загрузка освобождает поток примерно через
+    свой срок, а не через время ответа медленного сервера. Пул общий для всех сессий,
+    поэтому его размер рассчитан на несколько одновременных прогонов страниц
+    (по умолчанию 16 потоков - около четырех страниц по 3-4 загрузки).
+
+    Загрузки выполняются в копии контекста вызывающего потока (бюджет времени запросов
+    общий), но каждая - в своей единице работы: единица работы вызывающего кода не
+    используется из нескольких потоков и не зависит от загрузок, которые не успели
+    завершиться. Передавать сюда следует только читающие вызовы контроллеров
+    (без обращений к Streamlit).
+    """
+
+    def __init__(self, max_workers: int = None, timeout: float = None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("PERMIFY_PREFETCH_WORKERS", 16))
+        if timeout is None:
+            timeout = float(os.environ.get("PERMIFY_PREFETCH_TIMEOUT", 5))
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+
+    def load(self, loads: Dict[str, Callable[[], Any]], timeout: float = None,
+             timeouts: Dict[str, float] = None) -> PrefetchResult:
+        """Выполняет загрузки параллельно и ждет каждую не дольше ее срока.
+
+        loads - имя -> функция без аргументов; timeouts - сроки отдельных загрузок.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        timeouts = timeouts or {}
+        result = PrefetchResult()
+
+        started = time.monotonic()
+        futures = {}
+        for name, loader in loads.items():
+            context = contextvars.copy_context()
+            futures[name] = self._executor.submit(self._timed, context, loader, timeouts.get(name, timeout))
+
+        # Ждем в порядке сроков: общее ожидание не превышает наибольшего срока
+        deadlines = {name: started + timeouts.get(name, timeout) for name in futures}
+        for name in sorted(futures, key=deadlines.get):
+            try:
+                value, duration = futures[name].result(timeout=max(0.0, deadlines[name] - time.monotonic()))
+                result.values[name] = value
+                result.durations[name] = duration
+            except FutureTimeoutError:
+                result.failed[name] = f"не получено за {timeouts.get(name, timeout):g} с"
+                result.durations[name] = round(time.monotonic() - started, 3)
+            except Exception as e:
+                result.failed[name] = str(e)
+                result.durations[name] = round(time.monotonic() - started, 3)
+
+        if result.failed:
+            print(f"DEBUG: Параллельная загрузка не завершена: {result.failed}")
+        return result
+
+    @staticmethod
+    def _timed(context: contextvars.Context, loader: Callable[[], Any], timeout: float):
+        started = time.monotonic()
+        value = context.run(Prefetcher._run_isolated, loader, timeout)
+        return value, round(time.monotonic() - started, 3)
+
+    @staticmethod
+    def _run_isolated(loader: Callable[[], Any], timeout: float) -> Any:
+        # Срок отсчитывается от старта в потоке: ожидание в очереди пула уже учтено вызывающим
+        with request_budget(timeout), unit_of_work(isolated=True):
+            return loader()
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """Возвращает общий для процесса пул параллельной загрузки."""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher()
+    return _prefetcher
+
+
+def prefetch(loads: Dict[str, Callable[[], Any]], timeout: float = None,
+             timeouts: Dict[str, float] = None) -> PrefetchResult:
+    """Параллельно выполняет независимые загрузки (см. Prefetcher.load)."""
+    return get_prefetcher().load(loads, timeout, timeouts)
@@ -0,0 +1,117 @@
+import copy
+import functools
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+from app.models.storage import get_storage
+from app.models.unit_of_work import current_unit_of_work
+
+# Коллекции, от которых зависят списки приложений, пользователей и групп
+DATA_COLLECTIONS = ("apps", "users", "groups", "relationships")
+
+
+class ReadCache:
+    """Кэш результатов get_apps / get_users / get_groups для представлений.
+
+    Запись действительна, пока не изменились:
+    - счетчик поколений данных (увеличивается каждым изменяющим методом контроллера);
+    - признаки версий коллекций в хранилище (изменения из других процессов и фоновых потоков);
+    - и пока не истек PERMIFY_READ_CACHE_TTL (страховка от изменений схемы извне).
+    Возвращаются глубокие копии, поэтому представления могут изменять результат.
+    Пока в активной единице работы есть незаписанные изменения, кэш не используется:
+    такие чтения видят данные, которых еще нет в хранилище.
+    """
+
+    def __init__(self, ttl: float = None):
+        if ttl is None:
+            ttl = float(os.environ.get("PERMIFY_READ_CACHE_TTL", 30))
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+        # (имя, tenant_id, аргументы) -> (поколение, признак хранилища, время, значение)
+        self._entries: Dict[Hashable, Tuple[int, Any, float, Any]] = {}
+
+    def _storage_signature(self) -> Tuple[Any, ...]:
+        storage = get_storage()
+        return tuple(storage.signature(collection) for collection in DATA_COLLECTIONS)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Возвращает закэшированное значение или загружает его заново."""
+        uow = current_unit_of_work()
+        if self.ttl <= 0 or (uow is not None and uow.has_pending()):
+            return loader()
+
+        with self.lock:
+            generation = self.generation
+        signature = self._storage_signature()
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[0] == generation and entry[1] == signature
+                    and now - entry[2] <= self.ttl):
+                self.hits += 1
+                return copy.deepcopy(entry[3])
+            self.misses += 1
+
+        value = loader()
+
+        with self.lock:
+            # Если за время загрузки данные изменились, результат не сохраняем
+            if self.generation == generation:
+                self._entries[key] = (generation, self._storage_signature(), now, copy.deepcopy(value))
+        return value
+
+    def bump(self):
+        """Увеличивает поколение данных: все закэшированные чтения становятся недействительными."""
+        with self.lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"generation": self.generation, "entries": len(self._entries),
+                    "hits": self.hits, "misses": self.misses}
+
+
+_read_cache: Optional[ReadCache] = None
+_read_cache_lock = threading.Lock()
+
+
+def get_read_cache() -> ReadCache:
+    """Возвращает общий для процесса кэш чтений."""
+    global _read_cache
+    if _read_cache is None:
+        with _read_cache_lock:
+            if _read_cache is None:
+                _read_cache = ReadCache()
+    return _read_cache
+
+
+def cached_read(name: str):
+    """Декоратор для читающего метода контроллера с аргументами (tenant_id, ...)."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return get_read_cache().get(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def invalidates_reads(method):
+    """Декоратор для изменяющего метода контроллера: сбрасывает кэш чтений до и после вызова."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        cache = get_read_cache()
+        cache.bump()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            cache.bump()
+    return wrapper
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+
+class RedisConnection:
+    """Общий для процесса пул соединений Redis с ленивым подключением.
+
+    Клиент создается без проверки соединения: первое подключение выполняется при первой
+    команде. Если Redis недоступен, после ошибки соединения клиент не выдается в течение
+    окна ожидания, которое растет экспоненциально (от REDIS_RECONNECT_MIN_BACKOFF до
+    REDIS_RECONNECT_MAX_BACKOFF секунд), поэтому перезапуски страницы не ждут таймаут
+    сокета при каждом обращении. Простаивающие соединения проверяются PING раз в
+    REDIS_HEALTH_CHECK_INTERVAL секунд.
+    """
+
+    def __init__(self, host: str, port: int, db: int, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.max_connections = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+        self.socket_timeout = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 2.0))
+        self.connect_timeout = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 1.0))
+        self.health_check_interval = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+        self.min_backoff = float(os.environ.get("REDIS_RECONNECT_MIN_BACKOFF", 1.0))
+        self.max_backoff = float(os.environ.get("REDIS_RECONNECT_MAX_BACKOFF", 30.0))
+        self.lock = threading.Lock()
+
+        self.pool = redis.ConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            password=password,
+            decode_responses=True,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.connect_timeout,
+            health_check_interval=self.health_check_interval,
+            max_connections=self.max_connections,
+            # Короткие повторы внутри одной команды; длительная недоступность обрабатывается
+            # окном ожидания. Параметры повторов задаются пулу: клиент с connection_pool их игнорирует
+            retry=Retry(ExponentialBackoff(cap=0.5, base=0.05), 2),
+            retry_on_error=[redis.ConnectionError, redis.TimeoutError]
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+
+        self.failures = 0
+        self.unavailable_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def get_client(self) -> Optional[redis.Redis]:
+        """Возвращает клиент или None, если после ошибки еще не истекло окно ожидания."""
+        if time.monotonic() < self.unavailable_until:
+            return None
+        return self.client
+
+    def report_failure(self, error: Exception):
+        """Учитывает ошибку соединения и откладывает следующую попытку."""
+        with self.lock:
+            self.failures += 1
+            backoff = min(self.max_backoff, self.min_backoff * (2 ** (self.failures - 1)))
+            self.unavailable_until = time.monotonic() + backoff
+            self.last_error = str(error)
+        # Сбрасываем соединения пула, чтобы после паузы подключиться заново
+        self.pool.disconnect(inuse_connections=False)
+        print(f"Ошибка подключения к Redis: {str(error)}; повтор через {backoff:.1f} с")
+
+    def report_success(self):
+        """Сбрасывает счетчик ошибок после успешной команды."""
+        if self.failures:
+            with self.lock:
+                self.failures = 0
+                self.unavailable_until = 0.0
+                self.last_error = None
+
+    def status(self) -> Dict[str, Any]:
+        """Возвращает состояние подключения и пула."""
+        return {
+            "failures": self.failures,
+            "retry_in": max(0.0, round(self.unavailable_until - time.monotonic(), 1)),
+            "last_error": self.last_error,
+            "max_connections": self.max_connections,
+            "health_check_interval": self.health_check_interval
+        }
+
+
+_connections: Dict[Tuple[str, int, int], RedisConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def get_redis_connection(host: str, port: int, db: int, password: Optional[str] = None) -> RedisConnection:
+    """Возвращает общий для процесса пул соединений для указанного сервера и базы Redis."""
+    key = (host, port, db)
+    connection = _connections.get(key)
+    if connection is not None:
+        return connection
+
+    with _connections_lock:
+        connection = _connections.get(key)
+        if connection is None:
+            connection = RedisConnection(host, port, db, password)
+            _connections[key] = connection
+        return connection
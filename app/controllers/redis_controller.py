@@ -1,6 +1,42 @@
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import redis
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Callable, Optional, List, Tuple, Dict, Any
+
+from app.registry import get_service
+from .redis_connection import get_redis_connection
+
+# Префиксы индексных множеств: permidx|e|{entity_type}:{entity_id} и permidx|u|{user_id}
+INDEX_PREFIX = "permidx|"
+ENTITY_INDEX_PREFIX = INDEX_PREFIX + "e|"
+USER_INDEX_PREFIX = INDEX_PREFIX + "u|"
+
+
+def permission_key(user_id: str, action: str, entity_type: str, entity_id: str) -> str:
+    """Возвращает ключ кэшированного решения: {user_id}:{action}:{entity_type}:{entity_id}."""
+    return f"{user_id}:{action}:{entity_type}:{entity_id}"
+
+
+def parse_permission_key(key: str) -> Optional[Tuple[str, str, str, str]]:
+    """Разбирает ключ решения на (user_id, action, entity_type, entity_id) или возвращает None."""
+    if key.startswith(INDEX_PREFIX):
+        return None
+    parts = key.rsplit(":", 3)
+    if len(parts) != 4 or not all(parts):
+        return None
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def entity_index_key(entity_type: str, entity_id: str) -> str:
+    return f"{ENTITY_INDEX_PREFIX}{entity_type}:{entity_id}"
+
+
+def user_index_key(user_id: str) -> str:
+    return f"{USER_INDEX_PREFIX}{user_id}"
+
 
 class RedisController:
     """Контроллер для управления Redis-кэшем."""
@@ -11,27 +47,35 @@ class RedisController:
         self.redis_port = int(os.environ.get("REDIS_PORT", 6379))
         self.redis_db = int(os.environ.get("REDIS_DB", 0))
         self.redis_password = os.environ.get("REDIS_PASSWORD", None)
+        # Размер страницы SCAN и число ключей в одной команде UNLINK
+        self.scan_count = int(os.environ.get("REDIS_SCAN_COUNT", 1000))
+        self.delete_batch_size = int(os.environ.get("REDIS_DELETE_BATCH", 500))
+        self._use_unlink = True
+        # Статистика кэша: размер случайной выборки ключей и ограничение времени на ее сбор
+        self.stats_sample_size = int(os.environ.get("REDIS_STATS_SAMPLE_SIZE", 500))
+        self.stats_time_budget = float(os.environ.get("REDIS_STATS_TIME_BUDGET", 1.0))
+        self.stats_top_prefixes = 10
+        # Индексация ключей решений в множествах по сущности и пользователю (см. index_permission_keys)
+        self.key_indexing = os.environ.get("REDIS_KEY_INDEXING", "false").lower() in ("1", "true", "yes")
         
-        self.redis_client = self._connect_to_redis()
+        # Фоновые очистки кэша (wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="redis-flush")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._jobs_lock = threading.Lock()
         
-    def _connect_to_redis(self) -> Optional[redis.Redis]:
-        """Создает подключение к Redis."""
-        try:
-            client = redis.Redis(
-                host=self.redis_host,
-                port=self.redis_port,
-                db=self.redis_db,
-                password=self.redis_password,
-                decode_responses=True,
-                socket_timeout=2.0
-            )
-            # Проверка соединения
-            client.ping()
-            return client
-        except Exception as e:
-            print(f"Ошибка подключения к Redis: {str(e)}")
-            return None
-            
+        # Общий для процесса пул соединений; подключение выполняется лениво при первой команде
+        self.connection = get_redis_connection(self.redis_host, self.redis_port, self.redis_db, self.redis_password)
+    
+    @property
+    def redis_client(self) -> Optional[redis.Redis]:
+        """Возвращает клиент Redis или None, пока действует пауза после ошибки соединения."""
+        return self.connection.get_client()
+    
+    def _report_error(self, error: Exception):
+        """Сообщает пулу об ошибке соединения, чтобы следующие обращения не ждали таймаут."""
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            self.connection.report_failure(error)
+    
     def flush_cache(self) -> Tuple[bool, str]:
         """Очищает весь кэш Redis."""
         try:
@@ -41,88 +85,580 @@ class RedisController:
             else:
                 return False, "Нет подключения к Redis"
         except Exception as e:
+            self._report_error(e)
             return False, f"Ошибка при очистке кэша: {str(e)}"
     
-    def flush_user_permissions(self, user_id: str) -> Tuple[bool, str]:
+    def _unlink_keys(self, client: redis.Redis, keys: List[str], extra: Callable[[Any], None] = None) -> int:
+        """Удаляет ключи одним конвейером по REDIS_DELETE_BATCH ключей в команде; возвращает число удаленных.
+        
+        extra(pipe) позволяет добавить в тот же конвейер дополнительные команды (например, SREM).
+        """
+        for attempt in range(2):
+            pipe = client.pipeline(transaction=False)
+            commands = 0
+            for i in range(0, len(keys), self.delete_batch_size):
+                chunk = keys[i:i + self.delete_batch_size]
+                if self._use_unlink:
+                    pipe.unlink(*chunk)
+                else:
+                    pipe.delete(*chunk)
+                commands += 1
+            if extra:
+                extra(pipe)
+            try:
+                return sum(pipe.execute()[:commands])
+            except redis.ResponseError as e:
+                # Redis < 4.0 не поддерживает UNLINK
+                if not self._use_unlink or "unknown command" not in str(e).lower():
+                    raise
+                self._use_unlink = False
+        return 0
+    
+    def delete_by_pattern(self, pattern: str, progress_callback: Callable[[int, int], None] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Удаляет ключи по шаблону пакетами.
+        
+        Ключи выбираются через SCAN с большим COUNT и удаляются командой UNLINK (память
+        освобождается в фоне на стороне Redis), по REDIS_DELETE_BATCH ключей в одной команде,
+        все команды страницы SCAN отправляются одним конвейером. progress_callback(удалено,
+        просмотрено страниц) вызывается после каждой страницы.
+        """
+        client = self.redis_client
+        if not client:
+            return False, {"error": "Нет подключения к Redis"}
+        
+        deleted = 0
+        pages = 0
+        cursor = 0
+        started = time.monotonic()
+        while True:
+            cursor, keys = client.scan(cursor=cursor, match=pattern, count=self.scan_count)
+            pages += 1
+            if keys:
+                deleted += self._unlink_keys(client, keys)
+            if progress_callback:
+                progress_callback(deleted, pages)
+            if cursor == 0:
+                break
+        self.connection.report_success()
+        
+        return True, {
+            "pattern": pattern,
+            "deleted": deleted,
+            "scan_pages": pages,
+            "duration": round(time.monotonic() - started, 3)
+        }
+    
+    def index_permission_keys(self, keys: List[str], pipe=None) -> int:
+        """Регистрирует ключи решений в индексах сущностей и пользователей.
+        
+        Вызывается теми, кто пишет решения в кэш, если включен REDIS_KEY_INDEXING. Если передан
+        конвейер, команды добавляются в него (запись решения и индекса уходят одним запросом).
+        Возвращает число зарегистрированных ключей.
+        """
+        own_pipe = pipe is None
+        if own_pipe:
+            client = self.redis_client
+            if not client:
+                return 0
+            pipe = client.pipeline(transaction=False)
+        
+        indexed = 0
+        for key in keys:
+            parsed = parse_permission_key(key)
+            if parsed is None:
+                continue
+            user_id, _, entity_type, entity_id = parsed
+            pipe.sadd(entity_index_key(entity_type, entity_id), key)
+            pipe.sadd(user_index_key(user_id), key)
+            indexed += 1
+        
+        if own_pipe and indexed:
+            pipe.execute()
+        return indexed
+    
+    def cache_permission(self, user_id: str, action: str, entity_type: str, entity_id: str,
+                         value: Any, ttl: int = None) -> bool:
+        """Записывает решение в кэш и, если включена индексация, регистрирует его в индексах."""
+        client = self.redis_client
+        if not client:
+            return False
+        
+        key = permission_key(user_id, action, entity_type, entity_id)
+        pipe = client.pipeline(transaction=False)
+        pipe.set(key, value, ex=ttl)
+        if self.key_indexing:
+            self.index_permission_keys([key], pipe)
+        pipe.execute()
+        return True
+    
+    def delete_indexed(self, index_key: str, progress_callback: Callable[[int, int], None] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Удаляет ключи, зарегистрированные в индексном множестве, и их записи в индексах.
+        
+        Стоимость пропорциональна числу ключей сущности (пользователя), а не размеру кэша.
+        Удаленные ключи вычищаются из этого множества (по мере обхода, а не целиком: ключи,
+        зарегистрированные во время обхода, сохраняются) и из встречного индекса.
+        """
+        client = self.redis_client
+        if not client:
+            return False, {"error": "Нет подключения к Redis"}
+        
+        deleted = 0
+        pages = 0
+        cursor = 0
+        started = time.monotonic()
+        while True:
+            cursor, keys = client.sscan(index_key, cursor=cursor, count=self.scan_count)
+            pages += 1
+            if keys:
+                def remove_from_indexes(pipe, keys=keys):
+                    pipe.srem(index_key, *keys)
+                    for key in keys:
+                        parsed = parse_permission_key(key)
+                        if parsed is None:
+                            continue
+                        other = (user_index_key(parsed[0]) if index_key.startswith(ENTITY_INDEX_PREFIX)
+                                 else entity_index_key(parsed[2], parsed[3]))
+                        pipe.srem(other, key)
+                deleted += self._unlink_keys(client, keys, remove_from_indexes)
+            if progress_callback:
+                progress_callback(deleted, pages)
+            if cursor == 0:
+                break
+        self.connection.report_success()
+        
+        return True, {
+            "pattern": index_key,
+            "deleted": deleted,
+            "scan_pages": pages,
+            "duration": round(time.monotonic() - started, 3)
+        }
+    
+    def backfill_key_index(self, progress_callback: Callable[[int, int], None] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Регистрирует в индексах все уже существующие ключи решений (миграция на индексацию)."""
+        client = self.redis_client
+        if not client:
+            return False, {"error": "Нет подключения к Redis"}
+        
+        indexed = 0
+        pages = 0
+        cursor = 0
+        started = time.monotonic()
+        while True:
+            cursor, keys = client.scan(cursor=cursor, match="*:*:*:*", count=self.scan_count)
+            pages += 1
+            if keys:
+                pipe = client.pipeline(transaction=False)
+                indexed += self.index_permission_keys(keys, pipe)
+                pipe.execute()
+            if progress_callback:
+                progress_callback(indexed, pages)
+            if cursor == 0:
+                break
+        
+        return True, {
+            "indexed": indexed,
+            "scan_pages": pages,
+            "duration": round(time.monotonic() - started, 3)
+        }
+    
+    def delete_schema_changes(self, changes: Dict[str, List[str]],
+                              progress_callback: Callable[[int, int], None] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Удаляет решения только для пар {action}:{entity_type}, правила которых изменились.
+        
+        changes - результат diff_schemas: тип сущности -> измененные разрешения и отношения.
+        Для каждого типа выполняется один SCAN по шаблону *:*:{entity_type}:*, ключи
+        отбираются по действию и удаляются конвейером вместе с записями в индексах.
+        """
+        client = self.redis_client
+        if not client:
+            return False, {"error": "Нет подключения к Redis"}
+        
+        deleted = 0
+        pages = 0
+        started = time.monotonic()
+        for entity_type, actions in changes.items():
+            actions = set(actions)
+            cursor = 0
+            while True:
+                cursor, keys = client.scan(cursor=cursor, match=f"*:*:{entity_type}:*", count=self.scan_count)
+                pages += 1
+                matched = []
+                for key in keys:
+                    parsed = parse_permission_key(key)
+                    if parsed is not None and parsed[2] == entity_type and parsed[1] in actions:
+                        matched.append(key)
+                if matched:
+                    def remove_from_indexes(pipe, keys=matched):
+                        if not self.key_indexing:
+                            return
+                        for key in keys:
+                            user_id, _, key_entity_type, entity_id = parse_permission_key(key)
+                            pipe.srem(entity_index_key(key_entity_type, entity_id), key)
+                            pipe.srem(user_index_key(user_id), key)
+                    deleted += self._unlink_keys(client, matched, remove_from_indexes)
+                if progress_callback:
+                    progress_callback(deleted, pages)
+                if cursor == 0:
+                    break
+        self.connection.report_success()
+        
+        return True, {
+            "pattern": ", ".join(f"{{{','.join(actions)}}}:{entity_type}" for entity_type, actions in changes.items()),
+            "deleted": deleted,
+            "scan_pages": pages,
+            "duration": round(time.monotonic() - started, 3)
+        }
+    
+    def flush_schema_changes(self, changes: Dict[str, List[str]], wait: bool = False) -> Tuple[bool, str]:
+        """Очищает кэш решений, устаревших после изменения схемы (по умолчанию в фоне)."""
+        try:
+            if not changes:
+                return True, "Разрешения схемы не изменились"
+            success, result = self._run_flush(None, None, wait, changes=changes)
+            if not success:
+                return False, result.get("error", "Нет подключения к Redis")
+            return True, self._flush_message(result, "измененных разрешений схемы")
+        except Exception as e:
+            self._report_error(e)
+            return False, f"Ошибка при очистке кэша после изменения схемы: {str(e)}"
+    
+    def _run_flush(self, pattern: Optional[str], progress_callback: Callable[[int, int], None] = None,
+                   wait: bool = True, index_key: str = None,
+                   changes: Dict[str, List[str]] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Удаляет ключи сразу или в фоновой задаче (wait=False).
+        
+        При включенной индексации (index_key передан) удаляются ключи из индексного множества,
+        при изменении схемы (changes передан) - ключи измененных разрешений,
+        иначе - ключи, найденные SCAN по шаблону.
+        """
+        if not self.redis_client:
+            return False, {"error": "Нет подключения к Redis"}
+        
+        def delete(progress):
+            if changes:
+                return self.delete_schema_changes(changes, progress)
+            if index_key:
+                return self.delete_indexed(index_key, progress)
+            return self.delete_by_pattern(pattern, progress)
+        
+        if wait:
+            return delete(progress_callback)
+        
+        job_id = uuid.uuid4().hex[:8]
+        job = {"job_id": job_id, "pattern": index_key or pattern or "schema changes", "status": "running", "deleted": 0, "scan_pages": 0}
+        with self._jobs_lock:
+            self._jobs[job_id] = job
+            # Храним только последние задачи
+            while len(self._jobs) > 100:
+                self._jobs.pop(next(iter(self._jobs)))
+        
+        def progress(deleted, pages):
+            job["deleted"], job["scan_pages"] = deleted, pages
+            if progress_callback:
+                progress_callback(deleted, pages)
+        
+        def run():
+            try:
+                success, result = delete(progress)
+                job.update(result)
+                job["status"] = "done" if success else "failed"
+            except Exception as e:
+                self._report_error(e)
+                job.update({"status": "failed", "error": str(e)})
+            print(f"DEBUG: Фоновая очистка кэша {job['pattern']}: {job}")
+        
+        self._executor.submit(run)
+        return True, dict(job)
+    
+    def get_flush_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает состояние фоновой очистки кэша."""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def _flush_message(self, result: Dict[str, Any], target: str) -> str:
+        if result.get("status") == "running":
+            return f"Очистка кэша {target} запущена в фоне (задача {result['job_id']})"
+        if result.get("deleted", 0) > 0:
+            return f"Удалено {result['deleted']} ключей для {target}"
+        return f"Ключи для {target} не найдены"
+    
+    def flush_user_permissions(self, user_id: str, progress_callback: Callable[[int, int], None] = None,
+                               wait: bool = True) -> Tuple[bool, str]:
         """Очищает кэш для конкретного пользователя."""
         try:
-            if not self.redis_client:
-                return False, "Нет подключения к Redis"
-            
-            # Создаем шаблон ключа для пользователя и удаляем ключи по шаблону
-            deleted_count = 0
-            for key in self.redis_client.scan_iter(f"{user_id}:*"):
-                self.redis_client.delete(key)
-                deleted_count += 1
-            
-            if deleted_count > 0:
-                return True, f"Удалено {deleted_count} ключей для пользователя {user_id}"
-            else:
-                return True, f"Ключи для пользователя {user_id} не найдены"
-                
+            # Формат ключа: {user_id}:{action}:{entity_type}:{entity_id}
+            index_key = user_index_key(user_id) if self.key_indexing else None
+            success, result = self._run_flush(f"{user_id}:*", progress_callback, wait, index_key)
+            if not success:
+                return False, result.get("error", "Нет подключения к Redis")
+            return True, self._flush_message(result, f"пользователя {user_id}")
         except Exception as e:
+            self._report_error(e)
             return False, f"Ошибка при очистке кэша пользователя: {str(e)}"
     
-    def flush_entity_permissions(self, entity_type: str, entity_id: str) -> Tuple[bool, str]:
+    def flush_entity_permissions(self, entity_type: str, entity_id: str,
+                                 progress_callback: Callable[[int, int], None] = None,
+                                 wait: bool = True) -> Tuple[bool, str]:
         """Очищает кэш для конкретной сущности."""
         try:
-            if not self.redis_client:
+            # Формат ключа: {user_id}:{action}:{entity_type}:{entity_id}
+            index_key = entity_index_key(entity_type, entity_id) if self.key_indexing else None
+            success, result = self._run_flush(f"*:*:{entity_type}:{entity_id}", progress_callback, wait, index_key)
+            if not success:
+                return False, result.get("error", "Нет подключения к Redis")
+            return True, self._flush_message(result, f"сущности {entity_type}:{entity_id}")
+        except Exception as e:
+            self._report_error(e)
+            return False, f"Ошибка при очистке кэша сущности: {str(e)}"
+    
+    def flush_users_on_entities(self, user_ids: List[str], entities: List[Tuple[str, str]],
+                                actions_by_type: Dict[str, List[str]] = None) -> Tuple[bool, str]:
+        """Очищает решения указанных пользователей для указанных сущностей одним конвейером.
+        
+        Используется при изменении ролей группы: меняются решения всех ее участников по
+        сущности, а не весь кэш. Если известны действия типа сущности (actions_by_type),
+        ключи строятся напрямую без поиска; при включенной индексации ключи берутся из
+        индекса сущности; иначе выполняется SCAN по шаблону сущности.
+        """
+        try:
+            client = self.redis_client
+            if not client:
                 return False, "Нет подключения к Redis"
             
-            # Создаем шаблон ключа для сущности и удаляем ключи по шаблону
-            # Формат ключа: {user_id}:{action}:{entity_type}:{entity_id}
-            deleted_count = 0
-            for key in self.redis_client.scan_iter(f"*:*:{entity_type}:{entity_id}"):
-                self.redis_client.delete(key)
-                deleted_count += 1
+            users = set(user_ids)
+            if not users or not entities:
+                return True, "Нет ключей для очистки"
             
-            if deleted_count > 0:
-                return True, f"Удалено {deleted_count} ключей для сущности {entity_type}:{entity_id}"
-            else:
-                return True, f"Ключи для сущности {entity_type}:{entity_id} не найдены"
+            keys = set()
+            for entity_type, entity_id in entities:
+                actions = (actions_by_type or {}).get(entity_type)
+                if self.key_indexing:
+                    index_keys = client.sscan_iter(entity_index_key(entity_type, entity_id), count=self.scan_count)
+                elif actions:
+                    keys.update(permission_key(user_id, action, entity_type, entity_id)
+                                for user_id in users for action in actions)
+                    continue
+                else:
+                    index_keys = client.scan_iter(f"*:*:{entity_type}:{entity_id}", count=self.scan_count)
+                for key in index_keys:
+                    parsed = parse_permission_key(key)
+                    if parsed is not None and parsed[0] in users:
+                        keys.add(key)
+            
+            deleted = 0
+            if keys:
+                keys = list(keys)
                 
+                def remove_from_indexes(pipe):
+                    if not self.key_indexing:
+                        return
+                    for key in keys:
+                        user_id, _, entity_type, entity_id = parse_permission_key(key)
+                        pipe.srem(entity_index_key(entity_type, entity_id), key)
+                        pipe.srem(user_index_key(user_id), key)
+                
+                deleted = self._unlink_keys(client, keys, remove_from_indexes)
+            self.connection.report_success()
+            
+            return True, f"Удалено {deleted} ключей для {len(users)} пользователей и {len(entities)} сущностей"
         except Exception as e:
-            return False, f"Ошибка при очистке кэша сущности: {str(e)}"
+            self._report_error(e)
+            return False, f"Ошибка при очистке кэша участников группы: {str(e)}"
     
-    def get_cache_stats(self) -> Tuple[bool, Dict[str, Any]]:
-        """Получает статистику кэша Redis."""
+    def get_cache_stats(self, sample_size: int = None, time_budget: float = None) -> Tuple[bool, Dict[str, Any]]:
+        """Получает статистику кэша Redis без полного обхода ключей.
+        
+        Точные значения берутся из DBSIZE и нужных разделов INFO, остальное оценивается по
+        выборке различных ключей размером до REDIS_STATS_SAMPLE_SIZE, которая собирается не
+        дольше REDIS_STATS_TIME_BUDGET секунд: доля ключей разрешений, распределение по
+        префиксам и TTL, средний объем памяти на ключ (MEMORY USAGE). Для оценок
+        возвращаются 95% доверительные интервалы.
+        """
+        sample_size = sample_size or self.stats_sample_size
+        time_budget = time_budget if time_budget is not None else self.stats_time_budget
         try:
-            if not self.redis_client:
+            client = self.redis_client
+            if not client:
                 return False, {"error": "Нет подключения к Redis"}
             
-            # Получаем информацию о кэше через info
-            info = self.redis_client.info()
-            
-            # Подсчитываем ключи
-            total_keys = 0
-            permission_keys = 0
-            
-            # Используем scan_iter для избежания блокировки при большом количестве ключей
-            for key in self.redis_client.scan_iter("*"):
-                total_keys += 1
-                if ":" in key and len(key.split(":")) >= 3:  # Проверка формата ключа разрешений
-                    permission_keys += 1
+            # Только нужные разделы INFO, без полного отчета сервера
+            pipe = client.pipeline(transaction=False)
+            pipe.dbsize()
+            for section in ("keyspace", "memory", "server", "clients"):
+                pipe.info(section)
+            total_keys, *sections = pipe.execute()
+            info = {key: value for section in sections for key, value in section.items()}
+            keyspace = info.get(f"db{self.redis_db}", {})
             
             stats = {
                 "total_keys": total_keys,
-                "permission_keys": permission_keys,
+                "keys_with_ttl": keyspace.get("expires", 0) if isinstance(keyspace, dict) else 0,
                 "memory_used": info.get("used_memory_human", "Н/Д"),
                 "uptime_days": info.get("uptime_in_days", 0),
                 "clients_connected": info.get("connected_clients", 0)
             }
+            stats.update(self._sample_keys(client, total_keys, sample_size, time_budget))
+            self.connection.report_success()
             
             return True, stats
             
         except Exception as e:
+            self._report_error(e)
             return False, {"error": f"Ошибка при получении статистики: {str(e)}"}
     
+    def _sample_keys(self, client: redis.Redis, total_keys: int, sample_size: int, time_budget: float) -> Dict[str, Any]:
+        """Оценивает состав кэша по выборке различных ключей.
+        
+        Если ключей не больше размера выборки, они перебираются полностью через SCAN и
+        результат точный; иначе выборка набирается RANDOMKEY без повторов.
+        """
+        started = time.monotonic()
+        keys: List[str] = []
+        ttls: List[int] = []
+        memory: List[int] = []
+        memory_supported = True
+        batch = 50
+        full_scan = total_keys <= sample_size
+        finished = not total_keys
+        seen = set()
+        cursor = 0
+        
+        while total_keys and len(keys) < sample_size and time.monotonic() - started < time_budget:
+            if full_scan:
+                cursor, candidates = client.scan(cursor=cursor, count=self.scan_count)
+            else:
+                pipe = client.pipeline(transaction=False)
+                for _ in range(min(batch, sample_size - len(keys))):
+                    pipe.randomkey()
+                candidates = pipe.execute()
+                if all(key is None for key in candidates):
+                    break
+            # RANDOMKEY выбирает с возвращением: повторы не должны увеличивать вес ключа
+            batch_keys = [key for key in dict.fromkeys(candidates) if key is not None and key not in seen]
+            seen.update(batch_keys)
+            
+            pipe = client.pipeline(transaction=False)
+            for key in batch_keys:
+                pipe.ttl(key)
+            # TTL -2: ключ удален или истек после выбора, в выборку он не входит
+            sampled = [(key, ttl) for key, ttl in zip(batch_keys, pipe.execute()) if ttl != -2]
+            batch_keys = [key for key, _ in sampled]
+            batch_ttls = [ttl for _, ttl in sampled]
+            
+            if memory_supported:
+                pipe = client.pipeline(transaction=False)
+                for key in batch_keys:
+                    pipe.memory_usage(key)
+                try:
+                    memory.extend(value for value in pipe.execute() if value is not None)
+                except redis.ResponseError:
+                    # Например, MEMORY отключена в конфигурации или не поддерживается
+                    memory_supported = False
+            
+            keys.extend(batch_keys)
+            ttls.extend(batch_ttls)
+            if full_scan and cursor == 0:
+                finished = True
+                break
+        
+        n = len(keys)
+        result: Dict[str, Any] = {
+            "sample_size": n,
+            "sample_duration": round(time.monotonic() - started, 3),
+            # Точный результат только при завершенном полном переборе
+            "estimated": not (full_scan and finished)
+        }
+        if not n:
+            result.update({"permission_keys": 0, "permission_share": 0.0, "prefixes": [], "ttl_distribution": {}})
+            return result
+        
+        # Доля ключей разрешений и оценка их количества
+        permission_hits = sum(1 for key in keys if parse_permission_key(key) is not None)
+        share, low, high = self._proportion_bounds(permission_hits, n)
+        result.update({
+            "permission_share": share,
+            "permission_keys": round(share * total_keys),
+            "permission_keys_bounds": (round(low * total_keys), round(high * total_keys))
+        })
+        
+        # Распределение по префиксам: ключи разрешений группируются по действию и типу сущности
+        prefix_counts: Dict[str, int] = {}
+        for key in keys:
+            parsed = parse_permission_key(key)
+            if parsed is not None:
+                prefix = f"*:{parsed[1]}:{parsed[2]}:*"
+            elif key.startswith(INDEX_PREFIX):
+                prefix = key[:len(ENTITY_INDEX_PREFIX)] + "*"
+            else:
+                prefix = key.split(":", 1)[0] + (":*" if ":" in key else "")
+            prefix_counts[prefix] = prefix_counts.get(prefix, 0) + 1
+        prefixes = []
+        for prefix, count in sorted(prefix_counts.items(), key=lambda item: -item[1])[:self.stats_top_prefixes]:
+            share, low, high = self._proportion_bounds(count, n)
+            prefixes.append({
+                "prefix": prefix,
+                "share": share,
+                "estimated_keys": round(share * total_keys),
+                "bounds": (round(low * total_keys), round(high * total_keys))
+            })
+        result["prefixes"] = prefixes
+        
+        # Распределение TTL
+        buckets = [("без TTL", None), ("< 1 мин", 60), ("< 1 ч", 3600), ("< 1 сут", 86400), ("≥ 1 сут", float("inf"))]
+        ttl_distribution = {name: 0 for name, _ in buckets}
+        for ttl in ttls:
+            if ttl is None or ttl < 0:
+                ttl_distribution["без TTL"] += 1
+                continue
+            for name, limit in buckets[1:]:
+                if ttl < limit:
+                    ttl_distribution[name] += 1
+                    break
+        result["ttl_distribution"] = {name: round(count / n, 4) for name, count in ttl_distribution.items()}
+        
+        # Средний объем памяти на ключ
+        if memory:
+            mean = sum(memory) / len(memory)
+            variance = sum((value - mean) ** 2 for value in memory) / max(1, len(memory) - 1)
+            margin = 1.96 * (variance / len(memory)) ** 0.5
+            result["avg_key_memory"] = round(mean, 1)
+            result["avg_key_memory_bounds"] = (round(max(0.0, mean - margin), 1), round(mean + margin, 1))
+        
+        return result
+    
+    @staticmethod
+    def _proportion_bounds(hits: int, n: int) -> Tuple[float, float, float]:
+        """Возвращает долю и 95% доверительный интервал Уилсона."""
+        if n == 0:
+            return 0.0, 0.0, 0.0
+        z = 1.96
+        p = hits / n
+        denominator = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denominator
+        margin = z * ((p * (1 - p) / n + z * z / (4 * n * n)) ** 0.5) / denominator
+        return round(p, 4), round(max(0.0, center - margin), 4), round(min(1.0, center + margin), 4)
+    
     def is_connected(self) -> bool:
         """Проверяет, установлено ли соединение с Redis."""
-        if not self.redis_client:
+        client = self.redis_client
+        if not client:
             return False
         
         try:
             # Проверяем соединение простым ping
-            return bool(self.redis_client.ping())
-        except:
-            return False 
\ No newline at end of file
+            connected = bool(client.ping())
+            self.connection.report_success()
+            return connected
+        except Exception as e:
+            self._report_error(e)
+            return False
+
+
+def invalidate_schema_changes(tenant_id: str, changes: Dict[str, List[str]]):
+    """Сбрасывает решения, затронутые новой схемой тенанта, в фоновой задаче.
+
+    Регистрируется при запуске приложения: add_schema_change_listener(invalidate_schema_changes).
+    """
+    success, message = get_service(RedisController).flush_schema_changes(changes, wait=False)
+    print(f"DEBUG: Очистка кэша после изменения схемы {tenant_id}: {message}")
@@ -1,35 +1,59 @@
 from .base_controller import BaseController
 from app.models import RelationshipModel
+from app.registry import get_service
+from .read_cache import invalidates_reads
 
 class RelationshipController(BaseController):
     """Контроллер для работы с отношениями (tuples) Permify."""
     
     def __init__(self):
         super().__init__()
-        self.relationship_model = RelationshipModel()
+        self.relationship_model = get_service(RelationshipModel)
     
     def get_relationships(self, tenant_id=None, filters=None):
         """Получает список отношений с возможностью фильтрации."""
         return self.relationship_model.get_relationships(tenant_id, filters)
     
+    @invalidates_reads
     def create_relationship(self, entity_type, entity_id, relation, subject_type, subject_id, tenant_id=None):
         """Создает новое отношение."""
         return self.relationship_model.create_relationship(
             entity_type, entity_id, relation, subject_type, subject_id, tenant_id
         )
     
+    @invalidates_reads
+    def create_relationships(self, tuples, tenant_id=None):
+        """Создает несколько отношений пакетными запросами."""
+        return self.relationship_model.create_relationships(tuples, tenant_id)
+    
+    @invalidates_reads
     def delete_relationship(self, entity_type, entity_id, relation, subject_type, subject_id, tenant_id=None):
         """Удаляет отношение."""
         return self.relationship_model.delete_relationship(
             entity_type, entity_id, relation, subject_type, subject_id, tenant_id
         )
     
-    def check_permission(self, entity_type, entity_id, permission, user_id, tenant_id=None, schema_version=None):
-        """Проверяет разрешение."""
+    def check_permission(self, entity_type, entity_id, permission, user_id, tenant_id=None, schema_version=None, local=False):
+        """Проверяет разрешение (в Permify или локально при local=True)."""
         return self.relationship_model.check_permission(
-            entity_type, entity_id, permission, user_id, tenant_id, schema_version
+            entity_type, entity_id, permission, user_id, tenant_id, schema_version, local
+        )
+    
+    def check_permission_local(self, entity_type, entity_id, permission, subject_id, tenant_id=None, subject_type="user"):
+        """Проверяет разрешение по локальной копии отношений."""
+        return self.relationship_model.check_permission_local(
+            entity_type, entity_id, permission, subject_id, tenant_id, subject_type=subject_type
         )
     
+    def check_permissions_local(self, checks, tenant_id=None):
+        """Выполняет серию локальных проверок."""
+        return self.relationship_model.check_permissions_local(checks, tenant_id)
+    
+    def compare_permission_checks(self, checks, tenant_id=None):
+        """Сравнивает локальные результаты проверок с ответами Permify."""
+        return self.relationship_model.compare_permission_checks(checks, tenant_id)
+    
+    @invalidates_reads
     def delete_multiple_relationships(self, relationships, tenant_id=None):
         """Удаляет несколько отношений."""
         return self.relationship_model.delete_multiple_relationships(relationships, tenant_id)
@@ -48,6 +72,7 @@ class RelationshipController(BaseController):
             entity_type, entity_id, permission, role, tenant_id, schema_version
         ) 
     
+    @invalidates_reads
     def rebuild_all_relationships(self, tenant_id=None):
         """Пересоздает все отношения в системе.
         
@@ -80,20 +105,13 @@ class RelationshipController(BaseController):
                 "tuple_filter": {},  # Пустой фильтр означает "все отношения"
             })
             
-            # Восстанавливаем отношения по одному
-            for relationship in relationships_backup:
-                entity = relationship.get("entity", {})
-                subject = relationship.get("subject", {})
-                relation = relationship.get("relation", "")
-                
-                self.create_relationship(
-                    entity.get("type"),
-                    entity.get("id"),
-                    relation,
-                    subject.get("type"),
-                    subject.get("id"),
-                    tenant_id
-                )
+            # Восстанавливаем отношения пачками: локально они уже есть, поэтому отправляем их в Permify заново
+            results = self.relationship_model.create_relationships(
+                relationships_backup, tenant_id, sync_existing=True
+            )
+            failed = sum(1 for success, _ in results if not success)
+            if failed:
+                return False, f"Пересоздано {len(results) - failed} из {len(results)} отношений"
             
             return True, f"Успешно пересоздано {len(relationships_backup)} отношений"
         except Exception as e:
@@ -1,12 +1,14 @@
 from .base_controller import BaseController
 from app.models import SchemaModel
+from app.registry import get_service
+from .read_cache import invalidates_reads
 
 class SchemaController(BaseController):
     """Контроллер для работы со схемами Permify."""
     
     def __init__(self):
         super().__init__()
-        self.schema_model = SchemaModel()
+        self.schema_model = get_service(SchemaModel)
     
     def get_schema_list(self, tenant_id=None):
         """Получает список всех схем."""
@@ -16,10 +18,20 @@ class SchemaController(BaseController):
         """Получает текущую или указанную версию схемы."""
         return self.schema_model.get_current_schema(tenant_id, schema_version)
     
+    def get_compiled_schema(self, tenant_id=None, schema_version=None):
+        """Получает скомпилированную схему с таблицей прав ролей."""
+        return self.schema_model.get_compiled_schema(tenant_id, schema_version)
+    
+    @invalidates_reads
     def create_schema(self, schema_content, tenant_id=None):
         """Создает новую схему."""
         return self.schema_model.create_schema(schema_content, tenant_id)
     
+    @invalidates_reads
+    def generate_and_apply_schema(self, tenant_id=None, force=False):
+        """Генерирует схему по текущим данным и записывает ее, если она изменилась."""
+        return self.schema_model.generate_and_apply_schema(tenant_id, force)
+    
     def validate_schema(self, schema_content):
         """Валидирует схему."""
         return self.schema_model.validate_schema(schema_content)
@@ -1,23 +1,28 @@
 from .base_controller import BaseController
 from app.models import UserModel
 from .redis_controller import RedisController
+from app.registry import get_service
+from .read_cache import cached_read, invalidates_reads
 
 class UserController(BaseController):
     """Контроллер для управления пользователями в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.user_model = UserModel()
-        self.redis_controller = RedisController()
+        self.user_model = get_service(UserModel)
+        self.redis_controller = get_service(RedisController)
     
+    @cached_read("users")
     def get_users(self, tenant_id=None):
         """Получает список пользователей на основе связей в системе."""
         return self.user_model.get_users(tenant_id)
     
+    @invalidates_reads
     def create_user(self, user_id, name, tenant_id=None):
         """Создает нового пользователя."""
         return self.user_model.create_user(user_id, name, tenant_id)
     
+    @invalidates_reads
     def add_user_to_group(self, user_id, group_id, tenant_id=None):
         """Добавляет пользователя в группу."""
         success, message = self.user_model.add_user_to_group(user_id, group_id, tenant_id)
@@ -26,6 +31,7 @@ class UserController(BaseController):
             self.redis_controller.flush_user_permissions(user_id)
         return success, message
     
+    @invalidates_reads
     def remove_user_from_group(self, user_id, group_id, tenant_id=None):
         """Удаляет пользователя из группы."""
         success, message = self.user_model.remove_user_from_group(user_id, group_id, tenant_id)
@@ -34,6 +40,7 @@ class UserController(BaseController):
             self.redis_controller.flush_user_permissions(user_id)
         return success, message
     
+    @invalidates_reads
     def assign_app_role(self, user_id, app_type, app_id, role, tenant_id=None):
         """Назначает пользователю роль в приложении."""
         success, message = self.user_model.assign_app_role(user_id, app_type, app_id, role, tenant_id)
@@ -44,6 +51,17 @@ class UserController(BaseController):
             self.redis_controller.flush_entity_permissions(app_type, app_id)
         return success, message
     
+    @invalidates_reads
+    def assign_app_roles(self, user_id, app_type, app_id, roles, tenant_id=None):
+        """Назначает пользователю несколько ролей в приложении."""
+        results = self.user_model.assign_app_roles(user_id, app_type, app_id, roles, tenant_id)
+        if any(success for success, _ in results):
+            # Сбрасываем кэш для пользователя и приложения один раз на все роли
+            self.redis_controller.flush_user_permissions(user_id)
+            self.redis_controller.flush_entity_permissions(app_type, app_id)
+        return results
+    
+    @invalidates_reads
     def remove_app_role(self, user_id, app_type, app_id, role, tenant_id=None):
         """Удаляет роль пользователя в приложении."""
         success, message = self.user_model.remove_app_role(user_id, app_type, app_id, role, tenant_id)
@@ -54,6 +72,7 @@ class UserController(BaseController):
             self.redis_controller.flush_entity_permissions(app_type, app_id)
         return success, message
     
+    @invalidates_reads
     def delete_user(self, user_id, tenant_id=None):
         """Удаляет пользователя и все его отношения в системе."""
         # Сбрасываем кэш для пользователя перед удалением
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Any, Optional, Tuple
+
+# Компоненты, которые проверяет монитор
+PERMIFY_REST = "permify_rest"
+PERMIFY_GRPC = "permify_grpc"
+REDIS = "redis"
+
+# Состояния автомата отказов: closed - запросы разрешены, open - Permify считается недоступным
+CLOSED = "closed"
+OPEN = "open"
+
+
+class ComponentHealth:
+    """Последний результат проверки компонента и скользящее окно задержек."""
+
+    def __init__(self, window: int):
+        self.status: Optional[bool] = None
+        self.message = "Проверка еще не выполнялась"
+        self.checked_at: Optional[float] = None
+        self.consecutive_failures = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, status: bool, message: str, latency: float):
+        self.status = status
+        self.message = message
+        self.checked_at = time.time()
+        self.latencies.append(latency)
+        self.consecutive_failures = 0 if status else self.consecutive_failures + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "status": self.status,
+            "message": self.message,
+            "checked_at": self.checked_at,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_last_ms": round(self.latencies[-1] * 1000, 1) if self.latencies else None,
+            "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None
+        }
+
+
+class HealthMonitor:
+    """Фоновая проверка доступности Permify (REST и gRPC) и Redis.
+
+    Проверки выполняются в отдельном потоке раз в PERMIFY_HEALTH_INTERVAL секунд, а боковая
+    панель и представления читают сохраненное состояние без сетевых вызовов. После
+    PERMIFY_HEALTH_FAILURE_THRESHOLD неудачных проверок подряд Permify считается
+    недоступным (состояние open), первая успешная проверка возвращает closed. Сами
+    запросы к Permify ограничивает автомат отказов слоя устойчивости (models.resilience).
+    """
+
+    def __init__(self, interval: float = None, failure_threshold: int = None, window: int = None):
+        if interval is None:
+            interval = float(os.environ.get("PERMIFY_HEALTH_INTERVAL", 5))
+        if failure_threshold is None:
+            failure_threshold = int(os.environ.get("PERMIFY_HEALTH_FAILURE_THRESHOLD", 2))
+        if window is None:
+            window = int(os.environ.get("PERMIFY_HEALTH_WINDOW", 20))
+        self.interval = max(0.5, interval)
+        self.failure_threshold = max(1, failure_threshold)
+        self.lock = threading.Lock()
+        self.components = {name: ComponentHealth(window) for name in (PERMIFY_REST, PERMIFY_GRPC, REDIS)}
+
+        self._first_check = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _probes(self) -> Dict[str, Callable[[], Tuple[bool, str]]]:
+        # Импорт внутри метода: модели и контроллеры сами обращаются к монитору
+        from app.controllers import RedisController
+        from app.models.base_model import BaseModel
+        from app.models.grpc_transport import grpc_health_check
+        from app.registry import get_service
+
+        model = get_service(BaseModel)
+
+        def redis_probe():
+            connected = get_service(RedisController).is_connected()
+            return connected, "Подключение установлено" if connected else "Нет подключения к Redis"
+
+        return {
+            PERMIFY_REST: model.check_permify_status,
+            PERMIFY_GRPC: lambda: grpc_health_check(model.permify_grpc_host, model.health_timeout),
+            REDIS: redis_probe
+        }
+
+    def check_now(self):
+        """Проверяет все компоненты и сохраняет результат."""
+        for name, probe in self._probes().items():
+            started = time.monotonic()
+            try:
+                status, message = probe()
+            except Exception as e:
+                status, message = False, f"Ошибка проверки: {str(e)}"
+            latency = time.monotonic() - started
+            with self.lock:
+                previous = self.permify_state() if name == self._permify_component() else None
+                self.components[name].record(status, message, latency)
+                if previous is not None and previous != self.permify_state():
+                    print(f"DEBUG: Состояние Permify изменилось: {previous} -> {self.permify_state()} ({message})")
+        self._first_check.set()
+
+    def _run(self):
+        while True:
+            self.check_now()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Запускает фоновый поток проверок (один раз на процесс)."""
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        """Запрашивает внеочередную проверку (например, после смены адреса Permify)."""
+        self._wakeup.set()
+
+    def _permify_component(self) -> str:
+        from app.models.grpc_transport import use_grpc_transport
+        return PERMIFY_GRPC if use_grpc_transport() else PERMIFY_REST
+
+    def get_status(self, component: str = None) -> Dict[str, Any]:
+        """Возвращает сохраненное состояние компонента (по умолчанию - Permify выбранного транспорта).
+
+        До первой проверки ожидает ее результат не дольше PERMIFY_HEALTH_TIMEOUT секунд.
+        """
+        self.start()
+        if not self._first_check.is_set():
+            self._first_check.wait(float(os.environ.get("PERMIFY_HEALTH_TIMEOUT", 2)))
+        with self.lock:
+            return self.components[component or self._permify_component()].snapshot()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает состояние всех компонентов и автомата отказов."""
+        self.start()
+        with self.lock:
+            result = {name: component.snapshot() for name, component in self.components.items()}
+            result["breaker"] = {"state": self.permify_state(), "failure_threshold": self.failure_threshold}
+        return result
+
+    def permify_state(self) -> str:
+        """Состояние автомата отказов Permify: closed или open."""
+        failures = self.components[self._permify_component()].consecutive_failures
+        return OPEN if failures >= self.failure_threshold else CLOSED
+
+    def permify_available(self) -> bool:
+        """False, если Permify по результатам фоновых проверок недоступен."""
+        self.start()
+        return self.permify_state() == CLOSED
+
+
+_health_monitor: Optional[HealthMonitor] = None
+_health_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Возвращает общий для процесса монитор доступности."""
+    global _health_monitor
+    if _health_monitor is None:
+        with _health_monitor_lock:
+            if _health_monitor is None:
+                _health_monitor = HealthMonitor()
+    return _health_monitor
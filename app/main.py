@@ -28,15 +28,22 @@ from app.views import (
     CacheView
 )
 from app.controllers import BaseController, RedisController, AppController, RelationshipController
+from app.controllers.redis_controller import invalidate_schema_changes
+from app.models.schema_model import add_schema_change_listener
+from app.models.resilience import request_budget
 from app.views.styles import get_modern_styles
+from app.registry import get_service
 
 # Применяем современные стили
 st.markdown(get_modern_styles(), unsafe_allow_html=True)
 
+# Изменение схемы сбрасывает затронутые решения в кэше Redis (повторная регистрация игнорируется)
+add_schema_change_listener(invalidate_schema_changes)
+
 def check_permify_status():
     """Проверяет статус подключения к Permify."""
-    controller = BaseController()
-    status, message = controller.check_permify_status()
+    controller = get_service(BaseController)
+    status, message = controller.get_permify_status()
     if status:
         st.sidebar.success("✅ Permify доступен")
     else:
@@ -116,8 +123,9 @@ def main():
         </div>
         """, unsafe_allow_html=True)
     
-    # Отображаем выбранную страницу с контейнером
-    with st.container():
+    # Отображаем выбранную страницу с контейнером; запросы к Permify ограничены
+    # общим бюджетом времени прогона (PERMIFY_RERUN_BUDGET)
+    with st.container(), request_budget():
         if page == "home":
             IndexView().render()
         elif page == "apps":
@@ -3,4 +3,5 @@ from .relationship_model import RelationshipModel
 from .schema_model import SchemaModel
 from .user_model import UserModel
 from .group_model import GroupModel
-from .app_model import AppModel 
\ No newline at end of file
+from .app_model import AppModel
+from .permify_client import PermifyClient, get_permify_client
@@ -1,117 +1,119 @@
 from .base_model import BaseModel
 from .relationship_model import RelationshipModel
 from .schema_model import SchemaModel
+from .schema_sync import get_schema_sync
+from .storage import get_storage, item_key
+from .unit_of_work import delete_items, in_unit_of_work, load_items, save_items, upsert_items
 from typing import Dict, Any, List, Optional, Tuple, Union
-import os
 import json
+from app.registry import get_service
 
 class AppModel(BaseModel):
     """Модель для управления приложениями в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.relationship_model = RelationshipModel()
-        self.schema_model = SchemaModel()
-        self.apps_file = os.path.join(os.getcwd(), 'data', 'apps.json')
-        
-        # Создаем директорию data, если она не существует
-        os.makedirs(os.path.dirname(self.apps_file), exist_ok=True)
+        self.relationship_model = get_service(RelationshipModel)
+        self.schema_model = get_service(SchemaModel)
+        # Постоянное хранилище (JSON-файлы или SQLite, см. STORAGE_BACKEND)
+        self.storage = get_storage()
     
-    def _load_apps(self) -> List[Dict[str, Any]]:
-        """Загружает список приложений из файла."""
-        if not os.path.exists(self.apps_file):
-            print(f"Файл приложений не найден: {self.apps_file}")
-            return []
-        
-        try:
-            with open(self.apps_file, 'r') as f:
-                loaded_apps = json.load(f).get('apps', [])
-                print(f"Загружено {len(loaded_apps)} приложений из {self.apps_file}")
-                
-                # Дополнительная обработка для совместимости с более старыми форматами
-                for app in loaded_apps:
-                    # Убедимся, что метаданные существуют и это словарь
-                    if 'metadata' not in app:
-                        app['metadata'] = {}
-                        print(f"Добавлены пустые метаданные для {app.get('name')}:{app.get('id')}")
-                    
-                    # Если в метаданных нет custom_relations, но в приложении есть действия с custom_relations
-                    if 'custom_relations' not in app.get('metadata', {}) and 'actions' in app:
-                        app['metadata']['custom_relations'] = []
-                        print(f"Инициализируем custom_relations для {app.get('name')}:{app.get('id')}")
-                        
-                        # Ищем пользовательские отношения в действиях
-                        for action in app.get('actions', []):
-                            for key in action.keys():
-                                if key.endswith("_allowed") and key not in ["editor_allowed", "viewer_allowed", "group_allowed"]:
-                                    relation = key.replace("_allowed", "")
-                                    if relation not in app['metadata']['custom_relations']:
-                                        app['metadata']['custom_relations'].append(relation)
-                                        print(f"Добавлено отношение {relation} из действий для {app.get('name')}:{app.get('id')}")
-                    elif 'custom_relations' in app.get('metadata', {}) and app['metadata']['custom_relations']:
-                        print(f"Загружены пользовательские отношения для {app.get('name')}:{app.get('id')}: {app['metadata']['custom_relations']}")
-                
-                return loaded_apps
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Ошибка при загрузке приложений: {str(e)}")
-            return []
+    def _load_apps(self, fingerprints: Dict[str, str] = None) -> List[Dict[str, Any]]:
+        """Загружает список приложений из хранилища.
+        
+        Если передан словарь fingerprints, в него записываются отпечатки приложений
+        в том виде, в котором они лежат в хранилище (до обработки совместимости).
+        """
+        loaded_apps = load_items(self.storage, 'apps')
+        print(f"Загружено {len(loaded_apps)} приложений из хранилища {self.storage.name}")
+        
+        if fingerprints is not None:
+            for app in loaded_apps:
+                fingerprints[item_key('apps', app)] = self._app_fingerprint(app)
+        
+        # Дополнительная обработка для совместимости с более старыми форматами
+        for app in loaded_apps:
+            # Убедимся, что метаданные существуют и это словарь
+            if 'metadata' not in app:
+                app['metadata'] = {}
+                print(f"Добавлены пустые метаданные для {app.get('name')}:{app.get('id')}")
+            
+            # Если в метаданных нет custom_relations, но в приложении есть действия с custom_relations
+            if 'custom_relations' not in app.get('metadata', {}) and 'actions' in app:
+                print(f"Инициализируем custom_relations для {app.get('name')}:{app.get('id')}")
+                self._collect_custom_relations(app)
+            elif 'custom_relations' in app.get('metadata', {}) and app['metadata']['custom_relations']:
+                print(f"Загружены пользовательские отношения для {app.get('name')}:{app.get('id')}: {app['metadata']['custom_relations']}")
+        
+        return loaded_apps
+    
+    def _collect_custom_relations(self, app: Dict[str, Any]):
+        """Заполняет metadata.custom_relations по пользовательским отношениям в действиях."""
+        app['metadata']['custom_relations'] = []
+        
+        # Ищем пользовательские отношения в действиях
+        for action in app.get('actions', []):
+            for key in action.keys():
+                if key.endswith("_allowed") and key not in ["editor_allowed", "viewer_allowed", "group_allowed"]:
+                    relation = key.replace("_allowed", "")
+                    if relation not in app['metadata']['custom_relations']:
+                        app['metadata']['custom_relations'].append(relation)
+    
+    def _normalize_app(self, app: Dict[str, Any]):
+        """Приводит приложение к виду, в котором оно сохраняется в хранилище."""
+        # Обработка метаданных
+        if 'metadata' not in app:
+            app['metadata'] = {}
+        
+        # Проверяем наличие пользовательских отношений в метаданных
+        if 'custom_relations' not in app['metadata']:
+            self._collect_custom_relations(app)
+    
+    def _app_fingerprint(self, app: Dict[str, Any]) -> str:
+        """Возвращает отпечаток приложения для сравнения с сохраненной версией."""
+        return json.dumps(app, sort_keys=True, default=str)
+    
+    def _prepare_apps(self, apps: List[Dict[str, Any]]):
+        """Обработка перед сохранением: убедимся, что все нужные поля присутствуют."""
+        for app in apps:
+            self._normalize_app(app)
+            
+            # Дополнительное логирование
+            if app['metadata']['custom_relations']:
+                print(f"Сохраняем пользовательские отношения для {app.get('name')}:{app.get('id')}: {app['metadata']['custom_relations']}")
     
     def _save_apps(self, apps: List[Dict[str, Any]]) -> bool:
-        """Сохраняет список приложений в файл."""
+        """Сохраняет список приложений в хранилище целиком."""
         try:
-            # Сохраняем приложения с поддержкой сложных объектов
-            class AppEncoder(json.JSONEncoder):
-                def default(self, obj):
-                    if isinstance(obj, (dict, list, str, int, float, bool, type(None))):
-                        return obj
-                    return str(obj)
-            
-            # Обработка перед сохранением: убедимся, что все нужные поля присутствуют
-            for app in apps:
-                # Обработка метаданных
-                if 'metadata' not in app:
-                    app['metadata'] = {}
-                
-                # Проверяем наличие пользовательских отношений в метаданных
-                if 'custom_relations' not in app['metadata']:
-                    app['metadata']['custom_relations'] = []
-                    
-                    # Ищем пользовательские отношения в действиях
-                    for action in app.get('actions', []):
-                        for key in action.keys():
-                            if key.endswith("_allowed") and key not in ["editor_allowed", "viewer_allowed", "group_allowed"]:
-                                relation = key.replace("_allowed", "")
-                                if relation not in app['metadata']['custom_relations']:
-                                    app['metadata']['custom_relations'].append(relation)
-                
-                # Дополнительное логирование
-                if 'custom_relations' in app['metadata'] and app['metadata']['custom_relations']:
-                    print(f"Сохраняем пользовательские отношения для {app.get('name')}:{app.get('id')}: {app['metadata']['custom_relations']}")
-            
-            with open(self.apps_file, 'w') as f:
-                json.dump({'apps': apps}, f, indent=2, cls=AppEncoder)
-            
-            # Проверяем, что данные записались корректно
-            if os.path.exists(self.apps_file):
-                with open(self.apps_file, 'r') as f:
-                    try:
-                        saved_data = json.load(f)
-                        print(f"Данные успешно сохранены в {self.apps_file}")
-                        return True
-                    except json.JSONDecodeError as e:
-                        print(f"Ошибка проверки сохраненного файла: {str(e)}")
-                        return False
-            return True
+            self._prepare_apps(apps)
+            return save_items(self.storage, 'apps', apps)
         except Exception as e:
             print(f"Ошибка при сохранении приложений: {str(e)}")
             return False
     
-    def get_apps(self, tenant_id: str = None) -> List[Dict[str, Any]]:
-        """Получает список приложений из хранилища и дополняет данными из схемы и отношений."""
+    def _upsert_apps(self, apps: List[Dict[str, Any]]) -> bool:
+        """Добавляет или обновляет в хранилище только переданные приложения."""
+        try:
+            self._prepare_apps(apps)
+            return upsert_items(self.storage, 'apps', apps)
+        except Exception as e:
+            print(f"Ошибка при сохранении приложений: {str(e)}")
+            return False
+    
+    @in_unit_of_work
+    def get_apps(self, tenant_id: str = None, persist: bool = True) -> List[Dict[str, Any]]:
+        """Получает список приложений из хранилища и дополняет данными из схемы и отношений.
+        
+        Объединенный список не записывается целиком: при persist=True в хранилище
+        сохраняются только приложения, которые отличаются от сохраненной версии
+        (новые шаблоны из схемы, экземпляры и пользовательские отношения из кортежей).
+        При persist=False метод ничего не записывает.
+        """
         tenant_id = tenant_id or self.default_tenant
         
-        # Загружаем приложения из файла
-        stored_apps = self._load_apps()
+        # Загружаем приложения из хранилища и запоминаем их исходное состояние
+        stored_fingerprints = {}
+        stored_apps = self._load_apps(stored_fingerprints)
         
         # Сначала собираем все пользовательские отношения из всех приложений
         all_custom_relations = set()
@@ -158,86 +160,66 @@ class AppModel(BaseModel):
                     else:
                         apps_dict[app_type_key]["actions"] = [{"name": perm, "description": f"Разрешение {perm}"} for perm in permissions]
         
-        # Дополняем информацию из отношений
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        if success:
-            # Обрабатываем отношения из Permify
-            for tuple_data in relationships.get("tuples", []):
-                entity = tuple_data.get("entity", {})
-                subject = tuple_data.get("subject", {})
-                relation = tuple_data.get("relation", "")
-                
-                entity_type = entity.get("type")
-                entity_id = entity.get("id")
-                
-                # Пропускаем типы, которые не являются приложениями
-                if entity_type in ["user", "group"]:
-                    continue
-                
-                # Создаем ID для этого экземпляра приложения, если его еще нет
-                app_instance_id = f"{entity_type}:{entity_id}"
-                
-                if app_instance_id not in apps_dict:
-                    # Проверяем, есть ли шаблон для этого типа приложения
-                    template_key = f"{entity_type}:"
-                    template = apps_dict.get(template_key, {})
-                    
-                    # Если шаблона нет, создаем базовый шаблон
-                    if not template:
-                        template = {
-                            "name": entity_type,
-                            "id": "",
-                            "display_name": entity_type.capitalize(),
-                            "actions": [],
-                            "is_template": True
-                        }
-                    
-                    # Создаем новый экземпляр приложения
-                    apps_dict[app_instance_id] = {
-                        "id": entity_id,
-                        "name": entity_type,
-                        "display_name": template.get("display_name", entity_type.capitalize()),
-                        "actions": template.get("actions", []),
-                        "users": [],
-                        "groups": [],
-                        "metadata": {"custom_relations": []}
-                    }
+        # Дополняем информацию из отношений (представление поддерживается хранилищем отношений)
+        for (entity_type, entity_id), view in self.relationship_model.get_app_views(tenant_id).items():
+            # Создаем ID для этого экземпляра приложения, если его еще нет
+            app_instance_id = f"{entity_type}:{entity_id}"
+            
+            if app_instance_id not in apps_dict:
+                # Проверяем, есть ли шаблон для этого типа приложения
+                template = apps_dict.get(f"{entity_type}:", {})
                 
-                # Добавляем пользователя с его ролью (включая стандартные и пользовательские роли)
-                if subject.get("type") == "user":
-                    user_id = subject.get("id")
-                    # Проверяем, есть ли уже этот пользователь в списке
-                    existing_user = next((u for u in apps_dict[app_instance_id]["users"] 
-                                        if u.get("user_id") == user_id and u.get("role") == relation), None)
+                # Создаем новый экземпляр приложения
+                apps_dict[app_instance_id] = {
+                    "id": entity_id,
+                    "name": entity_type,
+                    "display_name": template.get("display_name", entity_type.capitalize()),
+                    "actions": template.get("actions", []),
+                    "users": [],
+                    "groups": [],
+                    "metadata": {"custom_relations": []}
+                }
+            app = apps_dict[app_instance_id]
+            
+            # Добавляем пользователей с их ролями (включая стандартные и пользовательские роли)
+            if view["users"]:
+                users = app.setdefault("users", [])
+                known_users = {(user.get("user_id"), user.get("role")) for user in users}
+                for user in view["users"]:
+                    if (user["user_id"], user["role"]) in known_users:
+                        continue
+                    users.append(user)
                     
-                    if not existing_user:
-                        apps_dict[app_instance_id]["users"].append({
-                            "user_id": user_id,
-                            "role": relation
-                        })
-                        
-                        # Если это пользовательская роль (не стандартная), добавляем её в список
-                        if relation not in ["owner", "editor", "viewer"] and 'metadata' in apps_dict[app_instance_id]:
-                            if 'custom_relations' not in apps_dict[app_instance_id]['metadata']:
-                                apps_dict[app_instance_id]['metadata']['custom_relations'] = []
-                            
-                            if relation not in apps_dict[app_instance_id]['metadata']['custom_relations']:
-                                apps_dict[app_instance_id]['metadata']['custom_relations'].append(relation)
-                
-                # Добавляем группу
-                elif relation == "member" and subject.get("type") == "group":
-                    group_id = subject.get("id")
-                    if group_id not in apps_dict[app_instance_id]["groups"]:
-                        apps_dict[app_instance_id]["groups"].append(group_id)
+                    # Если это пользовательская роль (не стандартная), добавляем её в список
+                    relation = user["role"]
+                    if relation not in ["owner", "editor", "viewer"] and 'metadata' in app:
+                        custom_relations = app['metadata'].setdefault('custom_relations', [])
+                        if relation not in custom_relations:
+                            custom_relations.append(relation)
+            
+            # Добавляем группы
+            if view["groups"]:
+                groups = app.setdefault("groups", [])
+                known_groups = set(groups)
+                groups.extend(group_id for group_id in view["groups"] if group_id not in known_groups)
         
         # Преобразуем словарь в список для вывода
         apps_list = list(apps_dict.values())
         
-        # Сохраняем обновленный список в файл
-        self._save_apps(apps_list)
+        # Сохраняем только изменившиеся приложения
+        changed_keys = []
+        for key, app in apps_dict.items():
+            self._normalize_app(app)
+            if stored_fingerprints.get(key) != self._app_fingerprint(app):
+                changed_keys.append(key)
+        
+        if changed_keys and persist:
+            print(f"Сохраняем изменившиеся приложения: {changed_keys}")
+            self._upsert_apps([apps_dict[key] for key in changed_keys])
         
         return apps_list
     
+    @in_unit_of_work
     def create_app(self, app_name: str, app_id: str, actions: List[Dict[str, Any]], tenant_id: str = None, metadata: Dict = None) -> Tuple[bool, str]:
         """Создает новое приложение (через обновление схемы и создание отношений)."""
         tenant_id = tenant_id or self.default_tenant
@@ -278,9 +260,8 @@ class AppModel(BaseModel):
             "metadata": metadata
         }
         
-        # Добавляем в список и сохраняем
-        stored_apps.append(new_app)
-        if not self._save_apps(stored_apps):
+        # Сохраняем только новое приложение
+        if not self._upsert_apps([new_app]):
             return False, "Ошибка при сохранении приложения в базу данных"
         
         try:
@@ -292,6 +273,7 @@ class AppModel(BaseModel):
             # В случае любой ошибки, мы все равно сохранили приложение в БД
             return True, f"Приложение сохранено в локальной БД, но возникла ошибка при работе с Permify: {str(e)}"
     
+    @in_unit_of_work
     def update_app(self, app_type: str, app_id: str, actions: List[Dict[str, Any]], tenant_id: str = None, metadata: Dict = None) -> Tuple[bool, str]:
         """Обновляет существующее приложение и его действия."""
         tenant_id = tenant_id or self.default_tenant
@@ -302,12 +284,12 @@ class AppModel(BaseModel):
         custom_relations = set()
         
         # Ищем приложение для обновления
-        app_found = False
+        app_found = None
         stored_apps = self._load_apps()
         
         for app in stored_apps:
             if app.get('name') == app_type and app.get('id') == app_id:
-                app_found = True
+                app_found = app
                 
                 # Обновляем действия
                 app['actions'] = [{"name": action["name"], "description": f"Действие {action['name']}", 
@@ -351,8 +333,8 @@ class AppModel(BaseModel):
         if not app_found:
             return False, f"Приложение {app_type} с ID {app_id} не найдено"
         
-        # Сохраняем обновленные приложения
-        if not self._save_apps(stored_apps):
+        # Сохраняем только измененное приложение
+        if not self._upsert_apps([app_found]):
             return False, "Ошибка при сохранении изменений в базу данных"
         
         try:
@@ -491,15 +473,15 @@ class AppModel(BaseModel):
         else:
             return False, f"Ошибка при обновлении схемы: {result}"
     
+    @in_unit_of_work
     def assign_user_to_app(self, app_name: str, app_id: str, user_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Назначает пользователю роль в приложении."""
         success, result = self.relationship_model.assign_user_to_app(app_name, app_id, user_id, role, tenant_id)
         
         if success:
-            # Для любой роли (стандартной или пользовательской) обновляем схему
-            # Это гарантирует, что схема всегда будет актуальной
-            tenant_id = tenant_id or self.default_tenant
-            self.force_rebuild_schema(tenant_id)
+            # Назначение роли обычно не меняет схему, поэтому синхронизация откладывается
+            # и объединяется с другими изменениями
+            self.schedule_schema_sync(tenant_id)
         
         return success, result
 
@@ -510,33 +492,42 @@ class AppModel(BaseModel):
         # Используем новый API для обновления схемы
         return self.schema_model.update_schema_for_role(app_name, role, tenant_id)
     
-    def force_rebuild_schema(self, tenant_id: str = None) -> Tuple[bool, str]:
-        """Принудительно пересоздает схему на основе текущих данных."""
+    @in_unit_of_work
+    def force_rebuild_schema(self, tenant_id: str = None, force: bool = False) -> Tuple[bool, str]:
+        """Сразу пересоздает схему на основе текущих данных (без записи, если она не изменилась)."""
         tenant_id = tenant_id or self.default_tenant
-        return self.schema_model.generate_and_apply_schema(tenant_id)
+        schema_sync = get_schema_sync()
+        
+        # Отложенная синхронизация больше не нужна: схема обновляется прямо сейчас
+        schema_sync.cancel(tenant_id)
+        return schema_sync.sync(tenant_id, force=force)
+    
+    def schedule_schema_sync(self, tenant_id: str = None):
+        """Планирует отложенную синхронизацию схемы (серия изменений дает одну запись)."""
+        get_schema_sync().schedule(tenant_id or self.default_tenant)
     
     def remove_user_from_app(self, app_name: str, app_id: str, user_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет роль пользователя в приложении."""
         return self.relationship_model.delete_relationship(app_name, app_id, role, "user", user_id, tenant_id)
     
+    @in_unit_of_work
     def assign_group_to_app(self, app_name: str, app_id: str, group_id: str, role: str = "viewer", tenant_id: str = None) -> Tuple[bool, str]:
         """Назначает группу приложению с определенной ролью."""
         from app.models.group_model import GroupModel
-        group_model = GroupModel()
+        group_model = get_service(GroupModel)
         
         success, result = group_model.assign_role_to_group(group_id, app_name, app_id, role, tenant_id)
         
         if success:
-            # После назначения группы обновляем схему
-            tenant_id = tenant_id or self.default_tenant
-            self.force_rebuild_schema(tenant_id)
+            # После назначения группы планируем синхронизацию схемы
+            self.schedule_schema_sync(tenant_id)
         
         return success, result
     
     def remove_group_from_app(self, app_name: str, app_id: str, group_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет группу из приложения с определенной ролью."""
         from app.models.group_model import GroupModel
-        group_model = GroupModel()
+        group_model = get_service(GroupModel)
         
         return group_model.remove_role_from_group(group_id, app_name, app_id, role, tenant_id)
     
@@ -559,6 +550,7 @@ class AppModel(BaseModel):
         
         return all_relations
         
+    @in_unit_of_work
     def delete_app(self, app_type: str, app_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет приложение и все его отношения из системы."""
         tenant_id = tenant_id or self.default_tenant
@@ -573,39 +565,16 @@ class AppModel(BaseModel):
         if len(filtered_apps) == len(apps):
             return False, f"Приложение {app_type}:{app_id} не найдено"
         
-        # Сохраняем обновленный список приложений
-        if not self._save_apps(filtered_apps):
+        # Удаляем запись приложения из хранилища
+        if not delete_items(self.storage, 'apps', [app_key]):
             return False, f"Ошибка при удалении приложения {app_type}:{app_id}"
         
-        # Получаем текущие отношения для нахождения всех связей приложения
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        if not success:
-            return True, f"Приложение {app_type}:{app_id} удалено, но не удалось получить отношения"
+        # Удаляем все отношения, где приложение является сущностью, одним фильтром
+        deleted_count, failed_count, errors = self.relationship_model.delete_relationships_by_filter(
+            entity_type=app_type, entity_ids=[app_id], tenant_id=tenant_id
+        )
         
-        # Собираем все отношения, где приложение является сущностью
-        app_relationships = []
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            
-            if entity.get("type") == app_type and entity.get("id") == app_id:
-                subject = tuple_data.get("subject", {})
-                relation = tuple_data.get("relation", "")
-                
-                app_relationships.append({
-                    "entity_type": app_type,
-                    "entity_id": app_id,
-                    "relation": relation,
-                    "subject_type": subject.get("type"),
-                    "subject_id": subject.get("id")
-                })
-        
-        # Удаляем все отношения приложения
-        if app_relationships:
-            deleted_count, failed_count, errors = self.relationship_model.delete_multiple_relationships(
-                app_relationships, tenant_id
-            )
-            
-            if failed_count > 0:
-                return True, f"Приложение {app_type}:{app_id} удалено, но {failed_count} из {deleted_count + failed_count} отношений не удалены"
+        if failed_count > 0:
+            return True, f"Приложение {app_type}:{app_id} удалено, но не удалось удалить его отношения в Permify: {'; '.join(errors)}"
         
         return True, f"Приложение {app_type}:{app_id} и все его отношения успешно удалены" 
\ No newline at end of file
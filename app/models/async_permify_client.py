@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Awaitable, Iterable, List, Optional, Tuple
+
+from .grpc_transport import get_grpc_transport, use_grpc_transport
+from .permify_client import get_permify_client, Timeout
+from .resilience import get_resilience, is_idempotent
+
+
+def _parse_response(response) -> Tuple[bool, Any]:
+    """Преобразует ответ Permify в (успех, JSON или текст ошибки), как make_api_request."""
+    try:
+        response_text = response.text
+        response_json = response.json() if response_text else {}
+    except Exception:
+        response_text, response_json = response.text, {}
+    if response.status_code == 200:
+        return True, response_json
+    return False, f"Ошибка API: {response.status_code} - {response_text}"
+
+
+class AsyncPermifyClient:
+    """Асинхронный клиент Permify для массовых операций.
+
+    Запросы выполняются через общий HTTP-клиент с пулом соединений (get_permify_client)
+    в собственном пуле потоков, а ожидание сети перекрывается через asyncio: одновременно
+    выполняется не более PERMIFY_ASYNC_CONCURRENCY запросов, у каждого свой таймаут.
+    Для моделей, которые остаются синхронными, есть обертки *_sync (см. run_sync).
+    """
+
+    def __init__(self, host: str, concurrency: int = None, task_timeout: float = None,
+                 grpc_host: str = None):
+        if concurrency is None:
+            concurrency = int(os.environ.get("PERMIFY_ASYNC_CONCURRENCY", 16))
+        if task_timeout is None:
+            task_timeout = float(os.environ.get("PERMIFY_ASYNC_TASK_TIMEOUT", 30))
+        self.host = host
+        self.concurrency = max(1, concurrency)
+        self.task_timeout = task_timeout
+        self.client = get_permify_client(host)
+        self.grpc_host = grpc_host or os.environ.get("PERMIFY_GRPC_HOST", "http://localhost:9011")
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="permify-async")
+        # Семафор привязан к циклу событий, поэтому создается отдельно для каждого цикла
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.concurrency)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+    async def request(self, endpoint: str, data: Dict[str, Any], method: str = "post",
+                      timeout: Optional[Timeout] = None) -> Tuple[bool, Any]:
+        """Выполняет запрос к Permify; результат в формате make_api_request."""
+        if method.lower() not in ("post", "get"):
+            return False, f"Неподдерживаемый метод: {method}"
+        
+        loop = asyncio.get_running_loop()
+        # Копия контекста: запрос расходует бюджет времени вызывающего кода (request_budget)
+        context = contextvars.copy_context()
+        async with self._semaphore():
+            return await loop.run_in_executor(self._executor, lambda: context.run(
+                get_resilience(self.host).call,
+                lambda call_timeout: self._send(endpoint, data, method, call_timeout),
+                is_idempotent(endpoint, method),
+                timeout[1] if isinstance(timeout, tuple) else timeout
+            ))
+
+    def _send(self, endpoint: str, data: Dict[str, Any], method: str, timeout: float) -> Tuple[bool, Any, bool]:
+        """Одна попытка запроса: (успех, результат, можно ли повторить)."""
+        transport = get_grpc_transport(self.grpc_host) if use_grpc_transport() else None
+        if transport and transport.supports(endpoint):
+            # Вызовы мультиплексируются по одному HTTP/2-каналу
+            return transport.call(endpoint, data, timeout)
+        if method.lower() == "post":
+            response = self.client.post(endpoint, data, timeout=timeout)
+        else:
+            response = self.client.get(endpoint, params=data, timeout=timeout)
+        success, result = _parse_response(response)
+        return success, result, not success and (response.status_code == 429 or response.status_code >= 500)
+
+    async def health(self, timeout: float = 2) -> Tuple[bool, Any]:
+        """Проверяет /healthz."""
+        success, result = await self.request("/healthz", {}, method="get", timeout=timeout)
+        if success and isinstance(result, dict) and result.get("status") != "SERVING":
+            return False, f"Ошибка статуса: {result}"
+        return success, result
+
+    async def check(self, tenant_id: str, entity_type: str, entity_id: str, permission: str,
+                    subject_id: str, subject_type: str = "user", schema_version: str = "",
+                    depth: int = 20) -> Tuple[bool, Any]:
+        """Проверяет разрешение субъекта (/permissions/check)."""
+        return await self.request(f"/v1/tenants/{tenant_id}/permissions/check", {
+            "metadata": {"snap_token": "", "schema_version": schema_version or "", "depth": depth},
+            "entity": {"type": entity_type, "id": entity_id},
+            "permission": permission,
+            "subject": {"type": subject_type, "id": subject_id}
+        })
+
+    async def write_data(self, tenant_id: str, tuples: List[Dict[str, Any]],
+                         schema_version: str = "", timeout: Optional[Timeout] = None) -> Tuple[bool, Any]:
+        """Записывает отношения (/data/write)."""
+        return await self.request(f"/v1/tenants/{tenant_id}/data/write", {
+            "metadata": {"schema_version": schema_version},
+            "tuples": tuples
+        }, timeout=timeout)
+
+    async def delete_data(self, tenant_id: str, tuple_filter: Dict[str, Any]) -> Tuple[bool, Any]:
+        """Удаляет отношения по фильтру (/data/delete)."""
+        return await self.request(f"/v1/tenants/{tenant_id}/data/delete", {
+            "metadata": {"snap_token": ""},
+            "tuple_filter": tuple_filter
+        })
+
+    async def list_schemas(self, tenant_id: str, page_size: int = 50) -> Tuple[bool, Any]:
+        """Возвращает список версий схемы (/schemas/list)."""
+        success, result = await self.request(f"/v1/tenants/{tenant_id}/schemas/list", {
+            "page_size": page_size,
+            "continuous_token": ""
+        })
+        if not success and "ERROR_CODE_SCHEMA_NOT_FOUND" in str(result):
+            return True, {"schemas": []}
+        return success, result
+
+    async def read_schema(self, tenant_id: str, schema_version: str = "") -> Tuple[bool, Any]:
+        """Читает версию схемы (/schemas/read)."""
+        return await self.request(f"/v1/tenants/{tenant_id}/schemas/read", {
+            "metadata": {"schema_version": schema_version}
+        })
+
+    async def write_schema(self, tenant_id: str, schema: str) -> Tuple[bool, Any]:
+        """Записывает новую версию схемы (/schemas/write)."""
+        return await self.request(f"/v1/tenants/{tenant_id}/schemas/write", {"schema": schema})
+
+    async def gather(self, calls: Iterable[Awaitable[Tuple[bool, Any]]],
+                     timeout: float = None, limit_wait: bool = True) -> List[Tuple[bool, Any]]:
+        """Выполняет вызовы одновременно; у каждого свой таймаут, ошибки не прерывают остальные.
+
+        Число одновременных запросов ограничено семафором клиента. Результаты идут в порядке вызовов.
+        limit_wait=False не ограничивает ожидание: истечение срока отменяет только ожидание,
+        а запрос в потоке продолжается, поэтому для записей результат был бы неизвестен.
+        Их срок задает таймаут самого HTTP-запроса.
+        """
+        if timeout is None:
+            timeout = self.task_timeout
+
+        async def run(call):
+            try:
+                if not limit_wait:
+                    return await call
+                return await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                return False, f"Превышено время ожидания ({timeout:g} с)"
+            except Exception as e:
+                return False, f"Ошибка запроса: {str(e)}"
+
+        return list(await asyncio.gather(*(run(call) for call in calls)))
+
+    async def check_many(self, tenant_id: str, checks: List[Dict[str, str]], schema_version: str = "",
+                         timeout: float = None) -> List[Tuple[bool, Any]]:
+        """Выполняет проверки с ключами entity_type, entity_id, permission, subject_id[, subject_type]."""
+        return await self.gather((self.check(
+            tenant_id, check.get("entity_type"), check.get("entity_id"), check.get("permission"),
+            check.get("subject_id"), check.get("subject_type", "user"), schema_version
+        ) for check in checks), timeout)
+
+    async def write_many(self, tenant_id: str, chunks: List[List[Dict[str, Any]]], schema_version: str = "",
+                         timeout: float = None) -> List[Tuple[bool, Any]]:
+        """Записывает пачки отношений одновременно; результат - по одному на пачку.
+
+        timeout - таймаут каждого HTTP-запроса (по умолчанию PERMIFY_READ_TIMEOUT): результат
+        записи известен только после ответа или ошибки самого запроса.
+        """
+        return await self.gather((self.write_data(tenant_id, chunk, schema_version, timeout) for chunk in chunks),
+                                 limit_wait=False)
+
+    async def list_schemas_many(self, tenant_ids: List[str], timeout: float = None) -> Dict[str, Tuple[bool, Any]]:
+        """Читает списки схем нескольких тенантов одновременно."""
+        results = await self.gather((self.list_schemas(tenant_id) for tenant_id in tenant_ids), timeout)
+        return dict(zip(tenant_ids, results))
+
+    def check_many_sync(self, tenant_id: str, checks: List[Dict[str, str]], schema_version: str = "",
+                        timeout: float = None) -> List[Tuple[bool, Any]]:
+        return run_sync(self.check_many(tenant_id, checks, schema_version, timeout))
+
+    def write_many_sync(self, tenant_id: str, chunks: List[List[Dict[str, Any]]], schema_version: str = "",
+                        timeout: float = None) -> List[Tuple[bool, Any]]:
+        return run_sync(self.write_many(tenant_id, chunks, schema_version, timeout))
+
+    def list_schemas_many_sync(self, tenant_ids: List[str], timeout: float = None) -> Dict[str, Tuple[bool, Any]]:
+        return run_sync(self.list_schemas_many(tenant_ids, timeout))
+
+
+def run_sync(coroutine: Awaitable[Any]) -> Any:
+    """Выполняет корутину из синхронного кода.
+
+    Если в текущем потоке уже работает цикл событий, корутина выполняется в отдельном потоке.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result: Dict[str, Any] = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, name="permify-async-sync")
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+_async_clients: Dict[str, AsyncPermifyClient] = {}
+_async_clients_lock = threading.Lock()
+
+
+def get_async_permify_client(host: str) -> AsyncPermifyClient:
+    """Возвращает общий для процесса асинхронный клиент для указанного хоста Permify."""
+    client = _async_clients.get(host)
+    if client is not None:
+        return client
+
+    with _async_clients_lock:
+        client = _async_clients.get(host)
+        if client is None:
+            client = AsyncPermifyClient(host)
+            _async_clients[host] = client
+        return client
@@ -1,7 +1,10 @@
-import requests
 import os
 from typing import Dict, Any, List, Optional, Tuple, Union
 import json
+from .permify_client import get_permify_client, Timeout
+from .async_permify_client import get_async_permify_client
+from .grpc_transport import get_grpc_transport, use_grpc_transport
+from .resilience import get_resilience, is_idempotent
 
 class BaseModel:
     """Базовый класс для всех моделей с общей функциональностью API."""
@@ -11,11 +14,17 @@ class BaseModel:
         self.permify_host = os.environ.get("PERMIFY_HOST", "http://localhost:9010")
         self.permify_grpc_host = os.environ.get("PERMIFY_GRPC_HOST", "http://localhost:9011")
         self.default_tenant = os.environ.get("PERMIFY_TENANT", "t1")
+        self.health_timeout = float(os.environ.get("PERMIFY_HEALTH_TIMEOUT", 2))
+        
+        # Общий для процесса клиент с пулом соединений
+        self.client = get_permify_client(self.permify_host)
+        # Асинхронный клиент для массовых операций (параллельные запросы с ограничением)
+        self.async_client = get_async_permify_client(self.permify_host)
     
     def check_permify_status(self) -> Tuple[bool, str]:
         """Проверяет статус сервера Permify"""
         try:
-            response = requests.get(f"{self.permify_host}/healthz")
+            response = self.client.get("/healthz", timeout=self.health_timeout)
             if response.status_code == 200:
                 data = response.json()
                 if data.get("status") == "SERVING":
@@ -24,28 +33,45 @@ class BaseModel:
         except Exception as e:
             return False, f"Ошибка соединения: {str(e)}"
     
-    def make_api_request(self, endpoint: str, data: Dict[str, Any], method: str = "post") -> Tuple[bool, Any]:
-        """Выполняет API запрос к Permify"""
+    def make_api_request(self, endpoint: str, data: Dict[str, Any], method: str = "post",
+                         timeout: Optional[Timeout] = None) -> Tuple[bool, Any]:
+        """Выполняет API запрос к Permify через общий пул соединений.
+        
+        При PERMIFY_TRANSPORT=grpc поддерживаемые эндпоинты вызываются через gRPC. Вызов
+        проходит через слой устойчивости: срок чтений из бюджета прогона страницы, повторы
+        идемпотентных чтений и автомат отказов (см. resilience.PermifyResilience).
+        """
+        if method.lower() not in ("post", "get"):
+            return False, f"Неподдерживаемый метод: {method}"
+        
+        return get_resilience(self.permify_host).call(
+            lambda call_timeout: self._send_request(endpoint, data, method, call_timeout),
+            idempotent=is_idempotent(endpoint, method),
+            timeout=timeout[1] if isinstance(timeout, tuple) else timeout
+        )
+    
+    def _send_request(self, endpoint: str, data: Dict[str, Any], method: str,
+                      timeout: float) -> Tuple[bool, Any, bool]:
+        """Выполняет одну попытку запроса.
+        
+        Возвращает (успех, результат, можно ли повторить): повторяются ошибки сети, 429 и 5xx.
+        """
+        if use_grpc_transport():
+            transport = get_grpc_transport(self.permify_grpc_host)
+            if transport and transport.supports(endpoint):
+                print(f"DEBUG: gRPC запрос: {endpoint}")
+                return transport.call(endpoint, data, timeout)
+        
         try:
             url = f"{self.permify_host}{endpoint}"
-            print(f"DEBUG: API запрос: URL={url}, Метод={method}")
+            print(f"DEBUG: API запрос: URL={url}, Метод={method}, таймаут={timeout:.1f} с")
             
             if method.lower() == "post":
                 print(f"DEBUG: POST данные: {json.dumps(data, indent=2)}")
-                response = requests.post(
-                    url,
-                    json=data,
-                    headers={"Content-Type": "application/json"}
-                )
-            elif method.lower() == "get":
-                print(f"DEBUG: GET параметры: {data}")
-                response = requests.get(
-                    url,
-                    params=data,
-                    headers={"Content-Type": "application/json"}
-                )
+                response = self.client.post(endpoint, data, timeout=timeout)
             else:
-                return False, f"Неподдерживаемый метод: {method}"
+                print(f"DEBUG: GET параметры: {data}")
+                response = self.client.get(endpoint, params=data, timeout=timeout)
             
             print(f"DEBUG: Статус ответа: {response.status_code}")
             print(f"DEBUG: Заголовки ответа: {dict(response.headers)}")
@@ -59,12 +85,13 @@ class BaseModel:
                 response_json = {}
             
             if response.status_code == 200:
-                return True, response_json
+                return True, response_json, False
             else:
-                return False, f"Ошибка API: {response.status_code} - {response_text}"
+                retryable = response.status_code == 429 or response.status_code >= 500
+                return False, f"Ошибка API: {response.status_code} - {response_text}", retryable
         except Exception as e:
             import traceback
             traceback_text = traceback.format_exc()
             print(f"DEBUG: Исключение в make_api_request: {str(e)}")
             print(f"DEBUG: Трассировка:\n{traceback_text}")
-            return False, f"Ошибка запроса: {str(e)}\n{traceback_text}" 
\ No newline at end of file
+            return False, f"Ошибка запроса: {str(e)}\n{traceback_text}", True
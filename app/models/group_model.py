@@ -1,37 +1,35 @@
 from .base_model import BaseModel
 from .relationship_model import RelationshipModel
+from .storage import get_storage
+from .unit_of_work import delete_items, in_unit_of_work, load_items, save_items, upsert_items
 from typing import Dict, Any, List, Optional, Tuple, Union
-import os
-import json
+from app.registry import get_service
 
 class GroupModel(BaseModel):
     """Модель для управления группами в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.relationship_model = RelationshipModel()
-        self.groups_file = os.path.join(os.getcwd(), 'data', 'groups.json')
-        
-        # Создаем директорию data, если она не существует
-        os.makedirs(os.path.dirname(self.groups_file), exist_ok=True)
+        self.relationship_model = get_service(RelationshipModel)
+        # Постоянное хранилище (JSON-файлы или SQLite, см. STORAGE_BACKEND)
+        self.storage = get_storage()
     
     def _load_groups(self) -> List[Dict[str, Any]]:
-        """Загружает список групп из файла."""
-        if not os.path.exists(self.groups_file):
-            return []
-        
-        try:
-            with open(self.groups_file, 'r') as f:
-                return json.load(f).get('groups', [])
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        """Загружает список групп из хранилища."""
+        return load_items(self.storage, 'groups')
     
     def _save_groups(self, groups: List[Dict[str, Any]]) -> bool:
-        """Сохраняет список групп в файл."""
+        """Сохраняет список групп в хранилище целиком."""
+        try:
+            return save_items(self.storage, 'groups', groups)
+        except Exception as e:
+            print(f"Ошибка при сохранении групп: {str(e)}")
+            return False
+    
+    def _upsert_group(self, group: Dict[str, Any]) -> bool:
+        """Добавляет или обновляет одну запись в хранилище."""
         try:
-            with open(self.groups_file, 'w') as f:
-                json.dump({'groups': groups}, f, indent=2)
-            return True
+            return upsert_items(self.storage, 'groups', [group])
         except Exception as e:
             print(f"Ошибка при сохранении групп: {str(e)}")
             return False
@@ -44,70 +42,28 @@ class GroupModel(BaseModel):
         stored_groups = self._load_groups()
         groups_dict = {group.get('id'): group for group in stored_groups}
         
-        # Получаем информацию из отношений
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        
-        if success:
-            for tuple_data in relationships.get("tuples", []):
-                entity = tuple_data.get("entity", {})
-                subject = tuple_data.get("subject", {})
-                relation = tuple_data.get("relation", "")
-                
-                # Если это группа как сущность
-                if entity.get("type") == "group":
-                    group_id = entity.get("id")
-                    if group_id not in groups_dict:
-                        groups_dict[group_id] = {
-                            "id": group_id,
-                            "name": f"Группа {group_id}",
-                            "members": [],
-                            "app_memberships": []
-                        }
-                    
-                    # Если это отношение member с пользователем
-                    if relation == "member" and subject.get("type") == "user":
-                        user_id = subject.get("id")
-                        if "members" not in groups_dict[group_id]:
-                            groups_dict[group_id]["members"] = []
-                        if user_id not in groups_dict[group_id]["members"]:
-                            groups_dict[group_id]["members"].append(user_id)
-                
-                # Если это группа как субъект (для связей с приложениями)
-                elif subject.get("type") == "group":
-                    group_id = subject.get("id")
-                    if group_id not in groups_dict:
-                        groups_dict[group_id] = {
-                            "id": group_id,
-                            "name": f"Группа {group_id}",
-                            "members": [],
-                            "app_memberships": []
-                        }
-                    
-                    # Проверяем роль группы в приложении
-                    if relation.startswith("group_"):
-                        app_type = entity.get("type")
-                        app_id = entity.get("id")
-                        role = relation  # Сохраняем полное имя роли с префиксом group_
-                        
-                        if "app_memberships" not in groups_dict[group_id]:
-                            groups_dict[group_id]["app_memberships"] = []
-                        
-                        # Проверяем, нет ли уже такого же точно членства
-                        existing_membership = False
-                        for membership in groups_dict[group_id].get("app_memberships", []):
-                            if (membership.get("app_type") == app_type and 
-                                membership.get("app_id") == app_id and
-                                membership.get("role") == role):
-                                existing_membership = True
-                                break
-                        
-                        # Добавляем новое членство, если такого еще нет
-                        if not existing_membership:
-                            groups_dict[group_id]["app_memberships"].append({
-                                "app_type": app_type,
-                                "app_id": app_id,
-                                "role": role
-                            })
+        # Дополняем данными из отношений (представление поддерживается хранилищем отношений)
+        for group_id, view in self.relationship_model.get_group_views(tenant_id).items():
+            if group_id not in groups_dict:
+                groups_dict[group_id] = {
+                    "id": group_id,
+                    "name": f"Группа {group_id}",
+                    "members": [],
+                    "app_memberships": []
+                }
+            group = groups_dict[group_id]
+            
+            if view["members"]:
+                members = group.setdefault("members", [])
+                known_members = set(members)
+                members.extend(user_id for user_id in view["members"] if user_id not in known_members)
+            
+            if view["app_memberships"]:
+                memberships = group.setdefault("app_memberships", [])
+                known_memberships = {(membership.get("app_type"), membership.get("app_id"), membership.get("role"))
+                                     for membership in memberships}
+                memberships.extend(membership for membership in view["app_memberships"]
+                                   if (membership["app_type"], membership["app_id"], membership["role"]) not in known_memberships)
         
         # Возвращаем словарь с группами вместо списка
         return groups_dict
@@ -129,10 +85,8 @@ class GroupModel(BaseModel):
             "app_memberships": []
         }
         
-        groups.append(new_group)
-        
-        # Сохраняем обновленный список групп
-        if self._save_groups(groups):
+        # Сохраняем только новую запись
+        if self._upsert_group(new_group):
             return True, f"Группа {group_id} создана"
         else:
             return False, "Ошибка при сохранении группы"
@@ -144,7 +98,7 @@ class GroupModel(BaseModel):
         for i, group in enumerate(groups):
             if group.get('id') == group_id:
                 groups[i]['name'] = name
-                if self._save_groups(groups):
+                if self._upsert_group(groups[i]):
                     return True, f"Информация о группе {group_id} обновлена"
                 else:
                     return False, "Ошибка при сохранении группы"
@@ -153,15 +107,12 @@ class GroupModel(BaseModel):
     
     def delete_group(self, group_id: str) -> Tuple[bool, str]:
         """Удаляет группу из хранилища."""
-        groups = self._load_groups()
-        
-        groups = [group for group in groups if group.get('id') != group_id]
-        
-        if self._save_groups(groups):
+        if delete_items(self.storage, 'groups', [group_id]):
             return True, f"Группа {group_id} удалена из системы"
         else:
             return False, "Ошибка при удалении группы"
             
+    @in_unit_of_work
     def delete_group_with_relations(self, group_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет группу и все ее отношения из системы."""
         tenant_id = tenant_id or self.default_tenant
@@ -171,46 +122,16 @@ class GroupModel(BaseModel):
         if not delete_success:
             return delete_success, delete_message
         
-        # Получаем текущие отношения для нахождения всех связей группы
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        if not success:
-            return True, f"Группа {group_id} удалена, но не удалось получить отношения"
+        # Удаляем отношения, где группа - сущность (пользователи в группе)
+        # и где группа - субъект (группа имеет роли в приложениях)
+        deleted_count, failed_count, errors = self.relationship_model.delete_relationships_by_filter(
+            entity_type="group", entity_ids=[group_id],
+            subject_type="group", subject_ids=[group_id],
+            tenant_id=tenant_id
+        )
         
-        # Собираем все отношения, связанные с группой
-        group_relationships = []
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            relation = tuple_data.get("relation", "")
-            
-            # Отношения, где группа - сущность (пользователи в группе)
-            if entity.get("type") == "group" and entity.get("id") == group_id:
-                group_relationships.append({
-                    "entity_type": "group",
-                    "entity_id": group_id,
-                    "relation": relation,
-                    "subject_type": subject.get("type"),
-                    "subject_id": subject.get("id")
-                })
-            
-            # Отношения, где группа - субъект (группа имеет роли в приложениях)
-            elif subject.get("type") == "group" and subject.get("id") == group_id:
-                group_relationships.append({
-                    "entity_type": entity.get("type"),
-                    "entity_id": entity.get("id"),
-                    "relation": relation,
-                    "subject_type": "group",
-                    "subject_id": group_id
-                })
-        
-        # Удаляем все отношения группы
-        if group_relationships:
-            deleted_count, failed_count, errors = self.relationship_model.delete_multiple_relationships(
-                group_relationships, tenant_id
-            )
-            
-            if failed_count > 0:
-                return True, f"Группа {group_id} удалена, но {failed_count} из {deleted_count + failed_count} отношений не удалены"
+        if failed_count > 0:
+            return True, f"Группа {group_id} удалена, но не удалось удалить ее отношения в Permify: {'; '.join(errors)}"
         
         return True, f"Группа {group_id} и все её отношения успешно удалены"
     
@@ -270,6 +191,7 @@ class GroupModel(BaseModel):
         # Удаляем отношение
         return self.relationship_model.delete_relationship(app_name, app_id, group_role, "group", group_id, tenant_id)
     
+    @in_unit_of_work
     def assign_multiple_roles_to_group(self, group_id: str, app_name: str, app_id: str, roles: List[str], tenant_id: str = None) -> Tuple[int, int, List[str]]:
         """Назначает несколько ролей группе для приложения.
         
@@ -301,10 +223,9 @@ class GroupModel(BaseModel):
         if not group_exists:
             self.create_group(group_id, f"Группа {group_id}")
         
-        # Назначаем каждую роль по отдельности
-        for role in roles:
-            success, message = self.relationship_model.assign_role_to_group(group_id, app_name, app_id, role, tenant_id)
-            
+        # Назначаем все роли одним пакетным запросом
+        results = self.relationship_model.assign_roles_to_group(group_id, app_name, app_id, roles, tenant_id)
+        for role, (success, message) in zip(roles, results):
             if success:
                 success_count += 1
             else:
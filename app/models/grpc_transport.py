@@ -0,0 +1,238 @@
+import glob
+import importlib
+import os
+import re
+import sys
+import tempfile
+import threading
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+import grpc
+from google.protobuf import json_format
+
+# REST-эндпоинт (после /v1/tenants/{tenant_id}/) -> (сервис, метод, сообщение запроса)
+_ROUTES = {
+    "permissions/check": ("Permission", "Check", "PermissionCheckRequest"),
+    "data/write": ("Data", "Write", "DataWriteRequest"),
+    "data/delete": ("Data", "Delete", "DataDeleteRequest"),
+    "schemas/write": ("Schema", "Write", "SchemaWriteRequest"),
+    "schemas/read": ("Schema", "Read", "SchemaReadRequest"),
+    "schemas/list": ("Schema", "List", "SchemaListRequest"),
+}
+_ENDPOINT = re.compile(r"^/v1/tenants/([^/]+)/(.+)$")
+# Коды ошибок, говорящие о состоянии сервера или сети, а не о самом запросе
+_RETRYABLE_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED,
+                    grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.ABORTED, grpc.StatusCode.INTERNAL}
+
+# Модули, которые grpc_tools генерирует из base/v1/service.proto Permify
+_SERVICE_MODULE = "base.v1.service_pb2"
+_SERVICE_GRPC_MODULE = "base.v1.service_pb2_grpc"
+
+
+def _parse_target(host: str) -> Tuple[str, bool]:
+    """Преобразует PERMIFY_GRPC_HOST (http://host:port) в адрес gRPC и признак TLS."""
+    secure = host.startswith("https://")
+    target = host.split("://", 1)[-1].rstrip("/")
+    return target, secure
+
+
+def generate_stubs(proto_dir: str, stubs_dir: str) -> bool:
+    """Генерирует Python-модули из proto Permify и его зависимостей через grpc_tools.protoc.
+
+    proto_dir должен содержать base/v1/*.proto и импортируемые ими файлы (google/api,
+    validate, protoc-gen-openapiv2), например результат buf export buf.build/permify/permify.
+    """
+    from grpc_tools import protoc
+
+    well_known = os.path.join(os.path.dirname(protoc.__file__), "_proto")
+    files = [os.path.relpath(path, proto_dir)
+             for path in glob.glob(os.path.join(proto_dir, "**", "*.proto"), recursive=True)
+             # Стандартные типы уже входят в пакет protobuf
+             if not os.path.relpath(path, proto_dir).startswith(os.path.join("google", "protobuf"))]
+    if not files:
+        print(f"DEBUG: В {proto_dir} не найдены proto-файлы Permify")
+        return False
+
+    os.makedirs(stubs_dir, exist_ok=True)
+    code = protoc.main([
+        "grpc_tools.protoc",
+        f"-I{proto_dir}",
+        f"-I{well_known}",
+        f"--python_out={stubs_dir}",
+        f"--grpc_python_out={stubs_dir}",
+        *files
+    ])
+    if code != 0:
+        print(f"DEBUG: Ошибка генерации gRPC-модулей Permify (код {code})")
+        return False
+    return True
+
+
+def load_stubs(proto_dir: Optional[str] = None, stubs_dir: Optional[str] = None):
+    """Импортирует сгенерированные модули Permify; при необходимости генерирует их из proto_dir.
+
+    Возвращает (модуль сообщений, модуль сервисов) или вызывает ImportError.
+    """
+    if proto_dir is None:
+        proto_dir = os.environ.get("PERMIFY_PROTO_DIR", "")
+    if stubs_dir is None:
+        stubs_dir = os.environ.get("PERMIFY_GRPC_STUBS_DIR",
+                                   os.path.join(tempfile.gettempdir(), "permify_grpc_stubs"))
+
+    if os.path.isdir(stubs_dir) and stubs_dir not in sys.path:
+        sys.path.insert(0, stubs_dir)
+    try:
+        return importlib.import_module(_SERVICE_MODULE), importlib.import_module(_SERVICE_GRPC_MODULE)
+    except ImportError:
+        if not proto_dir:
+            raise
+
+    if not generate_stubs(proto_dir, stubs_dir):
+        raise ImportError(f"Не удалось сгенерировать gRPC-модули Permify из {proto_dir}")
+    if stubs_dir not in sys.path:
+        sys.path.insert(0, stubs_dir)
+    importlib.invalidate_caches()
+    return importlib.import_module(_SERVICE_MODULE), importlib.import_module(_SERVICE_GRPC_MODULE)
+
+
+_channels: Dict[str, grpc.Channel] = {}
+_channels_lock = threading.Lock()
+
+
+def get_grpc_channel(host: str) -> grpc.Channel:
+    """Возвращает общий для процесса HTTP/2-канал к Permify.
+
+    Все вызовы мультиплексируются по одному соединению; keepalive не дает балансировщикам
+    закрывать простаивающее соединение.
+    """
+    channel = _channels.get(host)
+    if channel is not None:
+        return channel
+
+    with _channels_lock:
+        channel = _channels.get(host)
+        if channel is None:
+            target, secure = _parse_target(host)
+            options = [
+                ("grpc.keepalive_time_ms", int(os.environ.get("PERMIFY_GRPC_KEEPALIVE_MS", 30000))),
+                ("grpc.keepalive_timeout_ms", 10000),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+                ("grpc.max_receive_message_length", 64 * 1024 * 1024)
+            ]
+            if secure:
+                channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), options=options)
+            else:
+                channel = grpc.insecure_channel(target, options=options)
+            _channels[host] = channel
+        return channel
+
+
+def grpc_health_check(host: str, timeout: float = 2) -> Tuple[bool, str]:
+    """Проверяет Permify по стандартному протоколу grpc.health.v1 (без сгенерированных модулей)."""
+    check = get_grpc_channel(host).unary_unary(
+        "/grpc.health.v1.Health/Check",
+        request_serializer=lambda request: request,
+        response_deserializer=lambda response: response
+    )
+    try:
+        # HealthCheckResponse: поле 1 (status) типа enum, SERVING = 1
+        response = check(b"", timeout=timeout)
+    except grpc.RpcError as e:
+        return False, f"Ошибка gRPC: {e.code().name} - {e.details()}"
+    status = response[1] if len(response) >= 2 and response[0] == 0x08 else 0
+    if status == 1:
+        return True, "Сервер работает"
+    return False, f"Ошибка статуса: {status}"
+
+
+class PermifyGrpcTransport:
+    """gRPC-транспорт Permify с тем же интерфейсом запросов, что и REST.
+
+    request() принимает REST-эндпоинт и JSON-тело из моделей, преобразует их в сообщение
+    gRPC и возвращает ответ в виде словаря (поля в snake_case, перечисления - именами),
+    поэтому модели не зависят от выбранного транспорта (PERMIFY_TRANSPORT).
+    """
+
+    def __init__(self, host: str, timeout: float = None):
+        self.host = host
+        self.timeout = timeout or float(os.environ.get("PERMIFY_READ_TIMEOUT", 30))
+        self.messages, services = load_stubs()
+        self.channel = get_grpc_channel(host)
+        self.stubs = {name: getattr(services, f"{name}Stub")(self.channel)
+                      for name in ("Permission", "Data", "Schema", "Watch")}
+
+    @staticmethod
+    def supports(endpoint: str) -> bool:
+        match = _ENDPOINT.match(endpoint)
+        return bool(match and match.group(2) in _ROUTES)
+
+    def request(self, endpoint: str, data: Dict[str, Any], timeout: float = None) -> Tuple[bool, Any]:
+        """Выполняет вызов, соответствующий REST-эндпоинту; результат в формате make_api_request."""
+        success, result, _ = self.call(endpoint, data, timeout)
+        return success, result
+
+    def call(self, endpoint: str, data: Dict[str, Any], timeout: float = None) -> Tuple[bool, Any, bool]:
+        """Как request, но дополнительно сообщает, вызвана ли ошибка состоянием сервера или сети."""
+        match = _ENDPOINT.match(endpoint)
+        if not match or match.group(2) not in _ROUTES:
+            return False, f"Эндпоинт не поддерживается gRPC-транспортом: {endpoint}", False
+        service, method, message_name = _ROUTES[match.group(2)]
+
+        message = getattr(self.messages, message_name)()
+        json_format.ParseDict({**data, "tenant_id": match.group(1)}, message, ignore_unknown_fields=True)
+        try:
+            response = getattr(self.stubs[service], method)(message, timeout=timeout or self.timeout)
+        except grpc.RpcError as e:
+            return False, f"Ошибка gRPC: {e.code().name} - {e.details()}", e.code() in _RETRYABLE_CODES
+        return True, json_format.MessageToDict(response, preserving_proto_field_name=True), False
+
+    def lookup_entities(self, tenant_id: str, entity_type: str, permission: str, subject_id: str,
+                        subject_type: str = "user", schema_version: str = "",
+                        timeout: float = None) -> Iterator[str]:
+        """Потоково возвращает ID сущностей, на которые у субъекта есть разрешение."""
+        message = self.messages.PermissionLookupEntityRequest()
+        json_format.ParseDict({
+            "tenant_id": tenant_id,
+            "metadata": {"schema_version": schema_version, "snap_token": "", "depth": 20},
+            "entity_type": entity_type,
+            "permission": permission,
+            "subject": {"type": subject_type, "id": subject_id}
+        }, message, ignore_unknown_fields=True)
+        for response in self.stubs["Permission"].LookupEntityStream(message, timeout=timeout or self.timeout):
+            yield response.entity_id
+
+    def watch(self, tenant_id: str, snap_token: str = "") -> Iterator[Dict[str, Any]]:
+        """Потоково возвращает изменения данных тенанта (требует включенного watch в Permify)."""
+        message = self.messages.WatchRequest()
+        json_format.ParseDict({"tenant_id": tenant_id, "snap_token": snap_token}, message,
+                              ignore_unknown_fields=True)
+        for response in self.stubs["Watch"].Watch(message):
+            yield json_format.MessageToDict(response.changes, preserving_proto_field_name=True)
+
+
+_transports: Dict[str, Optional[PermifyGrpcTransport]] = {}
+_transports_lock = threading.Lock()
+
+
+def use_grpc_transport() -> bool:
+    """Выбран ли gRPC-транспорт для запросов к Permify (PERMIFY_TRANSPORT=grpc)."""
+    return os.environ.get("PERMIFY_TRANSPORT", "rest").lower() == "grpc"
+
+
+def get_grpc_transport(host: str) -> Optional[PermifyGrpcTransport]:
+    """Возвращает общий для процесса gRPC-транспорт или None, если модули Permify недоступны.
+
+    Во втором случае запросы выполняются через REST.
+    """
+    if host in _transports:
+        return _transports[host]
+
+    with _transports_lock:
+        if host not in _transports:
+            try:
+                _transports[host] = PermifyGrpcTransport(host)
+            except Exception as e:
+                print(f"DEBUG: gRPC-транспорт недоступен, используется REST: {str(e)}")
+                _transports[host] = None
+        return _transports[host]
@@ -0,0 +1,160 @@
+import os
+from typing import Dict, Any, Optional, Tuple
+
+from .schema_compiler import CompiledSchema, EXCLUSION, INTERSECTION, RewriteNode
+from .tuple_store import TupleStore
+
+CHECK_ALLOWED = "CHECK_RESULT_ALLOWED"
+CHECK_DENIED = "CHECK_RESULT_DENIED"
+# Результат нельзя вычислить локально (причина - в metadata.error)
+CHECK_UNDETERMINED = "CHECK_RESULT_UNSPECIFIED"
+
+
+class DepthLimitExceeded(Exception):
+    """Превышена максимальная глубина обхода отношений."""
+
+
+class NotComputableLocally(Exception):
+    """Результат зависит от того, что локальная проверка не вычисляет (атрибуты, правила,
+    циклы через исключение)."""
+
+
+class LocalPermissionChecker:
+    """Проверка разрешений по скомпилированной схеме и локальному индексу отношений.
+
+    Вычисляет entity#permission@subject без запросов к Permify: поддерживает or/and/not,
+    переходы relation.member и usersets в субъектах (group#member). Подзадачи
+    мемоизируются, поэтому один экземпляр выгодно использовать для серии проверок.
+    Атрибуты и правила (ABAC) локально не вычисляются: такие проверки возвращают
+    CHECK_UNDETERMINED, а не разрешение или запрет.
+    """
+
+    def __init__(self, schema: CompiledSchema, store: TupleStore, max_depth: int = None):
+        self.schema = schema
+        self.store = store
+        self.max_depth = max_depth or int(os.environ.get("PERMIFY_LOCAL_CHECK_DEPTH", 20))
+        self.check_count = 0
+
+        # (entity_type, entity_id, relation_or_permission, subject_type, subject_id) -> результат
+        self._memo: Dict[Tuple[str, str, str, str, str], bool] = {}
+        # Подзадачи, которые сейчас вычисляются: ключ -> позиция в стеке обхода
+        self._in_progress: Dict[Tuple[str, str, str, str, str], int] = {}
+        # Наименьшая позиция незавершенной подзадачи, от которой зависел текущий результат
+        self._lowest_dependency = float("inf")
+        # Позиции в стеке обхода, на которых началось вычисление исключаемых операндов (not)
+        self._negations = []
+
+    def check(self, entity_type: str, entity_id: str, permission: str,
+              subject_type: str, subject_id: str) -> Dict[str, Any]:
+        """Проверяет разрешение и возвращает ответ в формате permissions/check."""
+        checks_before = self.check_count
+        error = None
+        try:
+            can = CHECK_ALLOWED if self._check(entity_type, entity_id, permission,
+                                               subject_type, subject_id, 0) else CHECK_DENIED
+        except DepthLimitExceeded:
+            can = CHECK_DENIED
+            error = f"Превышена глубина проверки ({self.max_depth})"
+        except NotComputableLocally as e:
+            can = CHECK_UNDETERMINED
+            error = f"Не вычисляется локально: {str(e)}"
+
+        result = {
+            "can": can,
+            "metadata": {
+                "check_count": self.check_count - checks_before,
+                "source": "local",
+                "schema_version": self.schema.version
+            }
+        }
+        if error:
+            result["metadata"]["error"] = error
+        return result
+
+    def _check(self, entity_type: str, entity_id: str, name: str,
+               subject_type: str, subject_id: str, depth: int) -> bool:
+        if depth > self.max_depth:
+            raise DepthLimitExceeded()
+
+        key = (entity_type, entity_id, name, subject_type, subject_id)
+        if key in self._memo:
+            return self._memo[key]
+        if key in self._in_progress:
+            # Цикл через исключение: допущение «ложно» под not превращается в «истинно»
+            if any(negation > self._in_progress[key] for negation in self._negations):
+                raise NotComputableLocally(f"цикл через исключение ({entity_type}#{name})")
+            # Цикл: пока подзадача вычисляется, считаем ее ложной; результаты, зависящие
+            # от этого допущения, не запоминаются
+            self._lowest_dependency = min(self._lowest_dependency, self._in_progress[key])
+            return False
+
+        position = len(self._in_progress)
+        self._in_progress[key] = position
+        outer_dependency, self._lowest_dependency = self._lowest_dependency, float("inf")
+        self.check_count += 1
+
+        entity = self.schema.entities.get(entity_type)
+        try:
+            if entity is not None and name in entity.permissions:
+                result = self._eval(entity_type, entity_id, entity.permissions[name], subject_type, subject_id, depth)
+            else:
+                result = self._check_relation(entity_type, entity_id, name, subject_type, subject_id, depth)
+        finally:
+            del self._in_progress[key]
+            dependency = self._lowest_dependency
+            # Зависимость от самой подзадачи разрешена; от внешних незавершенных - передается выше
+            self._lowest_dependency = min(outer_dependency, dependency if dependency < position else float("inf"))
+
+        if dependency >= position:
+            self._memo[key] = result
+        return result
+
+    def _check_relation(self, entity_type: str, entity_id: str, relation: str,
+                        subject_type: str, subject_id: str, depth: int) -> bool:
+        """Проверяет, входит ли субъект в отношение напрямую или через userset (group#member)."""
+        if self.store.contains(entity_type, entity_id, relation, subject_type, subject_id):
+            return True
+
+        for tuple_data in self.store.find(entity_type=entity_type, entity_id=entity_id, relation=relation):
+            subject = tuple_data.get("subject", {})
+            subject_relation = subject.get("relation")
+            if subject_relation and self._check(subject.get("type"), subject.get("id"), subject_relation,
+                                                subject_type, subject_id, depth + 1):
+                return True
+        return False
+
+    def _eval(self, entity_type: str, entity_id: str, node: RewriteNode,
+              subject_type: str, subject_id: str, depth: int) -> bool:
+        if node.kind == "computed":
+            return self._check(entity_type, entity_id, node.relation, subject_type, subject_id, depth + 1)
+
+        if node.kind == "tuple_to":
+            # relation.computed: переходим к субъектам отношения и проверяем computed у них
+            for tuple_data in self.store.find(entity_type=entity_type, entity_id=entity_id, relation=node.relation):
+                subject = tuple_data.get("subject", {})
+                if self._check(subject.get("type"), subject.get("id"), node.computed,
+                               subject_type, subject_id, depth + 1):
+                    return True
+            return False
+
+        if node.kind in ("attribute", "call"):
+            raise NotComputableLocally(f"{'атрибут' if node.kind == 'attribute' else 'правило'} "
+                                       f"{node.relation} ({entity_type})")
+
+        if not node.children:
+            return False
+        if node.operation == INTERSECTION:
+            return all(self._eval(entity_type, entity_id, child, subject_type, subject_id, depth)
+                       for child in node.children)
+        if node.operation == EXCLUSION:
+            first, rest = node.children[0], node.children[1:]
+            if not self._eval(entity_type, entity_id, first, subject_type, subject_id, depth):
+                return False
+            self._negations.append(len(self._in_progress))
+            try:
+                return not any(self._eval(entity_type, entity_id, child, subject_type, subject_id, depth)
+                               for child in rest)
+            finally:
+                self._negations.pop()
+        return any(self._eval(entity_type, entity_id, child, subject_type, subject_id, depth)
+                   for child in node.children)
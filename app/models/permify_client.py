@@ -0,0 +1,98 @@
+import gzip
+import json
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Таймаут может быть задан одним числом или парой (connect, read)
+Timeout = Union[float, Tuple[float, float]]
+
+
+class PermifyClient:
+    """HTTP-клиент Permify с пулом соединений и keep-alive.
+
+    Один экземпляр на хост используется всеми моделями и сессиями Streamlit,
+    поэтому TCP/TLS-соединение устанавливается один раз на процесс, а не на каждый запрос.
+    """
+
+    def __init__(self, host: str, pool_size: int = None, connect_timeout: float = None,
+                 read_timeout: float = None, gzip_min_bytes: int = None):
+        self.host = host.rstrip("/")
+        self.pool_size = pool_size or int(os.environ.get("PERMIFY_HTTP_POOL_SIZE", 20))
+        self.connect_timeout = connect_timeout or float(os.environ.get("PERMIFY_CONNECT_TIMEOUT", 3.05))
+        self.read_timeout = read_timeout or float(os.environ.get("PERMIFY_READ_TIMEOUT", 30))
+
+        # Сжатие тела запроса включается только явно: 0 - не сжимать никогда
+        if gzip_min_bytes is None:
+            gzip_min_bytes = int(os.environ.get("PERMIFY_GZIP_MIN_BYTES", 0))
+        self.gzip_min_bytes = gzip_min_bytes
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+
+    def _resolve_timeout(self, timeout: Optional[Timeout]) -> Tuple[float, float]:
+        """Возвращает пару (connect, read) с учетом значений по умолчанию."""
+        if timeout is None:
+            return self.connect_timeout, self.read_timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return min(self.connect_timeout, timeout), timeout
+
+    def _encode_body(self, data: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+        """Сериализует тело запроса и при необходимости сжимает его gzip."""
+        body = json.dumps(data).encode("utf-8")
+        headers = {}
+        if self.gzip_min_bytes and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def post(self, endpoint: str, data: Dict[str, Any], timeout: Optional[Timeout] = None) -> requests.Response:
+        """Выполняет POST-запрос с JSON-телом."""
+        body, headers = self._encode_body(data)
+        return self.session.post(
+            f"{self.host}{endpoint}",
+            data=body,
+            headers=headers,
+            timeout=self._resolve_timeout(timeout)
+        )
+
+    def get(self, endpoint: str, params: Dict[str, Any] = None, timeout: Optional[Timeout] = None) -> requests.Response:
+        """Выполняет GET-запрос."""
+        return self.session.get(
+            f"{self.host}{endpoint}",
+            params=params,
+            timeout=self._resolve_timeout(timeout)
+        )
+
+    def close(self):
+        """Закрывает все соединения пула."""
+        self.session.close()
+
+
+_clients: Dict[str, PermifyClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_permify_client(host: str) -> PermifyClient:
+    """Возвращает общий для процесса клиент для указанного хоста Permify."""
+    client = _clients.get(host)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = PermifyClient(host)
+            _clients[host] = client
+        return client
@@ -1,37 +1,50 @@
 from .base_model import BaseModel
+from .storage import get_storage
+from .local_checker import CHECK_ALLOWED, CHECK_UNDETERMINED, LocalPermissionChecker
+from .schema_compiler import CompiledSchema
+from .tuple_store import StagedTupleStore, TupleKey, TupleStore, get_tuple_store, make_tuple, tuple_key
+from .unit_of_work import current_unit_of_work, in_unit_of_work
 from typing import Dict, Any, List, Optional, Tuple, Union
 import os
-import json
+from app.registry import get_service
 
 class RelationshipModel(BaseModel):
     """Модель для работы с отношениями (tuples) Permify."""
     
     def __init__(self):
         super().__init__()
-        self.relationships_file = os.path.join(os.getcwd(), 'data', 'relationships.json')
-        
-        # Создаем директорию data, если она не существует
-        os.makedirs(os.path.dirname(self.relationships_file), exist_ok=True)
-        
-        # Создаем файл с пустым списком отношений, если он не существует
-        if not os.path.exists(self.relationships_file):
-            with open(self.relationships_file, 'w') as f:
-                json.dump({"tuples": []}, f, indent=2)
+        # Постоянное хранилище (JSON-файлы или SQLite, см. STORAGE_BACKEND)
+        self.storage = get_storage()
+        # Максимальное число отношений в одном запросе /data/write
+        self.write_chunk_size = int(os.environ.get("PERMIFY_WRITE_CHUNK_SIZE", 100))
+    
+    def _get_store(self) -> Union[TupleStore, StagedTupleStore]:
+        """Возвращает индексированное хранилище отношений (перечитывается только при изменении данных).
+
+        Внутри единицы работы изменения накапливаются поверх общего хранилища и попадают
+        в него только после записи.
+        """
+        uow = current_unit_of_work()
+        # В пределах единицы работы актуальность данных проверяется один раз
+        refresh = uow is None or uow.touch(("relationships", id(self.storage)))
+        store = get_tuple_store(self.storage, refresh=refresh)
+        return store if uow is None else uow.tuple_store(self.storage, store)
     
     def _load_relationships(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Загружает отношения из файла."""
-        try:
-            with open(self.relationships_file, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {"tuples": []}
+        """Загружает отношения из хранилища."""
+        return self._get_store().to_dict()
     
-    def _save_relationships(self, relationships: Dict[str, List[Dict[str, Any]]]) -> bool:
-        """Сохраняет отношения в файл."""
-        try:
-            with open(self.relationships_file, 'w') as f:
-                json.dump(relationships, f, indent=2)
+    def _save_relationships(self, added: List[Dict[str, Any]] = None, removed: List[TupleKey] = None) -> bool:
+        """Сохраняет изменения отношений: добавленные отношения и ключи удаленных."""
+        if current_unit_of_work() is not None:
+            # Изменения уже накоплены в единице работы и запишутся одним вызовом при ее завершении
             return True
+        store = self._get_store()
+        try:
+            with store.lock:
+                saved = self.storage.write_tuples(added or [], removed or [], store.all)
+                store.mark_synced()
+            return saved
         except Exception as e:
             print(f"Ошибка при сохранении отношений: {str(e)}")
             return False
@@ -40,79 +53,44 @@ class RelationshipModel(BaseModel):
         """Получает список отношений с возможностью фильтрации."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Загружаем отношения из файла
-        relationships = self._load_relationships()
+        store = self._get_store()
         
-        # Применяем фильтрацию, если нужно
+        # Применяем фильтрацию через индексы, если нужно
         if filters:
-            filtered_tuples = []
-            for tuple_data in relationships.get("tuples", []):
-                matches = True
-                
-                # Фильтр по типу сущности
-                if "entity_type" in filters and tuple_data.get("entity", {}).get("type") != filters["entity_type"]:
-                    matches = False
-                
-                # Фильтр по ID сущности
-                if "entity_id" in filters and tuple_data.get("entity", {}).get("id") != filters["entity_id"]:
-                    matches = False
-                
-                # Фильтр по отношению
-                if "relation" in filters and tuple_data.get("relation") != filters["relation"]:
-                    matches = False
-                
-                # Фильтр по типу субъекта
-                if "subject_type" in filters and tuple_data.get("subject", {}).get("type") != filters["subject_type"]:
-                    matches = False
-                
-                # Фильтр по ID субъекта
-                if "subject_id" in filters and tuple_data.get("subject", {}).get("id") != filters["subject_id"]:
-                    matches = False
-                
-                if matches:
-                    filtered_tuples.append(tuple_data)
-            
-            return True, {"tuples": filtered_tuples}
+            filter_fields = ["entity_type", "entity_id", "relation", "subject_type", "subject_id"]
+            return True, {"tuples": store.find(**{field: filters[field] for field in filter_fields if field in filters})}
         
         # В режиме локальной разработки просто возвращаем все отношения
-        return True, relationships
+        return True, store.to_dict()
+    
+    def get_user_views(self, tenant_id: str = None) -> Dict[str, Dict[str, List[Any]]]:
+        """Возвращает группы и роли пользователей из отношений (поддерживаются инкрементально)."""
+        return self._get_store().user_views()
+    
+    def get_group_views(self, tenant_id: str = None) -> Dict[str, Dict[str, List[Any]]]:
+        """Возвращает участников и роли групп из отношений."""
+        return self._get_store().group_views()
+    
+    def get_app_views(self, tenant_id: str = None) -> Dict[Tuple[str, str], Dict[str, List[Any]]]:
+        """Возвращает пользователей и группы экземпляров приложений из отношений."""
+        return self._get_store().app_views()
     
     def create_relationship(self, entity_type: str, entity_id: str, relation: str, 
                             subject_type: str, subject_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Создает новое отношение."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Загружаем текущие отношения
-        relationships = self._load_relationships()
-        
-        # Проверяем, существует ли уже такое отношение
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            
-            if (entity.get("type") == entity_type and 
-                entity.get("id") == entity_id and 
-                tuple_data.get("relation") == relation and 
-                subject.get("type") == subject_type and 
-                subject.get("id") == subject_id):
-                return True, "Отношение уже существует"
+        store = self._get_store()
         
         # Создаем новое отношение
-        new_tuple = {
-            "entity": {"type": entity_type, "id": entity_id},
-            "relation": relation,
-            "subject": {
-                "type": subject_type, 
-                "id": subject_id,
-                "relation": ""
-            }
-        }
+        new_tuple = make_tuple(entity_type, entity_id, relation, subject_type, subject_id)
         
-        # Добавляем к текущим отношениям
-        relationships["tuples"].append(new_tuple)
+        # Проверяем, существует ли уже такое отношение, и добавляем его
+        if not store.add(new_tuple):
+            return True, "Отношение уже существует"
         
         # Сохраняем обновленные отношения
-        if self._save_relationships(relationships):
+        if self._save_relationships(added=[new_tuple]):
             # Пытаемся также сохранить через API, если доступно
             try:
                 # Подготавливаем данные для API запроса
@@ -131,42 +109,117 @@ class RelationshipModel(BaseModel):
             
             return True, "Отношение успешно создано"
         else:
+            store.remove(tuple_key(new_tuple))
             return False, "Ошибка при сохранении отношения"
     
+    @in_unit_of_work
+    def create_relationships(self, tuples: List[Dict[str, Any]], tenant_id: str = None, chunk_size: int = None,
+                             schema_version: str = "", sync_existing: bool = False,
+                             require_api: bool = False) -> List[Tuple[bool, str]]:
+        """Создает несколько отношений за одну запись в хранилище и пачку запросов /data/write.
+        
+        Аргументы:
+            tuples: Отношения в формате API Permify (entity, relation, subject)
+            tenant_id: ID тенанта (опционально)
+            chunk_size: Размер пачки для /data/write (по умолчанию PERMIFY_WRITE_CHUNK_SIZE)
+            schema_version: Версия схемы для метаданных запроса
+            sync_existing: Отправлять в Permify и уже существующие локально отношения
+            require_api: Сохранять локально только отношения, принятые Permify
+            
+        Возвращает:
+            Список результатов (успех, сообщение) в порядке переданных отношений
+        """
+        tenant_id = tenant_id or self.default_tenant
+        chunk_size = max(1, chunk_size or self.write_chunk_size)
+        
+        store = self._get_store()
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(tuples)
+        
+        # Отбрасываем дубликаты внутри пачки и отношения, уже известные индексу
+        new_tuples: Dict[TupleKey, Tuple[int, Dict[str, Any]]] = {}
+        existing_tuples: Dict[TupleKey, int] = {}
+        to_send: List[Tuple[TupleKey, Dict[str, Any]]] = []
+        for i, tuple_data in enumerate(tuples):
+            key = tuple_key(tuple_data)
+            if key in new_tuples or key in existing_tuples:
+                results[i] = (True, "Отношение уже существует")
+                continue
+            
+            normalized = make_tuple(*key, tuple_data.get("subject", {}).get("relation") or "")
+            if store.contains(*key):
+                results[i] = (True, "Отношение уже существует")
+                existing_tuples[key] = i
+                if sync_existing:
+                    to_send.append((key, normalized))
+                continue
+            
+            new_tuples[key] = (i, normalized)
+            to_send.append((key, normalized))
+        
+        # Записываем отношения в Permify пачками, пачки отправляются одновременно
+        api_errors: Dict[TupleKey, str] = {}
+        chunks = [to_send[start:start + chunk_size] for start in range(0, len(to_send), chunk_size)]
+        chunk_results = []
+        if chunks:
+            try:
+                chunk_results = self.async_client.write_many_sync(
+                    tenant_id, [[tuple_data for _, tuple_data in chunk] for chunk in chunks], schema_version
+                )
+            except Exception as e:
+                chunk_results = [(False, str(e))] * len(chunks)
+        
+        for chunk, (success, result) in zip(chunks, chunk_results):
+            if not success:
+                print(f"DEBUG: Ошибка записи пачки из {len(chunk)} отношений: {result}")
+                for key, _ in chunk:
+                    api_errors[key] = str(result)
+        
+        # Существующие отношения, которые не удалось синхронизировать, считаем ошибкой
+        for key, i in existing_tuples.items():
+            if key in api_errors:
+                results[i] = (False, f"Ошибка при синхронизации отношения с Permify: {api_errors[key]}")
+        
+        # Сохраняем новые отношения локально одной записью
+        added = []
+        for key, (i, tuple_data) in new_tuples.items():
+            if require_api and key in api_errors:
+                results[i] = (False, f"Ошибка при создании отношения в Permify: {api_errors[key]}")
+            elif store.add(tuple_data):
+                added.append(tuple_data)
+            else:
+                results[i] = (True, "Отношение уже существует")
+        
+        if added and not self._save_relationships(added=added):
+            for tuple_data in added:
+                key = tuple_key(tuple_data)
+                store.remove(key)
+                results[new_tuples[key][0]] = (False, "Ошибка при сохранении отношения")
+            added = []
+        
+        for tuple_data in added:
+            i = new_tuples[tuple_key(tuple_data)][0]
+            results[i] = (True, "Отношение успешно создано")
+        
+        print(f"DEBUG: Пакетное создание отношений: получено {len(tuples)}, новых {len(added)}, "
+              f"отправлено в Permify {len(to_send)}, ошибок API {len(api_errors)}")
+        return results
+    
     def delete_relationship(self, entity_type: str, entity_id: str, relation: str, 
                            subject_type: str, subject_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет отношение."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Загружаем текущие отношения
-        relationships = self._load_relationships()
+        store = self._get_store()
         
         # Ищем и удаляем отношение
-        updated_tuples = []
-        found = False
+        key = (entity_type, entity_id, relation, subject_type, subject_id)
+        removed_tuple = store.remove(key)
         
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            
-            if (entity.get("type") == entity_type and 
-                entity.get("id") == entity_id and 
-                tuple_data.get("relation") == relation and 
-                subject.get("type") == subject_type and 
-                subject.get("id") == subject_id):
-                found = True
-                continue  # Пропускаем это отношение (удаляем)
-            
-            updated_tuples.append(tuple_data)
-        
-        if not found:
+        if removed_tuple is None:
             return False, "Отношение не найдено"
         
-        # Обновляем отношения
-        relationships["tuples"] = updated_tuples
-        
         # Сохраняем обновленные отношения
-        if self._save_relationships(relationships):
+        if self._save_relationships(removed=[key]):
             # Пытаемся также удалить через API, если доступно
             try:
                 # Подготавливаем данные для API запроса
@@ -197,13 +250,21 @@ class RelationshipModel(BaseModel):
             
             return True, "Отношение успешно удалено"
         else:
+            store.add(removed_tuple)
             return False, "Ошибка при удалении отношения"
     
     def check_permission(self, entity_type: str, entity_id: str, permission: str, 
-                         user_id: str, tenant_id: str = None, schema_version: str = None) -> Tuple[bool, Any]:
-        """Проверяет разрешение пользователя на действие для сущности."""
+                         user_id: str, tenant_id: str = None, schema_version: str = None,
+                         local: bool = False) -> Tuple[bool, Any]:
+        """Проверяет разрешение пользователя на действие для сущности.
+        
+        При local=True проверка выполняется локально, без запроса к Permify.
+        """
         tenant_id = tenant_id or self.default_tenant
         
+        if local:
+            return self.check_permission_local(entity_type, entity_id, permission, user_id, tenant_id, schema_version)
+        
         # Первый запрос - прямая проверка для пользователя
         endpoint = f"/v1/tenants/{tenant_id}/permissions/check"
         data = {
@@ -234,24 +295,25 @@ class RelationshipModel(BaseModel):
                 
                 # Если доступ запрещен, попробуем проверить группы вручную
                 if not result.get("can") and result.get("can") != "CHECK_RESULT_ALLOWED":
+                    # Роли групп, которые по схеме дают это разрешение (через group_*.member)
+                    compiled = self._get_compiled_schema(tenant_id, schema_version)
+                    group_relations = compiled.relations_granting(entity_type, permission, through="member") if compiled else []
+                    
                     # Получаем группы пользователя
-                    user_groups = self.get_user_groups(user_id, tenant_id)
+                    user_groups = self.get_user_groups(user_id, tenant_id) if group_relations else []
                     
                     # Для каждой группы проверяем права напрямую
                     for group_id in user_groups:
-                        # Проверяем права с явным указанием group_* ролей
-                        for role_prefix in ["group_owner", "group_editor", "group_viewer"]:
+                        for role_prefix in group_relations:
                             # Проверяем наличие такого отношения
                             has_relation = self.check_relationship_exists(
                                 entity_type, entity_id, role_prefix, "group", group_id, tenant_id
                             )
                             
                             if has_relation:
-                                # Если отношение существует, проверяем разрешение напрямую
-                                if self._check_role_grants_permission(role_prefix, permission):
-                                    result["can"] = True
-                                    result["metadata"]["reason"] = f"Доступ предоставлен через роль {role_prefix} группы (группа: {group_id})"
-                                    break
+                                result["can"] = True
+                                result["metadata"]["reason"] = f"Доступ предоставлен через роль {role_prefix} группы (группа: {group_id})"
+                                break
                 
                 return success, result
             else:
@@ -259,104 +321,143 @@ class RelationshipModel(BaseModel):
         except Exception as e:
             return False, f"Ошибка при проверке разрешения: {str(e)}"
     
-    def _check_role_grants_permission(self, role: str, permission: str) -> bool:
-        """Проверяет, дает ли роль доступ к запрашиваемому разрешению."""
-        # Карта ролей и их прав
-        role_permissions = {
-            "owner": ["view", "edit", "delete", "create", "export", "read", "write", "manage"],
-            "editor": ["view", "edit", "read", "write"],
-            "viewer": ["view", "read"],
-            "group_owner": ["view", "edit", "delete", "create", "export", "read", "write", "manage"],
-            "group_editor": ["view", "edit", "read", "write"],
-            "group_viewer": ["view", "read"]
-        }
+    def get_local_checker(self, tenant_id: str = None, schema_version: str = None) -> Tuple[bool, Any]:
+        """Создает локальный вычислитель разрешений по текущей схеме и локальным отношениям."""
+        compiled = self._get_compiled_schema(tenant_id, schema_version)
+        if compiled is None:
+            return False, "Не удалось получить схему для локальной проверки"
+        return True, LocalPermissionChecker(compiled, self._get_store())
+    
+    def check_permission_local(self, entity_type: str, entity_id: str, permission: str, user_id: str,
+                               tenant_id: str = None, schema_version: str = None, subject_type: str = "user",
+                               checker: LocalPermissionChecker = None) -> Tuple[bool, Any]:
+        """Проверяет разрешение по локальной копии отношений без запроса к Permify."""
+        if checker is None:
+            success, checker = self.get_local_checker(tenant_id, schema_version)
+            if not success:
+                return False, checker
+        
+        try:
+            return True, checker.check(entity_type, entity_id, permission, subject_type, user_id)
+        except Exception as e:
+            return False, f"Ошибка при локальной проверке разрешения: {str(e)}"
+    
+    def check_permissions_local(self, checks: List[Dict[str, str]], tenant_id: str = None,
+                                schema_version: str = None) -> Tuple[bool, Any]:
+        """Выполняет серию локальных проверок с общей мемоизацией (для аудита и сценариев «что если»)."""
+        success, checker = self.get_local_checker(tenant_id, schema_version)
+        if not success:
+            return False, checker
         
-        # Для кастомных ролей группы с префиксом group_* предоставляем соответствующие права
-        if role.startswith("group_") and role not in role_permissions:
-            # Извлекаем базовую роль без префикса group_
-            base_role = role[6:]  # убираем 'group_'
+        results = []
+        for check in checks:
+            result = checker.check(check.get("entity_type"), check.get("entity_id"), check.get("permission"),
+                                   check.get("subject_type", "user"), check.get("subject_id"))
+            # allowed = None: результат не вычисляется локально (атрибуты, правила)
+            allowed = None if result["can"] == CHECK_UNDETERMINED else result["can"] == CHECK_ALLOWED
+            results.append({**check, "allowed": allowed, "result": result})
+        
+        return True, results
+    
+    def compare_permission_checks(self, checks: List[Dict[str, str]], tenant_id: str = None,
+                                  schema_version: str = None) -> Tuple[bool, Any]:
+        """Сравнивает локальные результаты проверок с ответами Permify.
+        
+        Аргументы:
+            checks: Список проверок с ключами entity_type, entity_id, permission, subject_id
+                    и необязательным subject_type (по умолчанию user)
             
-            # Предполагаем, что кастомная роль дает те же права, что и стандартная с таким же названием
-            # Или, если такой стандартной роли нет, предоставляем базовый набор прав (view, read)
-            if base_role in role_permissions:
-                return permission in role_permissions[base_role]
-            else:
-                # Для неизвестных кастомных ролей предоставляем доступ к permission, если оно совпадает с именем роли
-                # Например, роль group_view_petitions дает доступ к permission view_petitions
-                if permission == base_role:
-                    return True
-                return permission in ["view", "read"]  # базовый набор прав для всех кастомных ролей
-        
-        # Если роль неизвестна или разрешение не указано, запрещаем
-        if role not in role_permissions or not permission:
+        Возвращает:
+            (успех, список результатов с полями local, server и match); если результат
+            не вычисляется локально, local и match равны None, а причина - в local_error
+        """
+        tenant_id = tenant_id or self.default_tenant
+        success, checker = self.get_local_checker(tenant_id, schema_version)
+        if not success:
+            return False, checker
+        
+        results = []
+        for check in checks:
+            args = (check.get("entity_type"), check.get("entity_id"), check.get("permission"), check.get("subject_id"))
+            
+            local_success, local_result = self.check_permission_local(
+                *args, tenant_id, schema_version, check.get("subject_type", "user"), checker=checker
+            )
+            server_success, server_result = self.check_permission(*args, tenant_id, schema_version)
+            
+            undetermined = local_success and local_result.get("can") == CHECK_UNDETERMINED
+            local_allowed = local_success and local_result.get("can") == CHECK_ALLOWED
+            server_allowed = server_success and server_result.get("can") in (True, CHECK_ALLOWED)
+            results.append({
+                **check,
+                "local": None if undetermined else local_allowed,
+                "server": server_allowed if server_success else None,
+                "match": None if undetermined else server_success and local_allowed == server_allowed,
+                "local_error": local_result.get("metadata", {}).get("error") if undetermined else None,
+                "error": None if server_success else server_result
+            })
+        
+        return True, results
+    
+    def _get_compiled_schema(self, tenant_id: str = None, schema_version: str = None) -> Optional[CompiledSchema]:
+        """Возвращает скомпилированную схему или None, если схему не удалось получить."""
+        from .schema_model import SchemaModel
+        success, compiled = get_service(SchemaModel).get_compiled_schema(tenant_id, schema_version)
+        return compiled if success else None
+    
+    def _check_role_grants_permission(self, entity_type: str, role: str, permission: str,
+                                      tenant_id: str = None, schema_version: str = None) -> bool:
+        """Проверяет по схеме, дает ли роль (напрямую или через group_роль.member) доступ к разрешению."""
+        if not permission:
             return False
         
-        # Проверяем наличие разрешения в списке разрешенных для роли
-        return permission in role_permissions[role]
+        compiled = self._get_compiled_schema(tenant_id, schema_version)
+        return bool(compiled and compiled.role_grants(entity_type, role, permission))
     
     def check_relationship_exists(self, entity_type: str, entity_id: str, relation: str, 
                                  subject_type: str, subject_id: str, tenant_id: str = None) -> bool:
         """Проверяет существование указанного отношения."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Получаем все отношения
-        success, relationships = self.get_relationships(tenant_id)
-        if not success:
-            return False
-        
-        # Ищем нужное отношение
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            rel = tuple_data.get("relation", "")
-            
-            if (entity.get("type") == entity_type and 
-                entity.get("id") == entity_id and
-                rel == relation and
-                subject.get("type") == subject_type and
-                subject.get("id") == subject_id):
-                
-                return True
-        
-        return False
+        return self._get_store().contains(entity_type, entity_id, relation, subject_type, subject_id)
     
     def get_user_groups(self, user_id: str, tenant_id: str = None) -> List[str]:
         """Получает список групп, в которых состоит пользователь."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Получаем все отношения
-        success, relationships = self.get_relationships(tenant_id)
-        if not success:
-            return []
+        # Ищем группы пользователя: отношения member между группой и пользователем
+        member_tuples = self._get_store().find(
+            entity_type="group", relation="member", subject_type="user", subject_id=user_id
+        )
         
-        # Ищем группы пользователя
-        user_groups = []
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            relation = tuple_data.get("relation", "")
-            
-            # Проверяем, что это отношение member между группой и пользователем
-            if (entity.get("type") == "group" and 
-                relation == "member" and
-                subject.get("type") == "user" and
-                subject.get("id") == user_id):
-                
-                user_groups.append(entity.get("id"))
+        return [tuple_data.get("entity", {}).get("id") for tuple_data in member_tuples]
+    
+    def get_group_members(self, group_id: str, tenant_id: str = None) -> List[str]:
+        """Получает список пользователей, состоящих в группе (через индекс отношений)."""
+        member_tuples = self._get_store().find(
+            entity_type="group", entity_id=group_id, relation="member", subject_type="user"
+        )
+        
+        return [tuple_data.get("subject", {}).get("id") for tuple_data in member_tuples]
+    
+    def get_group_entities(self, group_id: str, tenant_id: str = None) -> List[Tuple[str, str]]:
+        """Получает сущности (приложения), к которым у группы есть отношения."""
+        group_tuples = self._get_store().find(subject_type="group", subject_id=group_id)
         
-        return user_groups
+        entities = {}
+        for tuple_data in group_tuples:
+            entity = tuple_data.get("entity", {})
+            entities[(entity.get("type"), entity.get("id"))] = None
+        return list(entities)
     
     def assign_user_to_group(self, group_id: str, user_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Добавляет пользователя в группу (создает отношение group-member-user)."""
         return self.create_relationship("group", group_id, "member", "user", user_id, tenant_id)
     
-    def assign_role_to_group(self, group_id: str, entity_type: str, entity_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
-        """Назначает роль группе для сущности."""
-        tenant_id = tenant_id or self.default_tenant
-        
-        # Получаем текущую версию схемы
+    def _get_schema_version(self, tenant_id: str) -> str:
+        """Возвращает текущую версию схемы или пустую строку, если ее не удалось получить."""
         from .schema_model import SchemaModel
-        schema_model = SchemaModel()
+        schema_model = get_service(SchemaModel)
         schema_version = ""
         
         try:
@@ -369,6 +470,10 @@ class RelationshipModel(BaseModel):
         except Exception as e:
             print(f"Ошибка при получении версии схемы: {str(e)}")
         
+        return schema_version
+    
+    def _group_relation(self, role: str) -> str:
+        """Возвращает отношение группы для роли (с префиксом group_)."""
         # Добавляем префикс group_ к роли для отличия от пользовательских ролей
         # Преобразуем стандартные роли в формат с префиксом group_
         group_role_mapping = {
@@ -380,10 +485,18 @@ class RelationshipModel(BaseModel):
         
         # Используем префикс group_ если это стандартная роль, иначе добавляем префикс group_ к кастомной роли
         if role in group_role_mapping:
-            relation = group_role_mapping[role]
-        else:
-            # Если кастомная роль, добавляем префикс group_
-            relation = f"group_{role}"
+            return group_role_mapping[role]
+        # Если кастомная роль, добавляем префикс group_
+        return f"group_{role}"
+    
+    def assign_role_to_group(self, group_id: str, entity_type: str, entity_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
+        """Назначает роль группе для сущности."""
+        tenant_id = tenant_id or self.default_tenant
+        
+        # Получаем текущую версию схемы
+        schema_version = self._get_schema_version(tenant_id)
+        
+        relation = self._group_relation(role)
             
         print(f"DEBUG: Назначение роли группе: {group_id}, роль: {role} -> {relation}, для {entity_type}:{entity_id}")
         
@@ -410,40 +523,13 @@ class RelationshipModel(BaseModel):
         print(f"DEBUG: Результат запроса: success={success}, result={result}")
         
         if success:
-            # Добавляем отношение также и в локальное хранилище
-            # Загружаем текущие отношения
-            relationships = self._load_relationships()
-            
-            # Создаем новое отношение в том же формате, что и API
-            new_tuple = {
-                "entity": {"type": entity_type, "id": entity_id},
-                "relation": relation,
-                "subject": {
-                    "type": "group", 
-                    "id": group_id,
-                    "relation": ""
-                }
-            }
-            
-            # Проверяем, существует ли уже такое отношение в локальном хранилище
-            exists = False
-            for tuple_data in relationships.get("tuples", []):
-                entity = tuple_data.get("entity", {})
-                subject = tuple_data.get("subject", {})
-                
-                if (entity.get("type") == entity_type and 
-                    entity.get("id") == entity_id and 
-                    tuple_data.get("relation") == relation and 
-                    subject.get("type") == "group" and 
-                    subject.get("id") == group_id):
-                    exists = True
-                    break
+            # Добавляем отношение также и в локальное хранилище (в том же формате, что и API)
+            new_tuple = make_tuple(entity_type, entity_id, relation, "group", group_id)
             
             # Если не существует, добавляем
-            if not exists:
-                relationships["tuples"].append(new_tuple)
+            if self._get_store().add(new_tuple):
                 # Сохраняем обновленные отношения
-                self._save_relationships(relationships)
+                self._save_relationships(added=[new_tuple])
                 print(f"DEBUG: Отношение добавлено в локальное хранилище")
             else:
                 print(f"DEBUG: Отношение уже существует в локальном хранилище")
@@ -461,35 +547,155 @@ class RelationshipModel(BaseModel):
         else:
             return False, f"Ошибка при назначении роли: {result}"
     
+    @in_unit_of_work
+    def assign_roles_to_group(self, group_id: str, entity_type: str, entity_id: str, roles: List[str],
+                              tenant_id: str = None) -> List[Tuple[bool, str]]:
+        """Назначает группе несколько ролей для сущности одним пакетным запросом."""
+        tenant_id = tenant_id or self.default_tenant
+        
+        tuples = [make_tuple(entity_type, entity_id, self._group_relation(role), "group", group_id) for role in roles]
+        print(f"DEBUG: Назначение ролей группе: {group_id}, роли: {roles}, для {entity_type}:{entity_id}")
+        
+        results = self.create_relationships(
+            tuples, tenant_id, schema_version=self._get_schema_version(tenant_id), require_api=True
+        )
+        return [
+            (True, f"Роль {role} успешно назначена группе {group_id} для сущности {entity_type}:{entity_id}")
+            if success else (False, f"Ошибка при назначении роли: {message}")
+            for role, (success, message) in zip(roles, results)
+        ]
+    
     def assign_user_to_app(self, app_name: str, app_id: str, user_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Назначает пользователю роль в приложении (owner, editor, viewer и пользовательские роли)."""
+        errors = self._validate_app_roles(app_name, app_id, [role], tenant_id)
+        if errors[0]:
+            return False, errors[0]
+        
+        return self.create_relationship(app_name, app_id, role, "user", user_id, tenant_id)
+    
+    @in_unit_of_work
+    def assign_user_roles_to_app(self, app_name: str, app_id: str, user_id: str, roles: List[str],
+                                 tenant_id: str = None) -> List[Tuple[bool, str]]:
+        """Назначает пользователю несколько ролей в приложении одним пакетным запросом."""
+        errors = self._validate_app_roles(app_name, app_id, roles, tenant_id)
+        results = [(False, error) if error else None for error in errors]
+        
+        valid = [i for i, error in enumerate(errors) if not error]
+        tuples = [make_tuple(app_name, app_id, roles[i], "user", user_id) for i in valid]
+        for i, result in zip(valid, self.create_relationships(tuples, tenant_id)):
+            results[i] = result
+        return results
+    
+    def _validate_app_roles(self, app_name: str, app_id: str, roles: List[str], tenant_id: str = None) -> List[Optional[str]]:
+        """Проверяет роли для приложения. Возвращает сообщение об ошибке (или None) для каждой роли."""
         # Стандартные роли
         standard_roles = ["owner", "editor", "viewer"]
+        custom_roles = []
         
-        # Если не стандартная роль, проверяем есть ли она в метаданных приложения
-        if role not in standard_roles:
+        # Если есть не стандартные роли, проверяем их по метаданным приложения (один раз на вызов)
+        if any(role not in standard_roles for role in roles):
             # Загружаем приложения
             # Импортируем здесь, чтобы избежать циклической зависимости
             from app.models.app_model import AppModel
-            app_model = AppModel()
+            app_model = get_service(AppModel)
             
-            # Получаем список приложений
-            apps = app_model.get_apps(tenant_id)
+            # Получаем список приложений (только чтение, без сохранения)
+            apps = app_model.get_apps(tenant_id, persist=False)
             
             # Ищем указанное приложение
             app = next((a for a in apps if a.get('name') == app_name and a.get('id') == app_id), None)
             
             # Проверяем наличие пользовательской роли в метаданных
-            custom_roles = []
             if app and 'metadata' in app and 'custom_relations' in app.get('metadata', {}):
                 custom_roles = app.get('metadata', {}).get('custom_relations', [])
+        
+        # Если роль не найдена в пользовательских ролях, возвращаем ошибку
+        available_roles = standard_roles + custom_roles
+        return [
+            None if role in available_roles
+            else f"Недопустимая роль: {role}. Доступные роли: {', '.join(available_roles)}"
+            for role in roles
+        ]
+    
+    @in_unit_of_work
+    def delete_relationships_by_filter(self, entity_type: str = None, entity_ids: List[str] = None,
+                                       subject_type: str = None, subject_ids: List[str] = None,
+                                       tenant_id: str = None) -> Tuple[int, int, List[str]]:
+        """Удаляет все отношения сущностей и/или субъектов фильтрами /data/delete.
+        
+        Удаляются отношения, где сущность входит в entity_ids типа entity_type, а также
+        отношения, где субъект входит в subject_ids типа subject_type. Вместо запроса на
+        каждое отношение в Permify отправляется один tuple_filter на сторону (для стороны
+        субъекта - по одному на тип сущности), а локальное хранилище обновляется одной записью.
+        
+        Возвращает:
+            Кортеж (количество удаленных локально отношений, количество неудачных запросов, список ошибок)
+        """
+        tenant_id = tenant_id or self.default_tenant
+        entity_ids = list(entity_ids or [])
+        subject_ids = list(subject_ids or [])
+        
+        store = self._get_store()
+        filters = []
+        removed_tuples: Dict[TupleKey, Dict[str, Any]] = {}
+        
+        with store.lock:
+            # Сторона сущности: один фильтр на все идентификаторы
+            if entity_type and entity_ids:
+                for entity_id in entity_ids:
+                    for tuple_data in store.find(entity_type=entity_type, entity_id=entity_id):
+                        removed_tuples[tuple_key(tuple_data)] = tuple_data
+                filters.append({
+                    "entity": {"type": entity_type, "ids": entity_ids},
+                    "relation": "",
+                    "subject": {"type": "", "ids": []}
+                })
+            
+            # Сторона субъекта: Permify требует тип сущности, поэтому группируем по типам из индекса
+            if subject_type and subject_ids:
+                subject_entity_types = {}
+                for subject_id in subject_ids:
+                    for tuple_data in store.find(subject_type=subject_type, subject_id=subject_id):
+                        key = tuple_key(tuple_data)
+                        removed_tuples[key] = tuple_data
+                        subject_entity_types[key[0]] = None
+                for filter_entity_type in subject_entity_types:
+                    filters.append({
+                        "entity": {"type": filter_entity_type, "ids": []},
+                        "relation": "",
+                        "subject": {"type": subject_type, "ids": subject_ids}
+                    })
+            
+            # Удаляем отношения из индекса и сохраняем изменения одной записью
+            for key in removed_tuples:
+                store.remove(key)
+            if removed_tuples and not self._save_relationships(removed=list(removed_tuples)):
+                for tuple_data in removed_tuples.values():
+                    store.add(tuple_data)
+                return 0, len(filters), ["Ошибка при сохранении удаления отношений"]
+        
+        # Удаляем отношения в Permify фильтрами
+        errors = []
+        endpoint = f"/v1/tenants/{tenant_id}/data/delete"
+        for tuple_filter in filters:
+            data = {
+                "metadata": {
+                    "snap_token": ""
+                },
+                "tuple_filter": tuple_filter,
+                "attribute_filter": {}
+            }
+            try:
+                success, result = self.make_api_request(endpoint, data)
+            except Exception as e:
+                success, result = False, str(e)
             
-            # Если роль не найдена в пользовательских ролях, возвращаем ошибку
-            if role not in custom_roles:
-                available_roles = standard_roles + custom_roles
-                return False, f"Недопустимая роль: {role}. Доступные роли: {', '.join(available_roles)}"
+            if not success:
+                errors.append(f"Ошибка удаления по фильтру {tuple_filter}: {result}")
         
-        return self.create_relationship(app_name, app_id, role, "user", user_id, tenant_id)
+        print(f"DEBUG: Удаление по фильтру: локально удалено {len(removed_tuples)}, "
+              f"фильтров {len(filters)}, ошибок {len(errors)}")
+        return len(removed_tuples), len(errors), errors
     
     def delete_multiple_relationships(self, relationships: List[Dict[str, str]], tenant_id: str = None) -> Tuple[int, int, List[str]]:
         """Удаляет несколько отношений."""
@@ -521,55 +727,14 @@ class RelationshipModel(BaseModel):
         """Получает список ролей группы для конкретного приложения."""
         tenant_id = tenant_id or self.default_tenant
         
-        # Получаем все отношения
-        success, relationships = self.get_relationships(tenant_id)
-        if not success:
-            return []
-        
         # Ищем роли группы для указанного приложения
-        group_roles = []
-        for tuple_data in relationships.get("tuples", []):
-            entity = tuple_data.get("entity", {})
-            subject = tuple_data.get("subject", {})
-            relation = tuple_data.get("relation", "")
-            
-            # Проверяем, что это отношение между приложением и группой
-            if (entity.get("type") == entity_type and 
-                entity.get("id") == entity_id and
-                subject.get("type") == "group" and
-                subject.get("id") == group_id):
-                
-                group_roles.append(relation)
+        group_tuples = self._get_store().find(
+            entity_type=entity_type, entity_id=entity_id, subject_type="group", subject_id=group_id
+        )
         
-        return group_roles
+        return [tuple_data.get("relation", "") for tuple_data in group_tuples]
     
     def check_role_permission(self, entity_type: str, entity_id: str, permission: str, role: str, 
                              tenant_id: str = None, schema_version: str = None) -> bool:
         """Проверяет, дает ли указанная роль доступ к определенному действию."""
-        # Получаем текущую схему для анализа правил
-        from .schema_model import SchemaModel
-        schema_model = SchemaModel()
-        
-        success, schema = schema_model.get_current_schema(tenant_id, schema_version)
-        if not success or not schema:
-            return False
-        
-        # Анализируем схему для поиска правила
-        entities_info = schema_model.extract_entities_info(schema)
-        
-        # Проверяем, существует ли сущность и действие
-        if entity_type not in entities_info:
-            return False
-        
-        entity_def = entities_info[entity_type].get("definition", {})
-        actions = entity_def.get("actions", {})
-        
-        # Проверяем действие
-        if permission not in actions:
-            return False
-        
-        # Анализируем правило для действия
-        permission_rule = actions.get(permission, {}).get("rewrite", "")
-        
-        # Простая проверка: содержит ли правило имя роли
-        return role in permission_rule 
\ No newline at end of file
+        return self._check_role_grants_permission(entity_type, role, permission, tenant_id, schema_version) 
@@ -0,0 +1,294 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Any, Optional, Tuple
+
+# Состояния автомата отказов
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Чтения, которые можно безопасно повторить (эндпоинт после /v1/tenants/{tenant_id}/)
+_IDEMPOTENT = {
+    "permissions/check", "permissions/expand", "permissions/lookup-entity",
+    "permissions/lookup-subject", "schemas/list", "schemas/read"
+}
+_ENDPOINT = re.compile(r"^/v1/tenants/[^/]+/(.+)$")
+
+# Операция: operation(таймаут) -> (успех, результат, ошибка сервера или сети, которую можно повторить)
+Operation = Callable[[float], Tuple[bool, Any, bool]]
+
+_deadline: ContextVar[Optional[float]] = ContextVar("permify_deadline", default=None)
+
+
+@contextmanager
+def request_budget(seconds: float = None):
+    """Ограничивает суммарное время запросов к Permify внутри блока (например, прогона страницы).
+
+    Вложенный бюджет не может продлить внешний. Параллельные загрузки (prefetch) выполняются
+    в копии контекста и расходуют тот же бюджет. Бюджет ограничивает только идемпотентные
+    чтения: запись, прерванная сроком, могла бы выполниться лишь частично.
+    """
+    if seconds is None:
+        seconds = float(os.environ.get("PERMIFY_RERUN_BUDGET", 15))
+    current = _deadline.get()
+    deadline = time.monotonic() + seconds if seconds > 0 else None
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Оставшееся время бюджета в секундах или None, если бюджет не задан."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_idempotent(endpoint: str, method: str = "post") -> bool:
+    """Можно ли повторить запрос: GET и читающие эндпоинты Permify."""
+    if method.lower() == "get":
+        return True
+    match = _ENDPOINT.match(endpoint)
+    return bool(match and match.group(1) in _IDEMPOTENT)
+
+
+class RetryBudget:
+    """Общий лимит повторов: повторы не могут превысить заданную долю от числа запросов.
+
+    Каждый запрос добавляет ratio токенов (не больше max_tokens), плюс min_per_second токенов
+    в секунду, чтобы редкие запросы тоже могли повторяться; повтор расходует один токен.
+    Во время деградации Permify повторы не умножают нагрузку на него.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + amount + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        with self.lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """Автомат отказов по доле ошибок и медленных вызовов в скользящем окне.
+
+    Размыкается, когда в окне из последних window вызовов (не меньше min_calls) доля ошибок
+    достигает error_rate или доля вызовов дольше slow_call_seconds достигает slow_rate. Через
+    open_seconds пропускает один пробный вызов: успех замыкает автомат, ошибка снова размыкает.
+    """
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, slow_call_seconds: float,
+                 slow_rate: float, open_seconds: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.lock = threading.Lock()
+        # (успех, длительность)
+        self.calls: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_reason = ""
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов сейчас."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, success: bool, duration: float):
+        """Учитывает результат вызова."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                if success and duration < self.slow_call_seconds:
+                    self.state = CLOSED
+                    self.calls.clear()
+                    print("DEBUG: Автомат отказов Permify замкнут")
+                else:
+                    self._open("пробный вызов не удался")
+                return
+
+            self.calls.append((success, duration))
+            if self.state != CLOSED or len(self.calls) < self.min_calls:
+                return
+            errors = sum(1 for ok, _ in self.calls if not ok) / len(self.calls)
+            slow = sum(1 for _, took in self.calls if took >= self.slow_call_seconds) / len(self.calls)
+            if errors >= self.error_rate:
+                self._open(f"доля ошибок {errors:.0%}")
+            elif slow >= self.slow_rate:
+                self._open(f"доля медленных вызовов {slow:.0%}")
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.last_reason = reason
+        print(f"DEBUG: Автомат отказов Permify разомкнут: {reason}")
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            retry_in = max(0.0, self.opened_at + self.open_seconds - time.monotonic()) if self.state == OPEN else 0.0
+            return {"state": self.state, "reason": self.last_reason, "retry_in": round(retry_in, 1),
+                    "window_calls": len(self.calls)}
+
+
+class PermifyResilience:
+    """Срок вызова, повторы и автомат отказов для запросов к одному хосту Permify.
+
+    - Срок каждого идемпотентного вызова - меньшее из таймаута чтения и остатка бюджета
+      (request_budget); если бюджет исчерпан, вызов не выполняется. Изменяющие вызовы
+      бюджетом не ограничиваются, их срок - таймаут запроса.
+    - Идемпотентные чтения повторяются при ошибках сети и 5xx с экспоненциальной паузой
+      со случайной составляющей, пока есть токены общего RetryBudget и время бюджета.
+    - Пока автомат отказов разомкнут, вызовы сразу завершаются ошибкой. Фоновый монитор
+      доступности здесь не учитывается: его состояние показывают представления.
+    """
+
+    def __init__(self, host: str):
+        env = os.environ.get
+        self.host = host
+        self.read_timeout = float(env("PERMIFY_READ_TIMEOUT", 30))
+        self.max_attempts = max(1, int(env("PERMIFY_RETRY_MAX_ATTEMPTS", 3)))
+        self.base_delay = float(env("PERMIFY_RETRY_BASE_DELAY", 0.1))
+        self.max_delay = float(env("PERMIFY_RETRY_MAX_DELAY", 2))
+        self.retry_budget = RetryBudget(
+            ratio=float(env("PERMIFY_RETRY_BUDGET_RATIO", 0.1)),
+            min_per_second=float(env("PERMIFY_RETRY_MIN_PER_SECOND", 1)),
+            max_tokens=float(env("PERMIFY_RETRY_BUDGET_MAX", 10))
+        )
+        self.breaker = CircuitBreaker(
+            window=int(env("PERMIFY_BREAKER_WINDOW", 20)),
+            min_calls=int(env("PERMIFY_BREAKER_MIN_CALLS", 10)),
+            error_rate=float(env("PERMIFY_BREAKER_ERROR_RATE", 0.5)),
+            slow_call_seconds=float(env("PERMIFY_BREAKER_SLOW_CALL", 5)),
+            slow_rate=float(env("PERMIFY_BREAKER_SLOW_RATE", 0.5)),
+            open_seconds=float(env("PERMIFY_BREAKER_OPEN_SECONDS", 15))
+        )
+
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "calls": 0, "attempts": 0, "successes": 0, "failures": 0, "retries": 0,
+            "retries_denied": 0, "short_circuited": 0, "deadline_exceeded": 0
+        }
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    def _count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def call(self, operation: Operation, idempotent: bool = False,
+             timeout: Optional[float] = None) -> Tuple[bool, Any]:
+        """Выполняет operation(таймаут) с учетом срока, повторов и автомата отказов."""
+        self._count("calls")
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            call_timeout = timeout or self.read_timeout
+            remaining = remaining_budget() if idempotent else None
+            if remaining is not None:
+                if remaining <= 0:
+                    self._count("deadline_exceeded")
+                    return False, "Превышен бюджет времени на запросы к Permify"
+                call_timeout = min(call_timeout, remaining)
+
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                status = self.breaker.status()
+                return False, (f"Permify временно недоступен ({status['reason']}), "
+                               f"повтор через {status['retry_in']} с")
+
+            attempt += 1
+            self._count("attempts")
+            started = time.monotonic()
+            try:
+                success, result, retryable = operation(call_timeout)
+            except Exception as e:
+                success, result, retryable = False, f"Ошибка запроса: {str(e)}", True
+            duration = time.monotonic() - started
+            # Ошибки клиента (4xx) говорят о запросе, а не о состоянии Permify
+            self.breaker.record(success or not retryable, duration)
+            with self.lock:
+                self.latencies.append(duration)
+
+            if success or not retryable:
+                self._count("successes" if success else "failures")
+                return success, result
+            if not idempotent or attempt >= self.max_attempts:
+                self._count("failures")
+                return success, result
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+            remaining = remaining_budget()
+            if (remaining is not None and remaining <= delay) or not self.retry_budget.withdraw():
+                self._count("retries_denied")
+                self._count("failures")
+                return success, result
+            self._count("retries")
+            print(f"DEBUG: Повтор запроса к Permify через {delay:.2f} с (попытка {attempt + 1}): {result}")
+            time.sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Счетчики вызовов, задержки и состояние автомата отказов."""
+        with self.lock:
+            counters = dict(self.counters)
+            latencies = sorted(self.latencies)
+        return {
+            **counters,
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+            "breaker": self.breaker.status(),
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None
+        }
+
+
+_resilience: Dict[str, PermifyResilience] = {}
+_resilience_lock = threading.Lock()
+
+
+def get_resilience(host: str) -> PermifyResilience:
+    """Возвращает общий для процесса слой устойчивости для хоста Permify."""
+    resilience = _resilience.get(host)
+    if resilience is not None:
+        return resilience
+
+    with _resilience_lock:
+        resilience = _resilience.get(host)
+        if resilience is None:
+            resilience = PermifyResilience(host)
+            _resilience[host] = resilience
+        return resilience
@@ -0,0 +1,106 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class SchemaCache:
+    """Общий для процесса кэш схем Permify.
+
+    Версии схем в Permify неизменяемы, поэтому результат schemas/read для конкретной версии
+    хранится без срока действия (с ограничением на количество версий). Список схем, по
+    которому определяется последняя версия, живет PERMIFY_SCHEMA_LATEST_TTL секунд и
+    сбрасывается явно после записи новой схемы.
+    """
+
+    def __init__(self, latest_ttl: float = None, max_versions: int = None):
+        if latest_ttl is None:
+            latest_ttl = float(os.environ.get("PERMIFY_SCHEMA_LATEST_TTL", 5))
+        self.latest_ttl = latest_ttl
+        self.max_versions = max_versions or int(os.environ.get("PERMIFY_SCHEMA_CACHE_VERSIONS", 64))
+        self.lock = threading.Lock()
+
+        # (host, tenant_id) -> (время сохранения, список схем)
+        self._lists: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        # (host, tenant_id, version) -> результат schemas/read
+        self._versions: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        # (host, tenant_id, version) -> скомпилированная схема (неизменяемая, копии не нужны)
+        self._compiled: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+
+    def get_list(self, host: str, tenant_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает список схем, если он еще не устарел."""
+        with self.lock:
+            entry = self._lists.get((host, tenant_id))
+            if entry is None or time.monotonic() - entry[0] > self.latest_ttl:
+                return None
+            return copy.deepcopy(entry[1])
+
+    def set_list(self, host: str, tenant_id: str, schemas: Dict[str, Any]):
+        """Запоминает список схем тенанта."""
+        with self.lock:
+            self._lists[(host, tenant_id)] = (time.monotonic(), copy.deepcopy(schemas))
+
+    def get_version(self, host: str, tenant_id: str, version: str) -> Optional[Dict[str, Any]]:
+        """Возвращает схему указанной версии, если она уже была прочитана."""
+        key = (host, tenant_id, version)
+        with self.lock:
+            schema = self._versions.get(key)
+            if schema is None:
+                return None
+            self._versions.move_to_end(key)
+            return copy.deepcopy(schema)
+
+    def set_version(self, host: str, tenant_id: str, version: str, schema: Dict[str, Any]):
+        """Запоминает схему указанной версии."""
+        key = (host, tenant_id, version)
+        with self.lock:
+            self._versions[key] = copy.deepcopy(schema)
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_versions:
+                self._versions.popitem(last=False)
+
+    def get_compiled(self, host: str, tenant_id: str, version: str) -> Optional[Any]:
+        """Возвращает скомпилированную схему указанной версии."""
+        key = (host, tenant_id, version)
+        with self.lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+            return compiled
+
+    def set_compiled(self, host: str, tenant_id: str, version: str, compiled: Any):
+        """Запоминает скомпилированную схему указанной версии."""
+        key = (host, tenant_id, version)
+        with self.lock:
+            self._compiled[key] = compiled
+            self._compiled.move_to_end(key)
+            while len(self._compiled) > self.max_versions:
+                self._compiled.popitem(last=False)
+
+    def invalidate(self, host: str, tenant_id: str):
+        """Сбрасывает указатель на последнюю версию (например, после записи новой схемы)."""
+        with self.lock:
+            self._lists.pop((host, tenant_id), None)
+
+    def clear(self):
+        """Полностью очищает кэш."""
+        with self.lock:
+            self._lists.clear()
+            self._versions.clear()
+            self._compiled.clear()
+
+
+_schema_cache: Optional[SchemaCache] = None
+_schema_cache_lock = threading.Lock()
+
+
+def get_schema_cache() -> SchemaCache:
+    """Возвращает общий для процесса кэш схем."""
+    global _schema_cache
+    if _schema_cache is None:
+        with _schema_cache_lock:
+            if _schema_cache is None:
+                _schema_cache = SchemaCache()
+    return _schema_cache
@@ -0,0 +1,537 @@
+import hashlib
+import json
+import re
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Операции переписывания разрешений Permify
+UNION = "union"
+INTERSECTION = "intersection"
+EXCLUSION = "exclusion"
+
+_OPERATIONS = {
+    "OPERATION_UNION": UNION,
+    "OPERATION_INTERSECTION": INTERSECTION,
+    "OPERATION_EXCLUSION": EXCLUSION
+}
+
+
+def _field(data: Dict[str, Any], snake: str, camel: str, default: Any = None) -> Any:
+    """Читает поле ответа Permify, который может быть в snake_case или camelCase."""
+    if not isinstance(data, dict):
+        return default
+    if snake in data:
+        return data[snake]
+    return data.get(camel, default)
+
+
+def _attribute_type(value: str) -> str:
+    """Приводит тип атрибута к нотации схемы: ATTRIBUTE_TYPE_BOOLEAN_ARRAY -> boolean[]."""
+    value = (value or "").lower()
+    if value.startswith("attribute_type_"):
+        value = value[len("attribute_type_"):]
+    if value.endswith("_array"):
+        value = value[:-len("_array")] + "[]"
+    return value
+
+
+class RewriteNode:
+    """Узел дерева переписывания разрешения.
+
+    Лист имеет kind "computed" (relation - отношение или разрешение той же сущности),
+    "tuple_to" (relation.computed - переход по отношению к другой сущности), "attribute"
+    (relation - атрибут сущности) или "call" (relation - имя правила, computed - атрибуты-
+    аргументы через запятую).
+    Внутренний узел имеет kind "rewrite" с операцией и дочерними узлами.
+    """
+
+    __slots__ = ("kind", "operation", "children", "relation", "computed")
+
+    def __init__(self, kind: str, operation: str = None, children: List["RewriteNode"] = None,
+                 relation: str = None, computed: str = None):
+        self.kind = kind
+        self.operation = operation
+        self.children = children or []
+        self.relation = relation
+        self.computed = computed
+
+    @property
+    def leaf_name(self) -> str:
+        """Имя листа в нотации схемы (owner или group_owner.member)."""
+        if self.kind == "tuple_to":
+            return f"{self.relation}.{self.computed}"
+        if self.kind == "call":
+            return f"{self.relation}({self.computed or ''})"
+        return self.relation
+
+    def to_text(self) -> str:
+        """Возвращает правило в нотации схемы Permify."""
+        if self.kind != "rewrite":
+            return self.leaf_name or ""
+        separator = {UNION: " or ", INTERSECTION: " and ", EXCLUSION: " not "}.get(self.operation, " or ")
+        parts = []
+        for child in self.children:
+            text = child.to_text()
+            parts.append(f"({text})" if child.kind == "rewrite" and len(child.children) > 1 else text)
+        return separator.join(parts)
+
+    def canonical(self) -> str:
+        """Каноническая запись дерева: вложенные or/and раскрыты, операнды упорядочены."""
+        if self.kind != "rewrite":
+            return self.leaf_name or ""
+        if len(self.children) == 1:
+            return self.children[0].canonical()
+
+        parts = []
+        for child in self.children:
+            if child.kind == "rewrite" and child.operation == self.operation and self.operation != EXCLUSION \
+                    and len(child.children) > 1:
+                # (a or b) or c -> or(a, b, c)
+                parts.extend(grandchild.canonical() for grandchild in child.children)
+            else:
+                parts.append(child.canonical())
+        if self.operation != EXCLUSION:
+            parts = sorted(parts)
+        return f"{self.operation}({','.join(parts)})"
+
+    def __repr__(self):
+        return f"RewriteNode({self.to_text()!r})"
+
+
+def _compile_child(child: Dict[str, Any]) -> Optional[RewriteNode]:
+    """Строит узел дерева из элемента child/children ответа Permify."""
+    if not isinstance(child, dict):
+        return None
+
+    rewrite = child.get("rewrite")
+    if rewrite is not None:
+        operation = _OPERATIONS.get(_field(rewrite, "rewrite_operation", "rewriteOperation", ""), UNION)
+        children = [node for node in (_compile_child(c) for c in rewrite.get("children", [])) if node]
+        return RewriteNode("rewrite", operation=operation, children=children)
+
+    leaf = child.get("leaf")
+    if leaf is not None:
+        computed = _field(leaf, "computed_user_set", "computedUserSet")
+        if computed is not None:
+            return RewriteNode("computed", relation=computed.get("relation", ""))
+
+        tuple_to = _field(leaf, "tuple_to_user_set", "tupleToUserSet")
+        if tuple_to is not None:
+            tuple_set = _field(tuple_to, "tuple_set", "tupleSet", {})
+            return RewriteNode(
+                "tuple_to",
+                relation=tuple_set.get("relation", ""),
+                computed=(tuple_to.get("computed") or {}).get("relation", "")
+            )
+
+        attribute = _field(leaf, "computed_attribute", "computedAttribute")
+        if attribute is not None:
+            return RewriteNode("attribute", relation=attribute.get("name", ""))
+
+        call = leaf.get("call")
+        if call is not None:
+            arguments = [_field(argument, "computed_attribute", "computedAttribute", {}).get("name", "")
+                         for argument in call.get("arguments") or []]
+            return RewriteNode("call", relation=_field(call, "rule_name", "ruleName", ""),
+                               computed=",".join(arguments))
+
+    return None
+
+
+class CompiledEntity:
+    """Сущность схемы: отношения (с допустимыми типами субъектов), атрибуты и деревья разрешений."""
+
+    def __init__(self, name: str, relations: Dict[str, List[str]], permissions: Dict[str, RewriteNode],
+                 attributes: Dict[str, str] = None):
+        self.name = name
+        self.relations = relations
+        self.permissions = permissions
+        # имя атрибута -> тип в нотации схемы (boolean, string[], ...)
+        self.attributes = attributes or {}
+
+
+class CompiledSchema:
+    """Скомпилированная схема Permify с предрасчитанной таблицей «отношение → разрешения».
+
+    Таблица строится один раз на версию схемы и отвечает на вопрос «дает ли отношение R
+    (напрямую или через участников группы R.member) разрешение P на сущности E» за O(1).
+    rules - имя правила -> его параметры и тело. Тело из текста схемы и из ответа Permify
+    (выражение CEL) записано по-разному и сравнимо только внутри одного источника.
+    """
+
+    def __init__(self, entities: Dict[str, CompiledEntity], version: str = "", rules: Dict[str, str] = None):
+        self.version = version
+        self.entities = entities
+        self.rules = rules or {}
+
+        # (сущность, лист правила) -> разрешения, которые он предоставляет
+        self._grants: Dict[Tuple[str, str], Set[str]] = {}
+        # (сущность, разрешение) -> листья, достаточные для разрешения
+        self._permission_leaves: Dict[Tuple[str, str], FrozenSet[str]] = {}
+
+        for entity in entities.values():
+            for permission in entity.permissions:
+                leaves = self._resolve_permission(entity, permission, set())
+                self._permission_leaves[(entity.name, permission)] = leaves
+                for leaf in leaves:
+                    self._grants.setdefault((entity.name, leaf), set()).add(permission)
+
+    def _resolve_permission(self, entity: CompiledEntity, permission: str, visiting: Set[str]) -> FrozenSet[str]:
+        """Возвращает множество листьев, каждый из которых сам по себе дает разрешение."""
+        if permission in visiting:
+            return frozenset()
+        visiting = visiting | {permission}
+        return self._resolve_node(entity, entity.permissions[permission], visiting)
+
+    def _resolve_node(self, entity: CompiledEntity, node: RewriteNode, visiting: Set[str]) -> FrozenSet[str]:
+        if node.kind == "computed":
+            # Ссылка на другое разрешение той же сущности раскрывается рекурсивно
+            if node.relation in entity.permissions:
+                return self._resolve_permission(entity, node.relation, visiting)
+            return frozenset([node.relation])
+
+        if node.kind == "tuple_to":
+            return frozenset([node.leaf_name])
+
+        child_sets = [self._resolve_node(entity, child, visiting) for child in node.children]
+        if not child_sets:
+            return frozenset()
+        if node.operation == INTERSECTION:
+            # Отношение достаточно, только если оно есть во всех ветках
+            return frozenset.intersection(*child_sets)
+        if node.operation == EXCLUSION:
+            # Достаточным может быть только первое множество (за вычетом исключений)
+            return child_sets[0]
+        return frozenset().union(*child_sets)
+
+    def entity_types(self) -> List[str]:
+        """Возвращает типы сущностей схемы."""
+        return list(self.entities.keys())
+
+    def relations(self, entity_type: str) -> List[str]:
+        """Возвращает отношения сущности."""
+        entity = self.entities.get(entity_type)
+        return list(entity.relations.keys()) if entity else []
+
+    def permissions(self, entity_type: str) -> List[str]:
+        """Возвращает разрешения сущности."""
+        entity = self.entities.get(entity_type)
+        return list(entity.permissions.keys()) if entity else []
+
+    def has_permission(self, entity_type: str, permission: str) -> bool:
+        return (entity_type, permission) in self._permission_leaves
+
+    def permission_rule(self, entity_type: str, permission: str) -> str:
+        """Возвращает правило разрешения в нотации схемы."""
+        entity = self.entities.get(entity_type)
+        if not entity or permission not in entity.permissions:
+            return ""
+        return entity.permissions[permission].to_text()
+
+    def relation_grants(self, entity_type: str, relation: str, permission: str) -> bool:
+        """Дает ли отношение разрешение: напрямую (relation) или участникам группы (relation.member)."""
+        return (permission in self._grants.get((entity_type, relation), ()) or
+                permission in self._grants.get((entity_type, f"{relation}.member"), ()))
+
+    def role_grants(self, entity_type: str, role: str, permission: str) -> bool:
+        """Дает ли роль разрешение: напрямую или через группу с ролью group_{role}."""
+        if self.relation_grants(entity_type, role, permission):
+            return True
+        group_relation = role if role.startswith("group_") else f"group_{role}"
+        return self.relation_grants(entity_type, group_relation, permission)
+
+    def granted_permissions(self, entity_type: str, relation: str) -> List[str]:
+        """Возвращает разрешения, которые дает отношение (напрямую или через участников группы)."""
+        granted = set(self._grants.get((entity_type, relation), ()))
+        granted |= self._grants.get((entity_type, f"{relation}.member"), set())
+        return [permission for permission in self.permissions(entity_type) if permission in granted]
+
+    def relations_granting(self, entity_type: str, permission: str, through: str = None) -> List[str]:
+        """Возвращает отношения, дающие разрешение.
+
+        Если указан through (например, "member"), возвращаются только отношения, которые
+        дают разрешение через relation.through (роли групп).
+        """
+        leaves = self._permission_leaves.get((entity_type, permission), frozenset())
+        result = []
+        for leaf in leaves:
+            relation, _, computed = leaf.partition(".")
+            if (through is None and not computed) or (through is not None and computed == through):
+                result.append(relation)
+        return sorted(result)
+
+    def fingerprint(self) -> str:
+        """Хэш содержимого схемы, не зависящий от форматирования, комментариев и порядка объявлений."""
+        canonical = {
+            name: {
+                "relations": {relation: sorted(refs) for relation, refs in entity.relations.items()},
+                "attributes": dict(sorted(entity.attributes.items())),
+                "permissions": {permission: node.canonical() for permission, node in entity.permissions.items()}
+            }
+            for name, entity in self.entities.items()
+        }
+        # Параметры правил сравнимы между источниками, тела - нет (см. rules)
+        canonical["@rules"] = {name: rule.split("\n", 1)[0] for name, rule in self.rules.items()}
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _signature(self, entity_type: str, name: str, visiting: FrozenSet[Tuple[str, str]]) -> str:
+        """Описание отношения или разрешения вместе со всем, от чего зависит его вычисление."""
+        key = (entity_type, name)
+        if key in visiting:
+            return f"cycle:{entity_type}#{name}"
+        entity = self.entities.get(entity_type)
+        if entity is None:
+            return "missing"
+        if name in entity.permissions:
+            node = entity.permissions[name]
+            dependencies = sorted(self._node_dependencies(entity, node, visiting | {key}))
+            description = json.dumps([node.canonical(), dependencies])
+        elif name in entity.relations:
+            description = "relation:" + ",".join(sorted(entity.relations[name]))
+        else:
+            return "missing"
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def _node_dependencies(self, entity: CompiledEntity, node: RewriteNode,
+                           visiting: FrozenSet[Tuple[str, str]]) -> Set[str]:
+        if node.kind == "computed":
+            return {f"{node.relation}={self._signature(entity.name, node.relation, visiting)}"}
+        if node.kind == "tuple_to":
+            dependencies = {f"{node.relation}={self._signature(entity.name, node.relation, visiting)}"}
+            # relation.computed зависит от правила computed у каждого типа субъекта отношения
+            for reference in entity.relations.get(node.relation, []):
+                subject_type = reference.split("#")[0]
+                dependencies.add(f"{subject_type}.{node.computed}="
+                                 f"{self._signature(subject_type, node.computed, visiting)}")
+            return dependencies
+        if node.kind == "attribute":
+            return {f"@{node.relation}={entity.attributes.get(node.relation, 'missing')}"}
+        if node.kind == "call":
+            # Правило зависит от своего тела и параметров, а также от типов атрибутов-аргументов
+            dependencies = {f"{node.relation}()={self.rules.get(node.relation, 'missing')}"}
+            for argument in filter(None, (node.computed or "").split(",")):
+                dependencies.add(f"@{argument}={entity.attributes.get(argument, 'missing')}")
+            return dependencies
+        dependencies = set()
+        for child in node.children:
+            dependencies |= self._node_dependencies(entity, child, visiting)
+        return dependencies
+
+    def dependency_signatures(self) -> Dict[Tuple[str, str], str]:
+        """Возвращает (сущность, отношение или разрешение) -> хэш его правила с зависимостями."""
+        signatures = {}
+        for entity in self.entities.values():
+            for name in list(entity.relations) + list(entity.permissions):
+                signatures[(entity.name, name)] = self._signature(entity.name, name, frozenset())
+        return signatures
+
+    def entities_info(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает сведения о сущностях в формате SchemaModel.extract_entities_info."""
+        return {
+            name: {
+                "permissions": list(entity.permissions.keys()),
+                "relations": list(entity.relations.keys()),
+                "attributes": list(entity.attributes),
+                "rules": {permission: node.to_text() for permission, node in entity.permissions.items()}
+            }
+            for name, entity in self.entities.items()
+        }
+
+
+def diff_schemas(old: Optional[CompiledSchema], new: Optional[CompiledSchema]) -> Dict[str, List[str]]:
+    """Возвращает тип сущности -> отношения и разрешения, результат которых мог измениться.
+
+    Разрешение считается измененным, если изменилось его правило или любое отношение или
+    разрешение, от которого оно зависит (в том числе у других сущностей через relation.computed),
+    тип используемого атрибута или тело вызываемого правила. Добавленные и удаленные имена
+    тоже считаются измененными. Если схемы получены из разных источников (ответ Permify и
+    текст), тела правил несравнимы, и все разрешения с вызовами правил считаются измененными.
+    """
+    old_signatures = old.dependency_signatures() if old else {}
+    new_signatures = new.dependency_signatures() if new else {}
+
+    changed: Dict[str, Set[str]] = {}
+    for key in set(old_signatures) | set(new_signatures):
+        if old_signatures.get(key) != new_signatures.get(key):
+            changed.setdefault(key[0], set()).add(key[1])
+    return {entity_type: sorted(names) for entity_type, names in sorted(changed.items())}
+
+
+def compile_schema(schema_result: Dict[str, Any]) -> CompiledSchema:
+    """Компилирует ответ schemas/read (или результат get_current_schema) в CompiledSchema."""
+    schema = schema_result.get("schema", schema_result) if isinstance(schema_result, dict) else {}
+    definitions = _field(schema, "entity_definitions", "entityDefinitions", {}) or {}
+
+    entities = {}
+    for entity_name, entity_def in definitions.items():
+        relations = {}
+        for relation_name, relation_def in (entity_def.get("relations") or {}).items():
+            references = _field(relation_def, "relation_references", "relationReferences", []) or []
+            relations[relation_name] = [
+                f"{ref.get('type')}#{ref.get('relation')}" if ref.get("relation") else ref.get("type", "")
+                for ref in references
+            ]
+
+        permissions = {}
+        for permission_name, permission_def in (entity_def.get("permissions") or {}).items():
+            node = _compile_child((permission_def or {}).get("child", {}))
+            permissions[permission_name] = node or RewriteNode("rewrite", operation=UNION)
+
+        attributes = {name: _attribute_type((attribute_def or {}).get("type", ""))
+                      for name, attribute_def in (entity_def.get("attributes") or {}).items()}
+        entities[entity_name] = CompiledEntity(entity_name, relations, permissions, attributes)
+
+    rules = {}
+    for rule_name, rule_def in (_field(schema, "rule_definitions", "ruleDefinitions", {}) or {}).items():
+        parameters = " ".join(f"{name} {_attribute_type(value)}"
+                              for name, value in sorted((rule_def.get("arguments") or {}).items()))
+        rules[rule_name] = f"{parameters}\ncel:{json.dumps(rule_def.get('expression'), sort_keys=True)}"
+
+    version = schema_result.get("version", "") if isinstance(schema_result, dict) else ""
+    return CompiledSchema(entities, version, rules)
+
+
+_TOKEN_RE = re.compile(r"//[^\n]*|/\*.*?\*/|[A-Za-z_][\w.#]*|[{}()=@,]|\S", re.S)
+_ENTITY_KEYWORDS = {"relation", "attribute", "action", "permission"}
+_OPERATOR_PRECEDENCE = {"or": 1, "and": 2, "not": 3}
+
+
+class _TextParser:
+    """Разбор текста схемы Permify (DSL) в структуры CompiledSchema."""
+
+    def __init__(self, text: str):
+        self.tokens = [token for token in _TOKEN_RE.findall(text or "") if not token.startswith(("//", "/*"))]
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Optional[str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def take_type(self) -> str:
+        """Читает тип атрибута или параметра (boolean, string[])."""
+        value = self.take() or ""
+        if self.peek() == "[":
+            self.take()
+            self.take()  # ]
+            value += "[]"
+        return value
+
+    def parse_rule(self) -> Tuple[str, str]:
+        """Разбирает rule name(param type, ...) { выражение } в (имя, параметры и тело)."""
+        name = self.take()
+        parameters = []
+        if self.peek() == "(":
+            self.take()
+            while self.peek() not in (None, ")"):
+                if self.peek() == ",":
+                    self.take()
+                    continue
+                parameter = self.take()
+                parameters.append(f"{parameter} {self.take_type()}")
+            self.take()  # )
+        body = []
+        depth = 0
+        while self.peek() is not None:
+            token = self.take()
+            if token == "{":
+                depth += 1
+                if depth == 1:
+                    continue
+            elif token == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            body.append(token)
+        return name, f"{' '.join(sorted(parameters))}\ntext:{' '.join(body)}"
+
+    def parse(self) -> Tuple[Dict[str, CompiledEntity], Dict[str, str]]:
+        entities, rules = {}, {}
+        while self.peek() is not None:
+            token = self.take()
+            if token == "entity":
+                entity = self.parse_entity()
+                entities[entity.name] = entity
+            elif token == "rule":
+                name, rule = self.parse_rule()
+                rules[name] = rule
+        return entities, rules
+
+    def parse_entity(self) -> CompiledEntity:
+        name = self.take()
+        relations, permissions, attributes = {}, {}, {}
+        if self.peek() == "{":
+            self.take()
+        while self.peek() not in (None, "}"):
+            keyword = self.take()
+            if keyword == "relation":
+                relation = self.take()
+                refs = []
+                while self.peek() == "@":
+                    self.take()
+                    refs.append(self.take())
+                relations[relation] = refs
+            elif keyword == "attribute":
+                attribute = self.take()
+                attributes[attribute] = self.take_type()
+            elif keyword in ("action", "permission"):
+                permission = self.take()
+                if self.peek() == "=":
+                    self.take()
+                permissions[permission] = self.parse_expression(0)
+        self.take()  # }
+        # Ссылки на атрибуты разбираются как computed: уточняем их так же, как в ответе Permify
+        for node in permissions.values():
+            _mark_attributes(node, set(attributes))
+        return CompiledEntity(name, relations, permissions, attributes)
+
+    def parse_expression(self, min_precedence: int) -> RewriteNode:
+        left = self.parse_operand()
+        while self.peek() in _OPERATOR_PRECEDENCE and _OPERATOR_PRECEDENCE[self.peek()] > min_precedence:
+            operator = self.take()
+            right = self.parse_expression(_OPERATOR_PRECEDENCE[operator])
+            operation = {"or": UNION, "and": INTERSECTION, "not": EXCLUSION}[operator]
+            left = RewriteNode("rewrite", operation=operation, children=[left, right])
+        return left
+
+    def parse_operand(self) -> RewriteNode:
+        token = self.take()
+        if token == "(":
+            node = self.parse_expression(0)
+            if self.peek() == ")":
+                self.take()
+            return node
+
+        # Вызов правила: name(args) - аргументы - имена атрибутов сущности
+        if self.peek() == "(":
+            arguments = []
+            depth = 0
+            while self.peek() is not None:
+                current = self.take()
+                depth += {"(": 1, ")": -1}.get(current, 0)
+                if depth == 0:
+                    break
+                if current not in ("(", ","):
+                    arguments.append(current)
+            return RewriteNode("call", relation=token, computed=",".join(arguments))
+
+        relation, _, computed = (token or "").partition(".")
+        if computed:
+            return RewriteNode("tuple_to", relation=relation, computed=computed)
+        return RewriteNode("computed", relation=relation)
+
+
+def _mark_attributes(node: RewriteNode, attributes: Set[str]):
+    """Помечает листья computed, ссылающиеся на атрибуты сущности, как attribute."""
+    if node.kind == "computed" and node.relation in attributes:
+        node.kind = "attribute"
+    for child in node.children:
+        _mark_attributes(child, attributes)
+
+
+def compile_schema_text(text: str, version: str = "") -> CompiledSchema:
+    """Компилирует текст схемы Permify (DSL) в CompiledSchema."""
+    entities, rules = _TextParser(text).parse()
+    return CompiledSchema(entities, version, rules)
@@ -1,15 +1,48 @@
 from .base_model import BaseModel
-from typing import Dict, Any, List, Optional, Tuple, Union
+from .schema_cache import get_schema_cache
+from .schema_compiler import CompiledSchema, compile_schema, compile_schema_text, diff_schemas
+from .unit_of_work import discard_loaded, in_unit_of_work, load_once
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 import os
 import tempfile
+from app.registry import get_service
+
+# Обработчики изменения схемы: callback(tenant_id, {тип сущности: [измененные разрешения и отношения]})
+_schema_change_listeners: List[Callable[[str, Dict[str, List[str]]], None]] = []
+
+
+def add_schema_change_listener(listener: Callable[[str, Dict[str, List[str]]], None]):
+    """Регистрирует обработчик, вызываемый после записи схемы, изменившей правила разрешений."""
+    if listener not in _schema_change_listeners:
+        _schema_change_listeners.append(listener)
+
 
 class SchemaModel(BaseModel):
     """Модель для работы со схемами Permify."""
     
-    def get_schema_list(self, tenant_id: str = None) -> Tuple[bool, Any]:
-        """Получает список всех схем."""
+    def __init__(self):
+        super().__init__()
+        # Общий для процесса кэш списков и версий схем
+        self.schema_cache = get_schema_cache()
+    
+    def get_schema_list(self, tenant_id: str = None, use_cache: bool = True) -> Tuple[bool, Any]:
+        """Получает список всех схем (из кэша, если он еще не устарел)."""
         tenant_id = tenant_id or self.default_tenant
         
+        if use_cache:
+            # В пределах единицы работы список запрашивается не более одного раза
+            return load_once(("schema_list", self.permify_host, tenant_id),
+                             lambda: self._read_schema_list(tenant_id))
+        
+        return self._read_schema_list(tenant_id, use_cache=False)
+    
+    def _read_schema_list(self, tenant_id: str, use_cache: bool = True) -> Tuple[bool, Any]:
+        """Читает список схем из кэша процесса или Permify."""
+        if use_cache:
+            cached = self.schema_cache.get_list(self.permify_host, tenant_id)
+            if cached is not None:
+                return True, cached
+        
         endpoint = f"/v1/tenants/{tenant_id}/schemas/list"
         data = {
             "page_size": 50,
@@ -21,7 +54,10 @@ class SchemaModel(BaseModel):
         # Обработка случая, когда схема не найдена (404)
         if not success and "ERROR_CODE_SCHEMA_NOT_FOUND" in str(result):
             # Возвращаем пустой список схем вместо ошибки
-            return True, {"schemas": []}
+            success, result = True, {"schemas": []}
+        
+        if success:
+            self.schema_cache.set_list(self.permify_host, tenant_id, result)
         
         return success, result
     
@@ -63,17 +99,21 @@ class SchemaModel(BaseModel):
             # Иначе используем самую новую версию (первую в отсортированном списке)
             version_to_use = sorted_schemas[0]["version"]
         
-        # Теперь получаем детальную информацию о схеме
-        endpoint = f"/v1/tenants/{tenant_id}/schemas/read"
-        data = {
-            "metadata": {
-                "schema_version": version_to_use
+        # Теперь получаем детальную информацию о схеме (версии неизменяемы, поэтому кэшируются)
+        schema_result = self.schema_cache.get_version(self.permify_host, tenant_id, version_to_use)
+        if schema_result is None:
+            endpoint = f"/v1/tenants/{tenant_id}/schemas/read"
+            data = {
+                "metadata": {
+                    "schema_version": version_to_use
+                }
             }
-        }
-        
-        success, schema_result = self.make_api_request(endpoint, data)
-        if not success:
-            return False, schema_result
+            
+            success, schema_result = self.make_api_request(endpoint, data)
+            if not success:
+                return False, schema_result
+            
+            self.schema_cache.set_version(self.permify_host, tenant_id, version_to_use, schema_result)
         
         # Добавляем версию схемы к результату
         schema_result["version"] = version_to_use
@@ -88,7 +128,7 @@ class SchemaModel(BaseModel):
         
         # Загружаем отношения для анализа
         from .relationship_model import RelationshipModel
-        relationship_model = RelationshipModel()
+        relationship_model = get_service(RelationshipModel)
         success, relationships = relationship_model.get_relationships(tenant_id)
         
         if not success:
@@ -213,6 +253,9 @@ class SchemaModel(BaseModel):
         print(f"Создание схемы для tenant_id {tenant_id}:")
         print(f"Схема: {schema_content}")
         
+        # Предыдущая версия нужна, чтобы определить, какие разрешения изменились
+        previous = self._get_latest_compiled_schema(tenant_id) if _schema_change_listeners else None
+        
         endpoint = f"/v1/tenants/{tenant_id}/schemas/write"
         data = {
             "schema": schema_content
@@ -220,11 +263,42 @@ class SchemaModel(BaseModel):
         
         success, result = self.make_api_request(endpoint, data)
         if success:
+            # Последняя версия изменилась
+            self.schema_cache.invalidate(self.permify_host, tenant_id)
+            discard_loaded(("schema_list", self.permify_host, tenant_id))
+            if _schema_change_listeners:
+                self._notify_schema_change(tenant_id, previous, schema_content)
             return True, "Схема успешно создана"
         else:
             print(f"Ошибка создания схемы: {result}")
             return False, result
     
+    def _get_latest_compiled_schema(self, tenant_id: str) -> Optional[CompiledSchema]:
+        """Возвращает последнюю скомпилированную схему или None, если схем еще нет."""
+        # Не используем get_current_schema напрямую: без схем он создает схему по умолчанию
+        success, schemas = self.get_schema_list(tenant_id)
+        if not success or not schemas.get("schemas"):
+            return None
+        success, compiled = self.get_compiled_schema(tenant_id)
+        return compiled if success else None
+    
+    def _notify_schema_change(self, tenant_id: str, previous: Optional[CompiledSchema], schema_content: str):
+        """Сравнивает схемы и передает обработчикам измененные разрешения по типам сущностей."""
+        try:
+            changes = diff_schemas(previous, compile_schema_text(schema_content))
+        except Exception as e:
+            print(f"DEBUG: Не удалось сравнить схемы для {tenant_id}: {str(e)}")
+            return
+        
+        if not changes:
+            return
+        print(f"DEBUG: Изменились разрешения схемы {tenant_id}: {changes}")
+        for listener in list(_schema_change_listeners):
+            try:
+                listener(tenant_id, changes)
+            except Exception as e:
+                print(f"DEBUG: Ошибка обработчика изменения схемы: {str(e)}")
+    
     def validate_schema(self, schema_content: str) -> Tuple[bool, str]:
         """Валидирует схему."""
         try:
@@ -281,22 +355,38 @@ class SchemaModel(BaseModel):
         except Exception as e:
             return False, f"Ошибка при валидации: {str(e)}"
     
+    def get_compiled_schema(self, tenant_id: str = None, schema_version: str = None) -> Tuple[bool, Any]:
+        """Возвращает скомпилированную схему (компилируется один раз на версию)."""
+        tenant_id = tenant_id or self.default_tenant
+        
+        success, schema_result = self.get_current_schema(tenant_id, schema_version)
+        if not success or not isinstance(schema_result, dict):
+            return False, schema_result
+        
+        version = schema_result.get("version", "")
+        compiled = self.schema_cache.get_compiled(self.permify_host, tenant_id, version) if version else None
+        if compiled is None:
+            compiled = compile_schema(schema_result)
+            if version:
+                self.schema_cache.set_compiled(self.permify_host, tenant_id, version, compiled)
+        
+        return True, compiled
+    
     def extract_entities_info(self, schema: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
         """Извлекает информацию о сущностях из схемы."""
-        entities_info = {}
+        if isinstance(schema, CompiledSchema):
+            return schema.entities_info()
         
         if not isinstance(schema, dict) or "schema" not in schema:
-            return entities_info
-            
-        entity_definitions = schema.get("schema", {}).get("entityDefinitions", {})
-        
-        for entity_name, entity_def in entity_definitions.items():
-            entities_info[entity_name] = {
-                "permissions": list(entity_def.get("permissions", {}).keys()),
-                "relations": list(entity_def.get("relations", {}).keys()),
-                "attributes": list(entity_def.get("attributes", {}).keys()),
-                "definition": entity_def
-            }
+            return {}
+        
+        entities_info = compile_schema(schema).entities_info()
+        
+        # Исходные определения сущностей (ответ Permify может быть в snake_case или camelCase)
+        raw_schema = schema.get("schema", {})
+        entity_definitions = raw_schema.get("entity_definitions", raw_schema.get("entityDefinitions", {}))
+        for entity_name, info in entities_info.items():
+            info["definition"] = entity_definitions.get(entity_name, {})
         
         return entities_info
         
@@ -432,18 +522,38 @@ class SchemaModel(BaseModel):
         
         return "\n".join(schema_lines)
 
-    def generate_and_apply_schema(self, tenant_id: str = None) -> Tuple[bool, str]:
-        """Генерирует и применяет схему на основе существующих данных."""
+    def schema_matches_current(self, schema_content: str, tenant_id: str = None) -> bool:
+        """Проверяет, совпадает ли содержимое текста схемы с текущей версией в Permify."""
+        tenant_id = tenant_id or self.default_tenant
+        
+        # Если схем еще нет, сравнивать не с чем (и не нужно создавать схему по умолчанию)
+        success, schemas = self.get_schema_list(tenant_id)
+        if not success or not schemas.get("schemas"):
+            return False
+        
+        success, current = self.get_compiled_schema(tenant_id)
+        if not success or not current.entities:
+            return False
+        
+        return compile_schema_text(schema_content).fingerprint() == current.fingerprint()
+    
+    @in_unit_of_work
+    def generate_and_apply_schema(self, tenant_id: str = None, force: bool = False) -> Tuple[bool, str]:
+        """Генерирует и применяет схему на основе существующих данных.
+        
+        Новая версия схемы записывается, только если сгенерированная схема отличается
+        от текущей (или если force=True).
+        """
         tenant_id = tenant_id or self.default_tenant
         
         # Получаем данные о приложениях
         from .app_model import AppModel
-        app_model = AppModel()
+        app_model = get_service(AppModel)
         apps_data = app_model.get_apps(tenant_id)
         
         # Получаем данные о группах
         from .group_model import GroupModel
-        group_model = GroupModel()
+        group_model = get_service(GroupModel)
         groups_data = group_model.get_groups(tenant_id)
         
         try:
@@ -471,6 +581,11 @@ entity application {
 }
 """
             
+            # Не создаем новую версию, если содержимое схемы не изменилось
+            if not force and self.schema_matches_current(schema_content, tenant_id):
+                print(f"DEBUG: Схема для {tenant_id} не изменилась, запись пропущена")
+                return True, "Схема не изменилась"
+            
             # Создаем схему
             success, result = self.create_schema(schema_content, tenant_id)
             
@@ -489,6 +604,7 @@ entity application {
         # Вместо поиска в существующей схеме, генерируем новую
         return self.generate_and_apply_schema(tenant_id)
 
+    @in_unit_of_work
     def get_generated_schema_text(self, tenant_id: str = None) -> Tuple[bool, str]:
         """Возвращает текст генерируемой схемы без её создания (для предпросмотра)."""
         tenant_id = tenant_id or self.default_tenant
@@ -496,12 +612,12 @@ entity application {
         try:
             # Получаем данные о приложениях
             from .app_model import AppModel
-            app_model = AppModel()
+            app_model = get_service(AppModel)
             apps_data = app_model.get_apps(tenant_id)
             
             # Получаем данные о группах
             from .group_model import GroupModel
-            group_model = GroupModel()
+            group_model = get_service(GroupModel)
             groups_data = group_model.get_groups(tenant_id)
             
             # Генерируем схему на основе данных
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+from app.registry import get_service
+
+
+class SchemaSync:
+    """Отложенная синхронизация схемы Permify с локальными данными.
+
+    Серия изменений (назначения ролей, привязка групп) объединяется в одну генерацию
+    схемы: каждый вызов schedule() откладывает синхронизацию на PERMIFY_SCHEMA_SYNC_DELAY
+    секунд, но не дольше PERMIFY_SCHEMA_SYNC_MAX_DELAY с первого запроса. Сама запись
+    выполняется только при изменении содержимого схемы (см. SchemaModel.generate_and_apply_schema).
+    """
+
+    def __init__(self, delay: float = None, max_delay: float = None):
+        if delay is None:
+            delay = float(os.environ.get("PERMIFY_SCHEMA_SYNC_DELAY", 2))
+        if max_delay is None:
+            max_delay = float(os.environ.get("PERMIFY_SCHEMA_SYNC_MAX_DELAY", 10))
+        self.delay = delay
+        self.max_delay = max(max_delay, delay)
+        self.lock = threading.Lock()
+
+        # tenant_id -> (таймер, время первого отложенного запроса)
+        self._pending: Dict[str, Tuple[threading.Timer, float]] = {}
+        # Синхронизации одного тенанта выполняются последовательно
+        self._tenant_locks: Dict[str, threading.Lock] = {}
+        self.last_result: Dict[str, Tuple[bool, str]] = {}
+
+    def _tenant_lock(self, tenant_id: str) -> threading.Lock:
+        with self.lock:
+            return self._tenant_locks.setdefault(tenant_id, threading.Lock())
+
+    def schedule(self, tenant_id: str):
+        """Планирует синхронизацию схемы тенанта, объединяя ее с уже запланированной."""
+        if self.delay <= 0:
+            self.sync(tenant_id)
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            pending = self._pending.get(tenant_id)
+            first_requested = pending[1] if pending else now
+            if pending:
+                pending[0].cancel()
+
+            delay = min(self.delay, max(0.0, first_requested + self.max_delay - now))
+            timer = threading.Timer(delay, self._run, args=(tenant_id,))
+            timer.daemon = True
+            self._pending[tenant_id] = (timer, first_requested)
+            timer.start()
+
+        print(f"DEBUG: Синхронизация схемы для {tenant_id} запланирована через {delay:.1f} с")
+
+    def _run(self, tenant_id: str):
+        with self.lock:
+            pending = self._pending.get(tenant_id)
+            if pending is None or pending[0] is not threading.current_thread():
+                return
+            del self._pending[tenant_id]
+        self.sync(tenant_id)
+
+    def cancel(self, tenant_id: str):
+        """Отменяет запланированную синхронизацию тенанта."""
+        with self.lock:
+            pending = self._pending.pop(tenant_id, None)
+        if pending:
+            pending[0].cancel()
+
+    def flush(self, tenant_id: str = None):
+        """Немедленно выполняет запланированные синхронизации (всех тенантов или одного)."""
+        with self.lock:
+            tenants = [tenant_id] if tenant_id else list(self._pending.keys())
+        for tenant in tenants:
+            with self.lock:
+                pending = self._pending.pop(tenant, None)
+            if pending:
+                pending[0].cancel()
+                self.sync(tenant)
+
+    def sync(self, tenant_id: str, force: bool = False) -> Tuple[bool, str]:
+        """Сразу генерирует схему и записывает ее, если содержимое изменилось."""
+        from .schema_model import SchemaModel
+
+        with self._tenant_lock(tenant_id):
+            try:
+                result = get_service(SchemaModel).generate_and_apply_schema(tenant_id, force=force)
+            except Exception as e:
+                result = (False, f"Ошибка при синхронизации схемы: {str(e)}")
+
+        print(f"DEBUG: Синхронизация схемы для {tenant_id}: {result}")
+        self.last_result[tenant_id] = result
+        return result
+
+    def pending_tenants(self):
+        """Возвращает тенанты с запланированной синхронизацией."""
+        with self.lock:
+            return list(self._pending.keys())
+
+
+_schema_sync: Optional[SchemaSync] = None
+_schema_sync_lock = threading.Lock()
+
+
+def get_schema_sync() -> SchemaSync:
+    """Возвращает общий для процесса планировщик синхронизации схемы."""
+    global _schema_sync
+    if _schema_sync is None:
+        with _schema_sync_lock:
+            if _schema_sync is None:
+                _schema_sync = SchemaSync()
+    return _schema_sync
@@ -0,0 +1,294 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+from .tuple_store import TupleKey, make_tuple, tuple_key
+
+# Поля, по которым строится ключ документа в каждой коллекции
+COLLECTION_KEYS = {
+    "apps": ("name", "id"),
+    "users": ("id",),
+    "groups": ("id",)
+}
+
+RELATIONSHIPS = "relationships"
+
+
+def item_key(collection: str, item: Dict[str, Any]) -> str:
+    """Возвращает ключ документа коллекции (например, 'report:1' для приложений)."""
+    return ":".join(str(item.get(field) or "") for field in COLLECTION_KEYS[collection])
+
+
+class _DocumentEncoder(json.JSONEncoder):
+    """Сериализует нестандартные объекты в метаданных как строки."""
+
+    def default(self, obj):
+        return str(obj)
+
+
+class JsonStorage:
+    """Хранилище на JSON-файлах в каталоге data (поведение по умолчанию).
+
+    Каждая коллекция хранится в отдельном файле и переписывается целиком при изменении.
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.lock = threading.RLock()
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        # Создаем файл с пустым списком отношений, если он не существует
+        if not os.path.exists(self._path(RELATIONSHIPS)):
+            self._write_json(self._path(RELATIONSHIPS), {"tuples": []})
+
+    def _path(self, collection: str) -> str:
+        return os.path.join(self.data_dir, f"{collection}.json")
+
+    def _write_json(self, path: str, payload: Dict[str, Any]):
+        """Атомарно записывает файл: читатели никогда не увидят частично записанные данные."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(payload, f, indent=2, cls=_DocumentEncoder)
+        os.replace(temp_path, path)
+
+    def signature(self, collection: str) -> Optional[Tuple[int, int]]:
+        """Возвращает признак версии коллекции (время изменения и размер файла)."""
+        try:
+            stat = os.stat(self._path(collection))
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def load_items(self, collection: str) -> List[Dict[str, Any]]:
+        """Загружает все документы коллекции."""
+        try:
+            with open(self._path(collection), 'r') as f:
+                return json.load(f).get(collection, [])
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def save_items(self, collection: str, items: List[Dict[str, Any]]) -> bool:
+        """Полностью заменяет содержимое коллекции."""
+        with self.lock:
+            self._write_json(self._path(collection), {collection: items})
+        return True
+
+    def upsert_items(self, collection: str, items: List[Dict[str, Any]]) -> bool:
+        """Добавляет или обновляет документы по ключу."""
+        with self.lock:
+            stored = self.load_items(collection)
+            positions = {item_key(collection, item): i for i, item in enumerate(stored)}
+            for item in items:
+                key = item_key(collection, item)
+                if key in positions:
+                    stored[positions[key]] = item
+                else:
+                    positions[key] = len(stored)
+                    stored.append(item)
+            return self.save_items(collection, stored)
+
+    def delete_items(self, collection: str, keys: Iterable[str]) -> bool:
+        """Удаляет документы по ключам."""
+        keys = set(keys)
+        with self.lock:
+            stored = self.load_items(collection)
+            return self.save_items(collection, [item for item in stored if item_key(collection, item) not in keys])
+
+    def load_tuples(self) -> List[Dict[str, Any]]:
+        """Загружает все отношения."""
+        try:
+            with open(self._path(RELATIONSHIPS), 'r') as f:
+                return json.load(f).get("tuples", [])
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def write_tuples(self, added: List[Dict[str, Any]], removed: List[TupleKey],
+                     snapshot: Callable[[], List[Dict[str, Any]]]) -> bool:
+        """Сохраняет изменения отношений. JSON-файл переписывается целиком из снимка хранилища."""
+        with self.lock:
+            self._write_json(self._path(RELATIONSHIPS), {"tuples": snapshot()})
+        return True
+
+
+class SqliteStorage:
+    """Хранилище в локальной базе SQLite в режиме WAL.
+
+    Изменения записываются построчными вставками и удалениями, поэтому стоимость записи
+    зависит от размера изменения, а не от объема данных. Режим WAL позволяет сессиям
+    Streamlit читать данные, пока другая сессия выполняет запись.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str, data_dir: str = None):
+        self.db_path = db_path
+        self.data_dir = data_dir or os.path.dirname(db_path)
+        self.lock = threading.RLock()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        is_new = not os.path.exists(self.db_path)
+        self._create_schema()
+
+        # При первом запуске переносим данные из JSON-файлов
+        if is_new:
+            imported = self.import_json(self.data_dir)
+            if imported:
+                print(f"Импортировано из JSON в SQLite: {imported}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока (sqlite3 не разделяет соединения между потоками)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self):
+        connection = self._connection()
+        for collection in COLLECTION_KEYS:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {collection} (key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tuples (
+                entity_type TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                relation TEXT NOT NULL,
+                subject_type TEXT NOT NULL,
+                subject_id TEXT NOT NULL,
+                subject_relation TEXT NOT NULL DEFAULT '',
+                UNIQUE (entity_type, entity_id, relation, subject_type, subject_id)
+            );
+            CREATE INDEX IF NOT EXISTS tuples_subject_idx ON tuples (subject_type, subject_id);
+            CREATE INDEX IF NOT EXISTS tuples_relation_idx ON tuples (relation);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+
+    def _write(self, collection: str, statements: Callable[[sqlite3.Connection], None]) -> bool:
+        """Выполняет запись в одной транзакции и увеличивает счетчик версий коллекции."""
+        connection = self._connection()
+        with self.lock:
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                statements(connection)
+                connection.execute(
+                    "INSERT INTO meta (key, value) VALUES (?, 1) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                    (collection,)
+                )
+                connection.execute("COMMIT")
+                return True
+            except Exception as e:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                print(f"Ошибка записи в SQLite ({collection}): {str(e)}")
+                return False
+
+    def signature(self, collection: str) -> Optional[int]:
+        """Возвращает счетчик версий коллекции, который увеличивается при каждой записи."""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def load_items(self, collection: str) -> List[Dict[str, Any]]:
+        """Загружает все документы коллекции в порядке добавления."""
+        rows = self._connection().execute(f"SELECT data FROM {collection} ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_items(self, collection: str, items: List[Dict[str, Any]]) -> bool:
+        """Полностью заменяет содержимое коллекции."""
+        def statements(connection):
+            connection.execute(f"DELETE FROM {collection}")
+            self._upsert(connection, collection, items)
+        return self._write(collection, statements)
+
+    def _upsert(self, connection: sqlite3.Connection, collection: str, items: List[Dict[str, Any]]):
+        connection.executemany(
+            f"INSERT INTO {collection} (key, data) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            [(item_key(collection, item), json.dumps(item, cls=_DocumentEncoder)) for item in items]
+        )
+
+    def upsert_items(self, collection: str, items: List[Dict[str, Any]]) -> bool:
+        """Добавляет или обновляет документы по ключу (порядок существующих сохраняется)."""
+        return self._write(collection, lambda connection: self._upsert(connection, collection, items))
+
+    def delete_items(self, collection: str, keys: Iterable[str]) -> bool:
+        """Удаляет документы по ключам."""
+        keys = [(key,) for key in keys]
+        return self._write(
+            collection,
+            lambda connection: connection.executemany(f"DELETE FROM {collection} WHERE key = ?", keys)
+        )
+
+    def load_tuples(self) -> List[Dict[str, Any]]:
+        """Загружает все отношения в порядке добавления."""
+        rows = self._connection().execute(
+            "SELECT entity_type, entity_id, relation, subject_type, subject_id, subject_relation "
+            "FROM tuples ORDER BY rowid"
+        ).fetchall()
+        return [make_tuple(*row) for row in rows]
+
+    def write_tuples(self, added: List[Dict[str, Any]], removed: List[TupleKey],
+                     snapshot: Callable[[], List[Dict[str, Any]]] = None) -> bool:
+        """Сохраняет только изменившиеся отношения."""
+        def statements(connection):
+            if removed:
+                connection.executemany(
+                    "DELETE FROM tuples WHERE entity_type = ? AND entity_id = ? AND relation = ? "
+                    "AND subject_type = ? AND subject_id = ?",
+                    removed
+                )
+            if added:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO tuples "
+                    "(entity_type, entity_id, relation, subject_type, subject_id, subject_relation) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [tuple_key(t) + (t.get("subject", {}).get("relation") or "",) for t in added]
+                )
+        return self._write(RELATIONSHIPS, statements)
+
+    def import_json(self, data_dir: str) -> Dict[str, int]:
+        """Импортирует коллекции и отношения из JSON-файлов каталога data."""
+        source = JsonStorage(data_dir)
+
+        imported = {}
+        for collection in COLLECTION_KEYS:
+            if os.path.exists(source._path(collection)):
+                items = source.load_items(collection)
+                if items and self.upsert_items(collection, items):
+                    imported[collection] = len(items)
+
+        if os.path.exists(source._path(RELATIONSHIPS)):
+            tuples = source.load_tuples()
+            if tuples and self.write_tuples(tuples, []):
+                imported[RELATIONSHIPS] = len(tuples)
+
+        return imported
+
+
+_storages: Dict[Tuple[str, str], Any] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage():
+    """Возвращает хранилище, выбранное переменной окружения STORAGE_BACKEND (json или sqlite)."""
+    backend = os.environ.get("STORAGE_BACKEND", "json").lower()
+    data_dir = os.path.join(os.getcwd(), 'data')
+    location = os.environ.get("SQLITE_PATH", os.path.join(data_dir, 'permify.db')) if backend == "sqlite" else data_dir
+
+    with _storages_lock:
+        storage = _storages.get((backend, location))
+        if storage is None:
+            if backend == "sqlite":
+                storage = SqliteStorage(location, data_dir)
+            else:
+                storage = JsonStorage(location)
+            _storages[(backend, location)] = storage
+        return storage
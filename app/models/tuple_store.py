@@ -0,0 +1,415 @@
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ключ отношения: (entity_type, entity_id, relation, subject_type, subject_id)
+TupleKey = Tuple[str, str, str, str, str]
+
+
+def make_tuple(entity_type: str, entity_id: str, relation: str,
+               subject_type: str, subject_id: str, subject_relation: str = "") -> Dict[str, Any]:
+    """Создает отношение в формате API Permify."""
+    return {
+        "entity": {"type": entity_type, "id": entity_id},
+        "relation": relation,
+        "subject": {
+            "type": subject_type,
+            "id": subject_id,
+            "relation": subject_relation
+        }
+    }
+
+
+def tuple_key(tuple_data: Dict[str, Any]) -> TupleKey:
+    """Возвращает ключ отношения для индексов."""
+    entity = tuple_data.get("entity", {})
+    subject = tuple_data.get("subject", {})
+    return (
+        entity.get("type"),
+        entity.get("id"),
+        tuple_data.get("relation", ""),
+        subject.get("type"),
+        subject.get("id")
+    )
+
+
+class TupleProjections:
+    """Денормализованные представления отношений для списков пользователей, групп и приложений.
+
+    Каждое отношение соответствует ровно одной записи во вложенных словарях, поэтому
+    добавление и удаление отношения обновляют представления за O(1). Словари используются
+    как упорядоченные множества: порядок совпадает с порядком появления отношений.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Счетчики отношений, в которых участвует пользователь, группа или экземпляр приложения
+        self.users: Dict[str, int] = {}
+        self.groups: Dict[str, int] = {}
+        self.apps: Dict[Tuple[str, str], int] = {}
+
+        # user_id -> группы / (тип приложения, id, роль)
+        self.user_groups: Dict[str, Dict[str, None]] = {}
+        self.user_app_roles: Dict[str, Dict[Tuple[str, str, str], None]] = {}
+        # group_id -> участники / (тип приложения, id, роль group_*)
+        self.group_members: Dict[str, Dict[str, None]] = {}
+        self.group_app_memberships: Dict[str, Dict[Tuple[str, str, str], None]] = {}
+        # (тип приложения, id) -> (user_id, роль) / группы с отношением member
+        self.app_users: Dict[Tuple[str, str], Dict[Tuple[str, str], None]] = {}
+        self.app_groups: Dict[Tuple[str, str], Dict[str, None]] = {}
+
+    def _entries(self, key: TupleKey):
+        """Возвращает счетчики и записи представлений, которые затрагивает отношение."""
+        entity_type, entity_id, relation, subject_type, subject_id = key
+        relation = relation or ""
+        counters, members = [], []
+
+        if subject_type == "user":
+            counters.append((self.users, subject_id))
+            if entity_type == "group" and relation == "member":
+                members.append((self.user_groups, subject_id, entity_id))
+            else:
+                members.append((self.user_app_roles, subject_id, (entity_type, entity_id, relation)))
+
+        if entity_type == "group":
+            counters.append((self.groups, entity_id))
+            if relation == "member" and subject_type == "user":
+                members.append((self.group_members, entity_id, subject_id))
+        elif subject_type == "group":
+            counters.append((self.groups, subject_id))
+            if relation.startswith("group_"):
+                members.append((self.group_app_memberships, subject_id, (entity_type, entity_id, relation)))
+
+        if entity_type not in ("user", "group"):
+            app_key = (entity_type, entity_id)
+            counters.append((self.apps, app_key))
+            if subject_type == "user":
+                members.append((self.app_users, app_key, (subject_id, relation)))
+            elif relation == "member" and subject_type == "group":
+                members.append((self.app_groups, app_key, subject_id))
+
+        return counters, members
+
+    def add(self, key: TupleKey):
+        counters, members = self._entries(key)
+        for counter, counter_key in counters:
+            counter[counter_key] = counter.get(counter_key, 0) + 1
+        for index, owner, item in members:
+            index.setdefault(owner, {})[item] = None
+
+    def remove(self, key: TupleKey):
+        counters, members = self._entries(key)
+        for counter, counter_key in counters:
+            count = counter.get(counter_key, 0) - 1
+            if count > 0:
+                counter[counter_key] = count
+            else:
+                counter.pop(counter_key, None)
+        for index, owner, item in members:
+            bucket = index.get(owner)
+            if bucket is not None:
+                bucket.pop(item, None)
+                if not bucket:
+                    del index[owner]
+
+    def user_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        """user_id -> группы и роли в приложениях."""
+        return {
+            user_id: {
+                "groups": list(self.user_groups.get(user_id, ())),
+                "app_roles": [{"app_type": app_type, "app_id": app_id, "role": role}
+                              for app_type, app_id, role in self.user_app_roles.get(user_id, ())]
+            }
+            for user_id in self.users
+        }
+
+    def group_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        """group_id -> участники и роли в приложениях."""
+        return {
+            group_id: {
+                "members": list(self.group_members.get(group_id, ())),
+                "app_memberships": [{"app_type": app_type, "app_id": app_id, "role": role}
+                                    for app_type, app_id, role in self.group_app_memberships.get(group_id, ())]
+            }
+            for group_id in self.groups
+        }
+
+    def app_views(self) -> Dict[Tuple[str, str], Dict[str, List[Any]]]:
+        """(тип приложения, id) -> пользователи с ролями и группы."""
+        return {
+            app_key: {
+                "users": [{"user_id": user_id, "role": role} for user_id, role in self.app_users.get(app_key, ())],
+                "groups": list(self.app_groups.get(app_key, ()))
+            }
+            for app_key in self.apps
+        }
+
+
+class TupleStore:
+    """Индексированное хранилище отношений в памяти.
+
+    Индексы по (entity_type, entity_id), (subject_type, subject_id) и relation позволяют
+    проверять существование отношения за O(1) и выбирать отношения сущности или
+    субъекта за O(k) вместо полного прохода по relationships.json.
+    Хранилище перечитывает данные лениво, только если они изменились в постоянном хранилище.
+    Представления для списков пользователей, групп и приложений (TupleProjections)
+    обновляются вместе с индексами.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = threading.RLock()
+        self._signature = None
+
+        # Словари используются как упорядоченные множества, чтобы сохранять порядок файла
+        self._tuples: Dict[TupleKey, Dict[str, Any]] = {}
+        self._by_entity: Dict[Tuple[str, str], Dict[TupleKey, None]] = {}
+        self._by_subject: Dict[Tuple[str, str], Dict[TupleKey, None]] = {}
+        self._by_relation: Dict[str, Dict[TupleKey, None]] = {}
+        self.projections = TupleProjections()
+
+    def __len__(self) -> int:
+        return len(self._tuples)
+
+    def refresh(self) -> bool:
+        """Перестраивает индексы, если данные изменились с момента последней загрузки."""
+        with self.lock:
+            signature = self.storage.signature("relationships")
+            if signature == self._signature and self._signature is not None:
+                return False
+
+            self._rebuild(self.storage.load_tuples())
+            self._signature = signature
+            return True
+
+    def _rebuild(self, tuples: List[Dict[str, Any]]):
+        """Полностью перестраивает индексы по списку отношений."""
+        self._tuples = {}
+        self._by_entity = {}
+        self._by_subject = {}
+        self._by_relation = {}
+        self.projections.clear()
+        for tuple_data in tuples:
+            key = tuple_key(tuple_data)
+            if key not in self._tuples:
+                self._index(key, tuple_data)
+
+    def _index(self, key: TupleKey, tuple_data: Dict[str, Any]):
+        self._tuples[key] = tuple_data
+        self._by_entity.setdefault((key[0], key[1]), {})[key] = None
+        self._by_subject.setdefault((key[3], key[4]), {})[key] = None
+        self._by_relation.setdefault(key[2], {})[key] = None
+        self.projections.add(key)
+
+    def _unindex(self, key: TupleKey) -> Dict[str, Any]:
+        tuple_data = self._tuples.pop(key)
+        self.projections.remove(key)
+        for index, index_key in ((self._by_entity, (key[0], key[1])),
+                                 (self._by_subject, (key[3], key[4])),
+                                 (self._by_relation, key[2])):
+            bucket = index.get(index_key)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[index_key]
+        return tuple_data
+
+    def mark_synced(self):
+        """Запоминает текущую версию данных после записи, чтобы не перечитывать их."""
+        with self.lock:
+            self._signature = self.storage.signature("relationships")
+
+    def invalidate(self):
+        """Заставляет перечитать данные из постоянного хранилища при следующем обращении."""
+        with self.lock:
+            self._signature = None
+
+    def replace_all(self, tuples: List[Dict[str, Any]]):
+        """Заменяет содержимое хранилища переданным списком отношений."""
+        with self.lock:
+            self._rebuild(tuples)
+
+    def contains(self, entity_type: str, entity_id: str, relation: str,
+                 subject_type: str, subject_id: str) -> bool:
+        """Проверяет существование отношения за O(1)."""
+        return (entity_type, entity_id, relation, subject_type, subject_id) in self._tuples
+
+    def add(self, tuple_data: Dict[str, Any]) -> bool:
+        """Добавляет отношение. Возвращает False, если оно уже существует."""
+        key = tuple_key(tuple_data)
+        with self.lock:
+            if key in self._tuples:
+                return False
+            self._index(key, tuple_data)
+            return True
+
+    def remove(self, key: TupleKey) -> Optional[Dict[str, Any]]:
+        """Удаляет отношение по ключу и возвращает его, если оно было найдено."""
+        with self.lock:
+            if key not in self._tuples:
+                return None
+            return self._unindex(key)
+
+    def find(self, entity_type: str = None, entity_id: str = None, relation: str = None,
+             subject_type: str = None, subject_id: str = None) -> List[Dict[str, Any]]:
+        """Находит отношения по любому сочетанию полей, используя самый узкий индекс."""
+        with self.lock:
+            candidates = []
+            if entity_type is not None and entity_id is not None:
+                candidates.append(self._by_entity.get((entity_type, entity_id), {}))
+            if subject_type is not None and subject_id is not None:
+                candidates.append(self._by_subject.get((subject_type, subject_id), {}))
+            if relation is not None:
+                candidates.append(self._by_relation.get(relation, {}))
+
+            keys = min(candidates, key=len) if candidates else self._tuples
+
+            result = []
+            for key in keys:
+                if ((entity_type is None or key[0] == entity_type) and
+                        (entity_id is None or key[1] == entity_id) and
+                        (relation is None or key[2] == relation) and
+                        (subject_type is None or key[3] == subject_type) and
+                        (subject_id is None or key[4] == subject_id)):
+                    result.append(self._tuples[key])
+            return result
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Возвращает все отношения в порядке добавления."""
+        with self.lock:
+            return list(self._tuples.values())
+
+    def user_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        """Возвращает группы и роли пользователей, встречающихся в отношениях."""
+        with self.lock:
+            return self.projections.user_views()
+
+    def group_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        """Возвращает участников и роли групп, встречающихся в отношениях."""
+        with self.lock:
+            return self.projections.group_views()
+
+    def app_views(self) -> Dict[Tuple[str, str], Dict[str, List[Any]]]:
+        """Возвращает пользователей и группы экземпляров приложений."""
+        with self.lock:
+            return self.projections.app_views()
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Возвращает отношения в формате relationships.json."""
+        return {"tuples": self.all()}
+
+
+class StagedTupleStore:
+    """Изменения отношений одной единицы работы поверх общего TupleStore.
+
+    Чтения видят общее хранилище вместе с накопленными изменениями, а сами изменения
+    попадают в общие индексы только после успешной записи в постоянное хранилище (apply),
+    поэтому другие сессии не видят незаписанных отношений, а перестроение общего
+    хранилища до записи их не теряет.
+    """
+
+    def __init__(self, base: TupleStore):
+        self.base = base
+        self.lock = base.lock
+        # ключ -> отношение (будет добавлено) или None (будет удалено)
+        self.pending: Dict[TupleKey, Optional[Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.all())
+
+    def contains(self, entity_type: str, entity_id: str, relation: str,
+                 subject_type: str, subject_id: str) -> bool:
+        key = (entity_type, entity_id, relation, subject_type, subject_id)
+        if key in self.pending:
+            return self.pending[key] is not None
+        return self.base.contains(*key)
+
+    def add(self, tuple_data: Dict[str, Any]) -> bool:
+        """Добавляет отношение. Возвращает False, если оно уже существует."""
+        key = tuple_key(tuple_data)
+        if self.contains(*key):
+            return False
+        self.pending[key] = tuple_data
+        return True
+
+    def remove(self, key: TupleKey) -> Optional[Dict[str, Any]]:
+        """Удаляет отношение по ключу и возвращает его, если оно было найдено."""
+        if not self.contains(*key):
+            return None
+        tuple_data = self.pending.get(key) or self.base._tuples[key]
+        self.pending[key] = None
+        return tuple_data
+
+    def find(self, entity_type: str = None, entity_id: str = None, relation: str = None,
+             subject_type: str = None, subject_id: str = None) -> List[Dict[str, Any]]:
+        result = [tuple_data for tuple_data in self.base.find(entity_type, entity_id, relation,
+                                                               subject_type, subject_id)
+                  if tuple_key(tuple_data) not in self.pending]
+        for key, tuple_data in self.pending.items():
+            if (tuple_data is not None and
+                    (entity_type is None or key[0] == entity_type) and
+                    (entity_id is None or key[1] == entity_id) and
+                    (relation is None or key[2] == relation) and
+                    (subject_type is None or key[3] == subject_type) and
+                    (subject_id is None or key[4] == subject_id)):
+                result.append(tuple_data)
+        return result
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self.find()
+
+    def _projections(self) -> TupleProjections:
+        projections = TupleProjections()
+        for tuple_data in self.all():
+            projections.add(tuple_key(tuple_data))
+        return projections
+
+    def user_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        return self._projections().user_views() if self.pending else self.base.user_views()
+
+    def group_views(self) -> Dict[str, Dict[str, List[Any]]]:
+        return self._projections().group_views() if self.pending else self.base.group_views()
+
+    def app_views(self) -> Dict[Tuple[str, str], Dict[str, List[Any]]]:
+        return self._projections().app_views() if self.pending else self.base.app_views()
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {"tuples": self.all()}
+
+    def changes(self) -> Tuple[List[Dict[str, Any]], List[TupleKey]]:
+        """Возвращает (добавленные отношения, ключи удаленных) относительно общего хранилища."""
+        with self.lock:
+            added = [tuple_data for key, tuple_data in self.pending.items()
+                     if tuple_data is not None and key not in self.base._tuples]
+            removed = [key for key, tuple_data in self.pending.items()
+                       if tuple_data is None and key in self.base._tuples]
+        return added, removed
+
+    def apply(self):
+        """Переносит изменения в общее хранилище (после успешной записи)."""
+        with self.lock:
+            for key, tuple_data in self.pending.items():
+                if tuple_data is None:
+                    self.base.remove(key)
+                else:
+                    self.base.add(tuple_data)
+            self.pending.clear()
+
+
+_stores: Dict[int, TupleStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_tuple_store(storage, refresh: bool = True) -> TupleStore:
+    """Возвращает общее для процесса хранилище отношений и обновляет его при изменении данных."""
+    with _stores_lock:
+        store = _stores.get(id(storage))
+        if store is None:
+            store = TupleStore(storage)
+            _stores[id(storage)] = store
+
+    # Новое или сброшенное хранилище загружается в любом случае
+    if refresh or store._signature is None:
+        store.refresh()
+    return store
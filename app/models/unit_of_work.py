@@ -0,0 +1,275 @@
+import copy
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Callable, Hashable, Iterable, List, Optional, Tuple
+
+from .storage import item_key
+from .tuple_store import StagedTupleStore, TupleStore
+
+
+class CommitFailed(Exception):
+    """Изменения единицы работы не удалось записать в хранилище."""
+
+
+class UnitOfWork:
+    """Снимок данных на время одного действия пользователя.
+
+    Каждый набор данных (пользователи, группы, приложения, отношения, список схем)
+    читается из хранилища или Permify не более одного раза, а изменения коллекций и
+    отношений накапливаются и записываются одним вызовом на набор при commit().
+    Изменения отношений видны только внутри единицы работы (StagedTupleStore) и попадают
+    в общий индекс после успешной записи. Модели обращаются к данным через функции этого
+    модуля: без активного контекста они работают напрямую с хранилищем, как раньше.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        # Произвольные закэшированные результаты: ключ -> значение
+        self._values: Dict[Hashable, Any] = {}
+        # (id хранилища, коллекция) -> (хранилище, список элементов)
+        self._collections: Dict[Tuple[int, str], Tuple[Any, List[Dict[str, Any]]]] = {}
+        # (id хранилища, коллекция) -> ключ элемента -> элемент или None (удаление)
+        self._pending_items: Dict[Tuple[int, str], Dict[str, Optional[Dict[str, Any]]]] = {}
+        # id хранилища -> (хранилище, изменения отношений поверх общего TupleStore)
+        self._pending_tuples: Dict[int, Tuple[Any, StagedTupleStore]] = {}
+        # Счетчик обращений к хранилищу и API, которые прошли мимо кэша
+        self.loads: Dict[str, int] = {}
+
+    def _count(self, name: str):
+        self.loads[name] = self.loads.get(name, 0) + 1
+
+    def cached(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Возвращает копию значения, загружая его при первом обращении."""
+        if key not in self._values:
+            self._count(str(key[0]) if isinstance(key, tuple) else str(key))
+            self._values[key] = loader()
+        return copy.deepcopy(self._values[key])
+
+    def discard(self, key: Hashable):
+        """Сбрасывает закэшированное значение (например, после записи новой схемы)."""
+        self._values.pop(key, None)
+
+    def touch(self, key: Hashable) -> bool:
+        """Отмечает однократное действие; возвращает True только при первом вызове."""
+        if key in self._values:
+            return False
+        self._count(str(key[0]) if isinstance(key, tuple) else str(key))
+        self._values[key] = True
+        return True
+
+    def _collection(self, storage, collection: str) -> List[Dict[str, Any]]:
+        cache_key = (id(storage), collection)
+        if cache_key not in self._collections:
+            self._count(collection)
+            self._collections[cache_key] = (storage, storage.load_items(collection))
+        return self._collections[cache_key][1]
+
+    def load_items(self, storage, collection: str) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._collection(storage, collection))
+
+    def upsert_items(self, storage, collection: str, items: List[Dict[str, Any]]):
+        current = self._collection(storage, collection)
+        positions = {item_key(collection, item): index for index, item in enumerate(current)}
+        pending = self._pending_items.setdefault((id(storage), collection), {})
+        for item in items:
+            key = item_key(collection, item)
+            item = copy.deepcopy(item)
+            if key in positions:
+                current[positions[key]] = item
+            else:
+                positions[key] = len(current)
+                current.append(item)
+            pending[key] = item
+
+    def delete_items(self, storage, collection: str, keys: Iterable[str]):
+        keys = set(keys)
+        current = self._collection(storage, collection)
+        current[:] = [item for item in current if item_key(collection, item) not in keys]
+        pending = self._pending_items.setdefault((id(storage), collection), {})
+        for key in keys:
+            pending[key] = None
+
+    def save_items(self, storage, collection: str, items: List[Dict[str, Any]]):
+        current = {item_key(collection, item) for item in self._collection(storage, collection)}
+        self.delete_items(storage, collection, current - {item_key(collection, item) for item in items})
+        self.upsert_items(storage, collection, items)
+
+    def has_pending(self) -> bool:
+        """Есть ли изменения, еще не записанные в хранилище."""
+        return (any(self._pending_items.values()) or
+                any(staged.pending for _, staged in self._pending_tuples.values()))
+
+    def tuple_store(self, storage, store: TupleStore) -> StagedTupleStore:
+        """Возвращает отношения хранилища с изменениями этой единицы работы."""
+        if id(storage) not in self._pending_tuples:
+            self._pending_tuples[id(storage)] = (storage, StagedTupleStore(store))
+        return self._pending_tuples[id(storage)][1]
+
+    def commit(self) -> bool:
+        """Записывает накопленные изменения: один вызов хранилища на коллекцию."""
+        saved = True
+        for cache_key, pending in list(self._pending_items.items()):
+            if not pending:
+                continue
+            storage, collection = self._collections[cache_key][0], cache_key[1]
+            upserts = [item for item in pending.values() if item is not None]
+            deletes = [key for key, item in pending.items() if item is None]
+            try:
+                if deletes and not storage.delete_items(collection, deletes):
+                    saved = False
+                if upserts and not storage.upsert_items(collection, upserts):
+                    saved = False
+            except Exception as e:
+                print(f"Ошибка при сохранении {collection}: {str(e)}")
+                saved = False
+        self._pending_items.clear()
+
+        for storage, staged in list(self._pending_tuples.values()):
+            if not staged.pending:
+                continue
+            try:
+                # Общий индекс меняется только после успешной записи и под его блокировкой
+                with staged.lock:
+                    added, removed = staged.changes()
+                    if storage.write_tuples(added, removed, staged.all):
+                        staged.apply()
+                        staged.base.mark_synced()
+                        continue
+            except Exception as e:
+                print(f"Ошибка при сохранении отношений: {str(e)}")
+            saved = False
+        self._pending_tuples.clear()
+
+        if self.loads:
+            print(f"DEBUG: Единица работы завершена, загрузки: {self.loads}")
+        return saved
+
+    def rollback(self):
+        """Отбрасывает накопленные изменения; общий индекс отношений не затрагивается."""
+        if self.has_pending():
+            print("DEBUG: Единица работы отменена, изменения не записаны")
+        self._pending_items.clear()
+        self._pending_tuples.clear()
+
+
+_current: ContextVar[Optional[UnitOfWork]] = ContextVar("permify_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """Возвращает активную единицу работы или None."""
+    return _current.get()
+
+
+@contextmanager
+def unit_of_work(isolated: bool = False):
+    """Открывает единицу работы; вложенные вызовы используют внешнюю.
+
+    Единица работы охватывает одно действие модели или контроллера (см. in_unit_of_work).
+    Изменения записываются при выходе из внешнего контекста; при исключении они
+    отбрасываются, а если запись не удалась, вызывается CommitFailed. isolated=True
+    открывает отдельную единицу работы даже внутри внешней (например, для загрузки
+    в другом потоке).
+    """
+    uow = None if isolated else _current.get()
+    if uow is not None:
+        uow.depth += 1
+        try:
+            yield uow
+        finally:
+            uow.depth -= 1
+        return
+
+    uow = UnitOfWork()
+    token = _current.set(uow)
+    try:
+        yield uow
+    except BaseException:
+        _current.reset(token)
+        uow.rollback()
+        raise
+    _current.reset(token)
+    if not uow.commit():
+        raise CommitFailed("Ошибка при сохранении изменений в локальное хранилище")
+
+
+def _failed_result(result: Any, message: str) -> Any:
+    """Переводит результат метода модели в ошибку, сохраняя его форму."""
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], bool):
+        # (успех, сообщение)
+        return False, message
+    if isinstance(result, list) and all(isinstance(item, tuple) and len(item) == 2 for item in result):
+        # Список (успех, сообщение) по элементам: успешные не сохранены
+        return [(False, message) if item[0] else item for item in result]
+    if isinstance(result, tuple) and len(result) == 3 and isinstance(result[2], list):
+        # (успешно, неудачно, ошибки)
+        return 0, result[0] + result[1], result[2] + [message]
+    # Прочие результаты (например, список get_apps, который лишь синхронизирует
+    # производные данные) возвращаются как есть, как и до единицы работы
+    return result
+
+
+def in_unit_of_work(method):
+    """Декоратор: выполняет метод модели внутри единицы работы.
+
+    Если накопленные изменения не удалось записать, результат метода заменяется ошибкой
+    той же формы ((False, сообщение), список таких пар или (0, неудачно, ошибки)):
+    действие в Permify уже выполнено, и сообщать об успехе нельзя.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        result = None
+        try:
+            with unit_of_work():
+                result = method(*args, **kwargs)
+        except CommitFailed as e:
+            print(f"DEBUG: {method.__qualname__}: {str(e)}")
+            return _failed_result(result, str(e))
+        return result
+    return wrapper
+
+
+def load_once(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Загружает значение один раз за единицу работы (без нее - при каждом вызове)."""
+    uow = _current.get()
+    if uow is None:
+        return loader()
+    return uow.cached(key, loader)
+
+
+def discard_loaded(key: Hashable):
+    """Сбрасывает значение в активной единице работы."""
+    uow = _current.get()
+    if uow is not None:
+        uow.discard(key)
+
+
+def load_items(storage, collection: str) -> List[Dict[str, Any]]:
+    uow = _current.get()
+    if uow is None:
+        return storage.load_items(collection)
+    return uow.load_items(storage, collection)
+
+
+def save_items(storage, collection: str, items: List[Dict[str, Any]]) -> bool:
+    uow = _current.get()
+    if uow is None:
+        return storage.save_items(collection, items)
+    uow.save_items(storage, collection, items)
+    return True
+
+
+def upsert_items(storage, collection: str, items: List[Dict[str, Any]]) -> bool:
+    uow = _current.get()
+    if uow is None:
+        return storage.upsert_items(collection, items)
+    uow.upsert_items(storage, collection, items)
+    return True
+
+
+def delete_items(storage, collection: str, keys: Iterable[str]) -> bool:
+    uow = _current.get()
+    if uow is None:
+        return storage.delete_items(collection, keys)
+    uow.delete_items(storage, collection, keys)
+    return True
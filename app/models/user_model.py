@@ -1,37 +1,35 @@
 from .base_model import BaseModel
 from .relationship_model import RelationshipModel
+from .storage import get_storage
+from .unit_of_work import delete_items, in_unit_of_work, load_items, save_items, upsert_items
 from typing import Dict, Any, List, Optional, Tuple, Union
-import os
-import json
+from app.registry import get_service
 
 class UserModel(BaseModel):
     """Модель для управления пользователями в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.relationship_model = RelationshipModel()
-        self.users_file = os.path.join(os.getcwd(), 'data', 'users.json')
-        
-        # Создаем директорию data, если она не существует
-        os.makedirs(os.path.dirname(self.users_file), exist_ok=True)
+        self.relationship_model = get_service(RelationshipModel)
+        # Постоянное хранилище (JSON-файлы или SQLite, см. STORAGE_BACKEND)
+        self.storage = get_storage()
     
     def _load_users(self) -> List[Dict[str, Any]]:
-        """Загружает список пользователей из файла."""
-        if not os.path.exists(self.users_file):
-            return []
-        
-        try:
-            with open(self.users_file, 'r') as f:
-                return json.load(f).get('users', [])
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        """Загружает список пользователей из хранилища."""
+        return load_items(self.storage, 'users')
     
     def _save_users(self, users: List[Dict[str, Any]]) -> bool:
-        """Сохраняет список пользователей в файл."""
+        """Сохраняет список пользователей в хранилище целиком."""
+        try:
+            return save_items(self.storage, 'users', users)
+        except Exception as e:
+            print(f"Ошибка при сохранении пользователей: {str(e)}")
+            return False
+    
+    def _upsert_user(self, user: Dict[str, Any]) -> bool:
+        """Добавляет или обновляет одну запись в хранилище."""
         try:
-            with open(self.users_file, 'w') as f:
-                json.dump({'users': users}, f, indent=2)
-            return True
+            return upsert_items(self.storage, 'users', [user])
         except Exception as e:
             print(f"Ошибка при сохранении пользователей: {str(e)}")
             return False
@@ -44,57 +42,27 @@ class UserModel(BaseModel):
         stored_users = self._load_users()
         users_dict = {user.get('id'): user for user in stored_users}
         
-        # Получаем информацию из отношений
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        
-        if success:
-            for tuple_data in relationships.get("tuples", []):
-                subject = tuple_data.get("subject", {})
-                entity = tuple_data.get("entity", {})
-                
-                # Добавляем пользователей из субъектов
-                if subject.get("type") == "user":
-                    user_id = subject.get("id")
-                    if user_id not in users_dict:
-                        users_dict[user_id] = {
-                            "id": user_id,
-                            "name": f"Пользователь {user_id}",
-                            "groups": [],
-                            "app_roles": []
-                        }
-                    
-                    # Если это связь с группой, добавляем группу пользователю
-                    if entity.get("type") == "group" and tuple_data.get("relation") == "member":
-                        group_id = entity.get("id")
-                        if group_id not in users_dict[user_id].get("groups", []):
-                            if "groups" not in users_dict[user_id]:
-                                users_dict[user_id]["groups"] = []
-                            users_dict[user_id]["groups"].append(group_id)
-                    
-                    # Если это связь с приложением, добавляем роль пользователю
-                    else:
-                        app_type = entity.get("type")
-                        app_id = entity.get("id")
-                        role = tuple_data.get("relation")
-                        
-                        if "app_roles" not in users_dict[user_id]:
-                            users_dict[user_id]["app_roles"] = []
-                        
-                        # Проверяем, нет ли уже такой роли
-                        existing_role = False
-                        for app_role in users_dict[user_id]["app_roles"]:
-                            if (app_role.get("app_type") == app_type and 
-                                app_role.get("app_id") == app_id and 
-                                app_role.get("role") == role):
-                                existing_role = True
-                                break
-                        
-                        if not existing_role:
-                            users_dict[user_id]["app_roles"].append({
-                                "app_type": app_type,
-                                "app_id": app_id,
-                                "role": role
-                            })
+        # Дополняем данными из отношений (представление поддерживается хранилищем отношений)
+        for user_id, view in self.relationship_model.get_user_views(tenant_id).items():
+            if user_id not in users_dict:
+                users_dict[user_id] = {
+                    "id": user_id,
+                    "name": f"Пользователь {user_id}",
+                    "groups": [],
+                    "app_roles": []
+                }
+            user = users_dict[user_id]
+            
+            if view["groups"]:
+                groups = user.setdefault("groups", [])
+                known_groups = set(groups)
+                groups.extend(group_id for group_id in view["groups"] if group_id not in known_groups)
+            
+            if view["app_roles"]:
+                app_roles = user.setdefault("app_roles", [])
+                known_roles = {(role.get("app_type"), role.get("app_id"), role.get("role")) for role in app_roles}
+                app_roles.extend(role for role in view["app_roles"]
+                                 if (role["app_type"], role["app_id"], role["role"]) not in known_roles)
         
         return list(users_dict.values())
     
@@ -115,10 +83,8 @@ class UserModel(BaseModel):
             "app_roles": []
         }
         
-        users.append(new_user)
-        
-        # Сохраняем обновленный список пользователей
-        if self._save_users(users):
+        # Сохраняем только новую запись
+        if self._upsert_user(new_user):
             return True, f"Пользователь {user_id} добавлен в систему"
         else:
             return False, "Ошибка при сохранении пользователя"
@@ -130,7 +96,7 @@ class UserModel(BaseModel):
         for i, user in enumerate(users):
             if user.get('id') == user_id:
                 users[i]['name'] = name
-                if self._save_users(users):
+                if self._upsert_user(users[i]):
                     return True, f"Информация о пользователе {user_id} обновлена"
                 else:
                     return False, "Ошибка при сохранении пользователя"
@@ -139,15 +105,12 @@ class UserModel(BaseModel):
     
     def delete_user(self, user_id: str) -> Tuple[bool, str]:
         """Удаляет пользователя из хранилища."""
-        users = self._load_users()
-        
-        users = [user for user in users if user.get('id') != user_id]
-        
-        if self._save_users(users):
+        if delete_items(self.storage, 'users', [user_id]):
             return True, f"Пользователь {user_id} удален из системы"
         else:
             return False, "Ошибка при удалении пользователя"
     
+    @in_unit_of_work
     def delete_user_with_relations(self, user_id: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет пользователя и все его отношения из системы."""
         tenant_id = tenant_id or self.default_tenant
@@ -157,36 +120,13 @@ class UserModel(BaseModel):
         if not delete_success:
             return delete_success, delete_message
         
-        # Получаем текущие отношения для нахождения всех связей пользователя
-        success, relationships = self.relationship_model.get_relationships(tenant_id)
-        if not success:
-            return True, f"Пользователь {user_id} удален, но не удалось получить отношения"
+        # Удаляем все отношения, где пользователь является субъектом
+        deleted_count, failed_count, errors = self.relationship_model.delete_relationships_by_filter(
+            subject_type="user", subject_ids=[user_id], tenant_id=tenant_id
+        )
         
-        # Собираем все отношения, где пользователь является субъектом
-        user_relationships = []
-        for tuple_data in relationships.get("tuples", []):
-            subject = tuple_data.get("subject", {})
-            
-            if subject.get("type") == "user" and subject.get("id") == user_id:
-                entity = tuple_data.get("entity", {})
-                relation = tuple_data.get("relation", "")
-                
-                user_relationships.append({
-                    "entity_type": entity.get("type"),
-                    "entity_id": entity.get("id"),
-                    "relation": relation,
-                    "subject_type": "user",
-                    "subject_id": user_id
-                })
-        
-        # Удаляем все отношения пользователя
-        if user_relationships:
-            deleted_count, failed_count, errors = self.relationship_model.delete_multiple_relationships(
-                user_relationships, tenant_id
-            )
-            
-            if failed_count > 0:
-                return True, f"Пользователь {user_id} удален, но {failed_count} из {deleted_count + failed_count} отношений не удалены"
+        if failed_count > 0:
+            return True, f"Пользователь {user_id} удален, но не удалось удалить его отношения в Permify: {'; '.join(errors)}"
         
         return True, f"Пользователь {user_id} и все его отношения успешно удалены"
     
@@ -230,6 +170,16 @@ class UserModel(BaseModel):
         # Добавляем отношение в Permify
         return self.relationship_model.assign_user_to_app(app_type, app_id, user_id, role, tenant_id)
     
+    @in_unit_of_work
+    def assign_app_roles(self, user_id: str, app_type: str, app_id: str, roles: List[str], tenant_id: str = None) -> List[Tuple[bool, str]]:
+        """Назначает пользователю несколько ролей в приложении одним пакетным запросом."""
+        # Если пользователь не существует, создаем его
+        if not any(user.get('id') == user_id for user in self._load_users()):
+            self.create_user(user_id, f"Пользователь {user_id}")
+        
+        # Добавляем отношения в Permify
+        return self.relationship_model.assign_user_roles_to_app(app_type, app_id, user_id, roles, tenant_id)
+    
     def remove_app_role(self, user_id: str, app_type: str, app_id: str, role: str, tenant_id: str = None) -> Tuple[bool, str]:
         """Удаляет роль пользователя в приложении."""
         return self.relationship_model.delete_relationship(app_type, app_id, role, "user", user_id, tenant_id) 
\ No newline at end of file
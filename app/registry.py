@@ -0,0 +1,37 @@
+import threading
+from typing import Dict, Any, Hashable, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+# (класс, tenant_id) -> экземпляр
+_services: Dict[Tuple[type, Hashable], Any] = {}
+# RLock: конструкторы сервисов сами получают зависимости через реестр
+_services_lock = threading.RLock()
+
+
+def get_service(cls: Type[T], tenant_id: Optional[str] = None) -> T:
+    """Возвращает общий для процесса экземпляр контроллера или модели.
+
+    Контроллеры и модели не хранят состояния между вызовами (данные лежат в хранилище,
+    а HTTP-клиент, хранилище и кэши схем и так общие), поэтому их можно создавать один
+    раз на процесс, а не на каждый перезапуск сценария Streamlit. Работает так же, как
+    st.cache_resource, но не зависит от Streamlit и доступен фоновым потокам.
+    Параметр tenant_id позволяет держать отдельный экземпляр для тенанта.
+    """
+    key = (cls, tenant_id)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = cls()
+                _services[key] = service
+    return service
+
+
+def reset_services(cls: Optional[type] = None):
+    """Удаляет созданные экземпляры (все или одного класса), например после смены настроек."""
+    with _services_lock:
+        for key in list(_services.keys()):
+            if cls is None or key[0] is cls:
+                del _services[key]
@@ -3,15 +3,16 @@ import pandas as pd
 from .base_view import BaseView
 from app.controllers import AppController, UserController, GroupController
 from .styles import get_dark_mode_styles
+from app.registry import get_service
 
 class AppView(BaseView):
     """Представление для управления приложениями в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.controller = AppController()
-        self.user_controller = UserController()
-        self.group_controller = GroupController()
+        self.controller = get_service(AppController)
+        self.user_controller = get_service(UserController)
+        self.group_controller = get_service(GroupController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс управления приложениями."""
@@ -1,12 +1,14 @@
 import streamlit as st
 from app.controllers import BaseController
+from app.controllers.prefetch import prefetch, PrefetchResult
 from app.views.styles import get_modern_styles
+from app.registry import get_service
 
 class BaseView:
     """Базовый класс для всех представлений с современным дизайном."""
     
     def __init__(self):
-        self.controller = BaseController()
+        self.controller = get_service(BaseController)
         # Убедимся, что стили загружены
         if 'styles_loaded' not in st.session_state:
             st.markdown(get_modern_styles(), unsafe_allow_html=True)
@@ -27,7 +29,8 @@ class BaseView:
     
     def show_status(self):
         """Отображает красивый индикатор статуса подключения к Permify."""
-        status, message = self.controller.check_permify_status()
+        # Статус берется из фонового монитора, без запроса к Permify на каждый прогон
+        status, message = self.controller.get_permify_status()
         if status:
             st.sidebar.success("✅ Permify доступен")
         else:
@@ -35,6 +38,14 @@ class BaseView:
         
         return status
     
+    def prefetch(self, loads, labels=None, timeout=None) -> PrefetchResult:
+        """Параллельно загружает данные страницы; о незагруженных сообщает предупреждением."""
+        result = prefetch(loads, timeout)
+        for name, reason in result.failed.items():
+            label = (labels or {}).get(name, name)
+            st.warning(f"⏳ Данные «{label}» не загружены ({reason}), страница показана частично")
+        return result
+    
     def get_tenant_id(self, view_name="default"):
         """Получает ID арендатора из session_state."""
         # Используем глобальное значение, которое установлено в main.py
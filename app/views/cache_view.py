@@ -1,13 +1,14 @@
 import streamlit as st
 from .base_view import BaseView
 from app.controllers import RedisController
+from app.registry import get_service
 
 class CacheView(BaseView):
     """Представление для управления кэшем Redis."""
     
     def __init__(self):
         super().__init__()
-        self.redis_controller = RedisController()
+        self.redis_controller = get_service(RedisController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс управления кэшем Redis."""
@@ -61,9 +62,37 @@ class CacheView(BaseView):
                 with col1:
                     st.metric("Всего ключей", stats.get("total_keys", 0))
                 with col2:
-                    st.metric("Ключи разрешений", stats.get("permission_keys", 0))
+                    permission_label = "Ключи разрешений (оценка)" if stats.get("estimated") else "Ключи разрешений"
+                    st.metric(permission_label, stats.get("permission_keys", 0))
+                    if stats.get("estimated") and stats.get("permission_keys_bounds"):
+                        low, high = stats["permission_keys_bounds"]
+                        st.caption(f"95% интервал: {low} – {high}")
                 with col3:
                     st.metric("Использование памяти", stats.get("memory_used", "Н/Д"))
+                    if stats.get("avg_key_memory") is not None:
+                        low, high = stats["avg_key_memory_bounds"]
+                        st.caption(f"В среднем {stats['avg_key_memory']} байт на ключ ({low} – {high})")
+                
+                if stats.get("sample_size"):
+                    with st.expander("Состав кэша (по выборке)"):
+                        st.caption(f"Выборка: {stats['sample_size']} случайных ключей за {stats['sample_duration']} с; "
+                                   f"ключей с TTL: {stats.get('keys_with_ttl', 0)}")
+                        
+                        prefix_rows = [{
+                            "Префикс": item["prefix"],
+                            "Доля": f"{item['share'] * 100:.1f}%",
+                            "Оценка ключей": item["estimated_keys"],
+                            "95% интервал": f"{item['bounds'][0]} – {item['bounds'][1]}"
+                        } for item in stats.get("prefixes", [])]
+                        if prefix_rows:
+                            st.markdown("**Распределение по префиксам**")
+                            st.table(prefix_rows)
+                        
+                        ttl_rows = [{"TTL": name, "Доля": f"{share * 100:.1f}%"}
+                                    for name, share in stats.get("ttl_distribution", {}).items()]
+                        if ttl_rows:
+                            st.markdown("**Распределение TTL**")
+                            st.table(ttl_rows)
         else:
             status_html = """
             <div style="background-color: rgba(220, 53, 69, 0.1); border: 1px solid rgba(220, 53, 69, 0.5); color: var(--text); padding: 1rem; border-radius: var(--radius); margin: 1rem 0;">
@@ -121,6 +150,66 @@ class CacheView(BaseView):
                 else:
                     st.error(f"❌ {message}")
         
+        # Выборочная очистка кэша
+        st.markdown("#### Выборочная очистка")
+        target_col1, target_col2 = st.columns([3, 1])
+        
+        with target_col1:
+            flush_target = st.radio(
+                "Очистить ключи",
+                ["Пользователя", "Сущности"],
+                horizontal=True,
+                key="cache_flush_target"
+            )
+            if flush_target == "Пользователя":
+                flush_user_id = st.text_input("ID пользователя", key="cache_flush_user_id")
+            else:
+                entity_col1, entity_col2 = st.columns(2)
+                with entity_col1:
+                    flush_entity_type = st.text_input("Тип сущности", key="cache_flush_entity_type")
+                with entity_col2:
+                    flush_entity_id = st.text_input("ID сущности", key="cache_flush_entity_id")
+            flush_in_background = st.checkbox("Выполнить в фоне", key="cache_flush_background",
+                                              help="Не ждать завершения очистки (для очень большого числа ключей)")
+        
+        with target_col2:
+            st.write("")
+            st.write("")
+            if st.button("🧹 Очистить", key="flush_target_redis_cache"):
+                progress_text = st.empty()
+                
+                def show_progress(deleted, pages):
+                    progress_text.caption(f"Удалено ключей: {deleted} (страниц SCAN: {pages})")
+                
+                progress_callback = None if flush_in_background else show_progress
+                if flush_target == "Пользователя" and flush_user_id:
+                    success, message = self.redis_controller.flush_user_permissions(
+                        flush_user_id, progress_callback, wait=not flush_in_background)
+                elif flush_target == "Сущности" and flush_entity_type and flush_entity_id:
+                    success, message = self.redis_controller.flush_entity_permissions(
+                        flush_entity_type, flush_entity_id, progress_callback, wait=not flush_in_background)
+                else:
+                    success, message = False, "Укажите, для кого очистить кэш"
+                
+                if success:
+                    st.success(f"✅ {message}")
+                else:
+                    st.error(f"❌ {message}")
+        
+        # Индексация ключей решений
+        if self.redis_controller.key_indexing:
+            st.markdown("#### Индексация ключей")
+            st.caption("Очистка по пользователю или сущности использует индексные множества. "
+                       "Ключи, записанные до включения индексации, нужно перенести в индекс.")
+            if st.button("📇 Проиндексировать существующие ключи", key="backfill_redis_key_index"):
+                progress_text = st.empty()
+                success, result = self.redis_controller.backfill_key_index(
+                    lambda indexed, pages: progress_text.caption(f"Проиндексировано ключей: {indexed} (страниц SCAN: {pages})"))
+                if success:
+                    st.success(f"✅ Проиндексировано ключей: {result['indexed']} за {result['duration']} с")
+                else:
+                    st.error(f"❌ {result.get('error')}")
+        
         # Расширенная информация
         with st.expander("Подробные сведения о Redis"):
             st.markdown("""
@@ -154,6 +243,7 @@ class CacheView(BaseView):
             - `REDIS_PORT`: порт сервера Redis
             - `REDIS_DB`: номер базы данных Redis
             - `REDIS_PASSWORD`: пароль для подключения к Redis
+            - `REDIS_KEY_INDEXING`: индексировать ключи решений в множествах `permidx|e|{entity_type}:{entity_id}` и `permidx|u|{user_id}`
             
             По умолчанию используется адрес `redis-ars` и порт `6379`.
             """) 
\ No newline at end of file
@@ -2,15 +2,16 @@ import streamlit as st
 import pandas as pd
 from .base_view import BaseView
 from app.controllers import GroupController, UserController, AppController
+from app.registry import get_service
 
 class GroupView(BaseView):
     """Представление для управления группами в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.controller = GroupController()
-        self.user_controller = UserController()
-        self.app_controller = AppController()
+        self.controller = get_service(GroupController)
+        self.user_controller = get_service(UserController)
+        self.app_controller = get_service(AppController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс управления группами."""
@@ -2,16 +2,17 @@ import streamlit as st
 import time
 from .base_view import BaseView
 from app.controllers import AppController, RelationshipController, UserController, SchemaController
+from app.registry import get_service
 
 class IndexView(BaseView):
     """Представление для главной страницы."""
     
     def __init__(self):
         super().__init__()
-        self.app_controller = AppController()
-        self.relationship_controller = RelationshipController()
-        self.user_controller = UserController()
-        self.schema_controller = SchemaController()
+        self.app_controller = get_service(AppController)
+        self.relationship_controller = get_service(RelationshipController)
+        self.user_controller = get_service(UserController)
+        self.schema_controller = get_service(SchemaController)
     
     def render(self, skip_status_check=False):
         """Отображает главную страницу."""
@@ -24,10 +25,16 @@ class IndexView(BaseView):
         
         tenant_id = self.get_tenant_id("index_view")
         
-        # Получаем данные
-        apps = self.app_controller.get_apps(tenant_id)
-        users = self.user_controller.get_users(tenant_id)
-        success, schema_result = self.schema_controller.get_current_schema(tenant_id)
+        # Получаем данные параллельно: медленный источник не задерживает остальные
+        data = self.prefetch({
+            "apps": lambda: self.app_controller.get_apps(tenant_id),
+            "users": lambda: self.user_controller.get_users(tenant_id),
+            "schema": lambda: self.schema_controller.get_current_schema(tenant_id),
+            "relationships": lambda: self.relationship_controller.get_relationships(tenant_id)
+        }, labels={"apps": "Приложения", "users": "Пользователи", "schema": "Схема", "relationships": "Отношения"})
+        apps = data.get("apps") or []
+        users = data.get("users") or []
+        schema_success, schema_result = data.get("schema", (False, None))
         
         # Колонки для метрик
         metrics_cols = st.columns(4)
@@ -38,13 +45,13 @@ class IndexView(BaseView):
         total_relationships = 0
         total_entities = 0
         
-        # Загружаем отношения
-        success, relationships = self.relationship_controller.get_relationships(tenant_id)
+        # Отношения
+        success, relationships = data.get("relationships", (False, None))
         if success:
             total_relationships = len(relationships.get('tuples', []))
         
-        # Загружаем сущности
-        if success and schema_result:
+        # Сущности
+        if schema_success and schema_result:
             schema_entities = self.schema_controller.extract_entities_info(schema_result)
             total_entities = len(schema_entities)
         
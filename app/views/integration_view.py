@@ -2,15 +2,16 @@ import streamlit as st
 import json
 from .base_view import BaseView
 from app.controllers import SchemaController, AppController, BaseController
+from app.registry import get_service
 
 class IntegrationView(BaseView):
     """Представление для страницы интеграции с примерами кода."""
     
     def __init__(self):
         super().__init__()
-        self.schema_controller = SchemaController()
-        self.app_controller = AppController()
-        self.base_controller = BaseController()
+        self.schema_controller = get_service(SchemaController)
+        self.app_controller = get_service(AppController)
+        self.base_controller = get_service(BaseController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс интеграции с примерами кода для разных языков."""
@@ -23,8 +24,12 @@ class IntegrationView(BaseView):
         tenant_id = self.get_tenant_id("integration_view")
         
         # Получаем данные
-        apps = self.app_controller.get_apps(tenant_id)
-        success, schema_result = self.schema_controller.get_current_schema(tenant_id)
+        data = self.prefetch({
+            "apps": lambda: self.app_controller.get_apps(tenant_id),
+            "schema": lambda: self.schema_controller.get_current_schema(tenant_id)
+        }, labels={"apps": "Приложения", "schema": "Схема"})
+        apps = data.get("apps") or []
+        success, schema_result = data.get("schema", (False, None))
         
         # Фильтруем только экземпляры приложений (не шаблоны)
         app_instances = [app for app in apps if not app.get('is_template', False) and app.get('id')]
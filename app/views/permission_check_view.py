@@ -2,18 +2,19 @@ import streamlit as st
 import pandas as pd
 from .base_view import BaseView
 from app.controllers import SchemaController, RelationshipController, UserController, GroupController, AppController, RedisController
+from app.registry import get_service
 
 class PermissionCheckView(BaseView):
     """Представление для проверки разрешений с современным дизайном."""
     
     def __init__(self):
         super().__init__()
-        self.schema_controller = SchemaController()
-        self.relationship_controller = RelationshipController()
-        self.user_controller = UserController()
-        self.group_controller = GroupController()
-        self.app_controller = AppController()
-        self.redis_controller = RedisController()
+        self.schema_controller = get_service(SchemaController)
+        self.relationship_controller = get_service(RelationshipController)
+        self.user_controller = get_service(UserController)
+        self.group_controller = get_service(GroupController)
+        self.app_controller = get_service(AppController)
+        self.redis_controller = get_service(RedisController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс проверки разрешений."""
@@ -35,8 +36,8 @@ class PermissionCheckView(BaseView):
                     st.error(f"Ошибка при сбросе кэша: {message}")
         
         # Получаем список доступных схем
-        schema_success, schema_result = self.schema_controller.get_current_schema(tenant_id)
-        schema = schema_result.get("schema", {}) if schema_result else {}
+        schema_success, schema_result = self.schema_controller.get_compiled_schema(tenant_id)
+        schema = schema_result if schema_success else None
         
         if schema_success:
             # Используем современную карточку для формы проверки
@@ -58,9 +59,7 @@ class PermissionCheckView(BaseView):
                 if schema:
                     # Получаем все типы сущностей из схемы
                     try:
-                        entity_definitions = schema.get("entity_definitions", {})
-                        
-                        entity_types = list(entity_definitions.keys())
+                        entity_types = schema.entity_types()
                         
                         # Выбор типа сущности
                         entity_type = st.selectbox("Тип сущности", entity_types, index=entity_types.index("petitions") if "petitions" in entity_types else 0)
@@ -86,10 +85,7 @@ class PermissionCheckView(BaseView):
                 permissions = []
                 if schema and entity_type in entity_types:
                     try:
-                        entity_def = schema.get("entity_definitions", {}).get(entity_type, {})
-                        permission_defs = entity_def.get("permissions", {})
-                        
-                        permissions = list(permission_defs.keys())
+                        permissions = schema.permissions(entity_type)
                         
                         if permissions:
                             permission = st.selectbox("Разрешение", permissions, key="perm_check_permission")
@@ -101,8 +97,11 @@ class PermissionCheckView(BaseView):
                 else:
                     permission = st.text_input("Разрешение", "view", key="perm_check_permission_manual")
                 
+                # Способ проверки: запрос к Permify, локальное вычисление или сравнение обоих
+                check_mode = st.radio("Способ проверки", ["Permify", "Локально", "Сравнить"],
+                                      horizontal=True, key="perm_check_mode")
+                
                 # Кнопка проверки с улучшенным UI
-                st.markdown("<br>", unsafe_allow_html=True)  # Добавляем вертикальное пространство
                 check_button = st.button("Проверить разрешение", key="check_permission_button", type="primary")
         
             # Проверка разрешения
@@ -110,11 +109,40 @@ class PermissionCheckView(BaseView):
                 st.markdown("#### Результат проверки")
                 
                 with st.spinner("Проверка разрешения..."):
-                    success, result = self.relationship_controller.check_permission(
-                        entity_type, entity_id, permission, subject_id, tenant_id)
+                    if check_mode == "Локально":
+                        success, result = self.relationship_controller.check_permission_local(
+                            entity_type, entity_id, permission, subject_id, tenant_id, subject_type)
+                    elif check_mode == "Сравнить":
+                        success, comparison = self.relationship_controller.compare_permission_checks([{
+                            "entity_type": entity_type, "entity_id": entity_id, "permission": permission,
+                            "subject_type": subject_type, "subject_id": subject_id
+                        }], tenant_id)
+                        result = comparison
+                        if success:
+                            item = comparison[0]
+                            result = {
+                                "can": "CHECK_RESULT_ALLOWED" if item["server"] else "CHECK_RESULT_DENIED",
+                                "comparison": item
+                            }
+                            if item["local"] is None:
+                                st.info(f"Локально не вычисляется: {item['local_error']}")
+                            elif item["match"]:
+                                st.info(f"Локальный результат совпадает с Permify")
+                            else:
+                                st.warning(f"Расхождение: локально {'разрешено' if item['local'] else 'запрещено'}, "
+                                           f"Permify: {item['error'] or ('разрешено' if item['server'] else 'запрещено')}")
+                    else:
+                        success, result = self.relationship_controller.check_permission(
+                            entity_type, entity_id, permission, subject_id, tenant_id)
                     
-                    if success:
-                        if result.get("can") == "CHECK_RESULT_ALLOWED":
+                    if success and result.get("can") == "CHECK_RESULT_UNSPECIFIED":
+                        # Локальная проверка не может вычислить атрибуты и правила схемы
+                        st.warning(f"Результат не вычисляется локально: "
+                                   f"{result.get('metadata', {}).get('error', '')}. Используйте проверку в Permify.")
+                        with st.expander("Подробные данные ответа"):
+                            st.json(result)
+                    elif success:
+                        if result.get("can") in (True, "CHECK_RESULT_ALLOWED"):
                             # Используем компонент карточки для успешного результата
                             success_html = f"""
                             <div style="background-color: rgba(40, 167, 69, 0.1); border: 1px solid rgba(40, 167, 69, 0.5); color: var(--text); padding: 1rem; border-radius: var(--radius); margin: 1rem 0;">
@@ -165,6 +193,26 @@ class PermissionCheckView(BaseView):
                         </div>
                         """
                         st.markdown(error_msg, unsafe_allow_html=True)
+            
+            # Массовая локальная проверка: кто из пользователей имеет разрешение на сущность
+            with st.expander("Аудит доступа (локальная проверка всех пользователей)"):
+                if st.button("Проверить всех пользователей", key="perm_check_audit_button") and entity_id:
+                    users = self.user_controller.get_users(tenant_id) or []
+                    checks = [{
+                        "entity_type": entity_type, "entity_id": entity_id, "permission": permission,
+                        "subject_type": "user", "subject_id": user.get("id")
+                    } for user in users]
+                    
+                    with st.spinner("Локальная проверка..."):
+                        audit_success, audit_results = self.relationship_controller.check_permissions_local(checks, tenant_id)
+                    
+                    if audit_success:
+                        st.dataframe(pd.DataFrame([{
+                            "Пользователь": item["subject_id"],
+                            "Доступ": "❔" if item["allowed"] is None else "✅" if item["allowed"] else "❌"
+                        } for item in audit_results]), use_container_width=True)
+                    else:
+                        st.error(f"Ошибка локальной проверки: {audit_results}")
         else:
             # Сообщение об ошибке схемы с улучшенным форматированием
             error_msg = f"""
@@ -202,9 +250,14 @@ class PermissionCheckView(BaseView):
                     st.error(f"Ошибка при сбросе кэша: {message}")
         
         # Получаем данные
-        users = self.user_controller.get_users(tenant_id) or []
-        groups = self.group_controller.get_groups(tenant_id) or []
-        apps = self.app_controller.get_apps(tenant_id) or []
+        data = self.prefetch({
+            "users": lambda: self.user_controller.get_users(tenant_id),
+            "groups": lambda: self.group_controller.get_groups(tenant_id),
+            "apps": lambda: self.app_controller.get_apps(tenant_id)
+        }, labels={"users": "Пользователи", "groups": "Группы", "apps": "Приложения"})
+        users = data.get("users") or []
+        groups = data.get("groups") or []
+        apps = data.get("apps") or []
         
         # Только приложения с экземплярами, не шаблоны
         app_instances = [app for app in apps if not app.get('is_template', False) and app.get('id')]
@@ -3,16 +3,17 @@ import pandas as pd
 from .base_view import BaseView
 from app.controllers import RelationshipController, AppController, UserController, GroupController
 from .styles import get_dark_mode_styles
+from app.registry import get_service
 
 class RelationshipView(BaseView):
     """Представление для управления отношениями между объектами в Permify."""
     
     def __init__(self):
         super().__init__()
-        self.relationship_controller = RelationshipController()
-        self.app_controller = AppController()
-        self.user_controller = UserController()
-        self.group_controller = GroupController()
+        self.relationship_controller = get_service(RelationshipController)
+        self.app_controller = get_service(AppController)
+        self.user_controller = get_service(UserController)
+        self.group_controller = get_service(GroupController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс управления отношениями."""
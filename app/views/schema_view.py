@@ -4,14 +4,15 @@ import os
 from pathlib import Path
 from .base_view import BaseView
 from app.controllers import SchemaController, AppController
+from app.registry import get_service
 
 class SchemaView(BaseView):
     """Представление для управления схемами в ручном режиме."""
     
     def __init__(self):
         super().__init__()
-        self.controller = SchemaController()
-        self.app_controller = AppController()
+        self.controller = get_service(SchemaController)
+        self.app_controller = get_service(AppController)
     
     def server_file_selector(self, folder_path='.', extensions=None):
         """Выбор файлов на сервере."""
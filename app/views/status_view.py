@@ -1,8 +1,9 @@
 import streamlit as st
 import requests
-import socket
 import os
+import pandas as pd
 from .base_view import BaseView
+from app.models.grpc_transport import grpc_health_check
 
 class StatusView(BaseView):
     """Представление для отображения статуса системы."""
@@ -21,6 +22,33 @@ class StatusView(BaseView):
         else:
             st.error(f"❌ Permify недоступен: {message}")
         
+        # Результаты фоновых проверок
+        health = self.controller.get_health_snapshot()
+        names = {"permify_rest": "Permify REST", "permify_grpc": "Permify gRPC", "redis": "Redis"}
+        st.dataframe(pd.DataFrame([{
+            "Компонент": label,
+            "Статус": "✅" if health[name]["status"] else ("❔" if health[name]["status"] is None else "❌"),
+            "Сообщение": health[name]["message"],
+            "Задержка, мс": health[name]["latency_last_ms"],
+            "Средняя, мс": health[name]["latency_avg_ms"],
+            "p95, мс": health[name]["latency_p95_ms"],
+            "Ошибок подряд": health[name]["consecutive_failures"]
+        } for name, label in names.items()]), use_container_width=True)
+        if health["breaker"]["state"] == "open":
+            st.warning("Запросы к Permify временно не выполняются: сервер не отвечает на проверки")
+        
+        with st.expander("Устойчивость запросов к Permify"):
+            metrics = self.controller.get_resilience_metrics()
+            breaker = metrics["breaker"]
+            st.write(f"**Автомат отказов:** {breaker['state']}"
+                     + (f" ({breaker['reason']}, повтор через {breaker['retry_in']} с)" if breaker["state"] != "closed" else ""))
+            cols = st.columns(4)
+            cols[0].metric("Вызовов", metrics["calls"])
+            cols[1].metric("Повторов", metrics["retries"])
+            cols[2].metric("Отклонено сразу", metrics["short_circuited"])
+            cols[3].metric("Превышен срок", metrics["deadline_exceeded"])
+            st.json(metrics)
+        
         # Информация о подключении
         permify_host = os.environ.get("PERMIFY_HOST", "http://localhost:9010")
         permify_grpc_host = os.environ.get("PERMIFY_GRPC_HOST", "http://localhost:9011")
@@ -28,6 +56,7 @@ class StatusView(BaseView):
         
         st.write(f"**REST API URL:** {permify_host}")
         st.write(f"**gRPC API URL:** {permify_grpc_host}")
+        st.write(f"**Транспорт запросов:** {os.environ.get('PERMIFY_TRANSPORT', 'rest')}")
         st.write(f"**Арендатор по умолчанию:** {default_tenant}")
         
         # Проверка статуса портов
@@ -45,16 +74,14 @@ class StatusView(BaseView):
         with col2:
             if st.button("Проверить gRPC API"):
                 try:
-                    host, port = permify_grpc_host.replace("http://", "").replace("https://", "").split(":")
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    result = sock.connect_ex((host, int(port)))
-                    if result == 0:
-                        st.success(f"✅ Порт {port} открыт")
+                    # Стандартная проверка grpc.health.v1 по общему HTTP/2-каналу
+                    status, message = grpc_health_check(permify_grpc_host)
+                    if status:
+                        st.success(f"✅ gRPC API доступен: {message}")
                     else:
-                        st.error(f"❌ Порт {port} закрыт")
-                    sock.close()
+                        st.error(f"❌ gRPC API недоступен: {message}")
                 except Exception as e:
-                    st.error(f"Ошибка проверки порта: {str(e)}")
+                    st.error(f"Ошибка проверки gRPC API: {str(e)}")
         
         # Системная информация
         st.subheader("Информация о системе")
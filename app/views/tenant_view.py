@@ -3,13 +3,15 @@ from .base_view import BaseView
 from app.controllers import BaseController
 import os
 from dotenv import load_dotenv
+from app.registry import get_service, reset_services
+from app.health_monitor import get_health_monitor
 
 class TenantView(BaseView):
     """Представление для управления арендаторами."""
     
     def __init__(self):
         super().__init__()
-        self.controller = BaseController()
+        self.controller = get_service(BaseController)
         # Загружаем переменные окружения
         load_dotenv()
     
@@ -139,8 +141,14 @@ class TenantView(BaseView):
             
             st.success("Настройки подключения обновлены")
             
-            # Проверяем статус после обновления
+            # Модели читают адреса Permify при создании, а экземпляры общие для процесса:
+            # пересоздаем их, чтобы новые адреса применились во всех сессиях и в мониторе
+            reset_services()
+            self.controller = get_service(BaseController)
+            
+            # Проверяем статус после обновления и обновляем фоновый монитор
             status, message = self.controller.check_permify_status()
+            get_health_monitor().refresh()
             if status:
                 st.success(f"✅ Успешное подключение к Permify: {message}")
             else:
@@ -2,15 +2,16 @@ import streamlit as st
 import pandas as pd
 from .base_view import BaseView
 from app.controllers import UserController, GroupController, AppController
+from app.registry import get_service
 
 class UserView(BaseView):
     """Представление для управления пользователями в упрощенном интерфейсе."""
     
     def __init__(self):
         super().__init__()
-        self.controller = UserController()
-        self.group_controller = GroupController()
-        self.app_controller = AppController()
+        self.controller = get_service(UserController)
+        self.group_controller = get_service(GroupController)
+        self.app_controller = get_service(AppController)
     
     def render(self, skip_status_check=False):
         """Отображает интерфейс управления пользователями."""
@@ -276,12 +277,11 @@ class UserView(BaseView):
                                         st.write(f"DEBUG: Роли для добавления: {roles_to_add}")
                                         st.write(f"DEBUG: Роли для удаления: {roles_to_remove}")
                                         
-                                        # Сначала добавляем новые роли
-                                        for role in roles_to_add:
-                                            success, message = self.controller.assign_app_role(
-                                                selected_user_id, app_type, app_id, role, tenant_id
-                                            )
-                                            
+                                        # Сначала добавляем новые роли одним пакетным запросом
+                                        add_results = self.controller.assign_app_roles(
+                                            selected_user_id, app_type, app_id, roles_to_add, tenant_id
+                                        ) if roles_to_add else []
+                                        for role, (success, message) in zip(roles_to_add, add_results):
                                             if not success:
                                                 st.warning(f"Не удалось добавить роль {role}: {message}")
                                         
@@ -0,0 +1,32 @@
+import asyncio
+
+from app.models.async_permify_client import AsyncPermifyClient
+
+
+class SlowWriteClient(AsyncPermifyClient):
+    def __init__(self, delay: float):
+        super().__init__("http://localhost:9010", concurrency=4, task_timeout=0.05)
+        self.delay = delay
+        self.timeouts = []
+
+    async def request(self, endpoint, data, method="post", timeout=None):
+        self.timeouts.append(timeout)
+        await asyncio.sleep(self.delay)
+        return True, {"snap_token": "t"}
+
+
+def test_write_many_waits_for_the_request_result():
+    client = SlowWriteClient(delay=0.2)
+
+    results = client.write_many_sync("t1", [[{"entity": {}}], [{"entity": {}}]])
+
+    # Запись дольше task_timeout не объявляется неудачной, пока запрос не завершился
+    assert results == [(True, {"snap_token": "t"})] * 2
+
+
+def test_write_many_timeout_applies_to_each_request():
+    client = SlowWriteClient(delay=0)
+
+    client.write_many_sync("t1", [[{"entity": {}}], [{"entity": {}}]], timeout=5)
+
+    assert client.timeouts == [5, 5]
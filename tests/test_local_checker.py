@@ -0,0 +1,102 @@
+from app.models.local_checker import LocalPermissionChecker, CHECK_ALLOWED, CHECK_DENIED, CHECK_UNDETERMINED
+from app.models.schema_compiler import compile_schema_text
+from app.models.storage import JsonStorage
+from app.models.tuple_store import TupleStore, make_tuple
+
+RECURSIVE_SCHEMA = """
+entity user {}
+entity folder {
+    relation parent @folder
+    relation viewer @user
+    permission view = parent.view or viewer
+}
+"""
+
+
+ABAC_SCHEMA = """
+entity user {}
+
+rule is_weekday(day string) {
+    day != "sunday"
+}
+
+entity doc {
+    relation viewer @user
+    attribute is_locked boolean
+    attribute day string
+    permission view = viewer not is_locked
+    permission edit = viewer and is_weekday(day)
+}
+"""
+
+NEGATED_CYCLE_SCHEMA = """
+entity user {}
+entity folder {
+    relation parent @folder
+    relation viewer @user
+    relation banned @user
+    permission view = viewer not parent.hidden
+    permission hidden = banned or parent.view
+}
+"""
+
+
+def make_checker(tmp_path, tuples, schema=RECURSIVE_SCHEMA):
+    store = TupleStore(JsonStorage(str(tmp_path)))
+    store.replace_all(tuples)
+    return LocalPermissionChecker(compile_schema_text(schema), store)
+
+
+def test_cycle_result_is_not_memoized_as_denied(tmp_path):
+    # a <-> b образуют цикл, доступ дает только a.viewer
+    checker = make_checker(tmp_path, [
+        make_tuple("folder", "a", "parent", "folder", "b"),
+        make_tuple("folder", "b", "parent", "folder", "a"),
+        make_tuple("folder", "a", "viewer", "user", "u1"),
+    ])
+
+    assert checker.check("folder", "a", "view", "user", "u1")["can"] == CHECK_ALLOWED
+    # b.view вычислялся, пока a.view был незавершен; результат не должен быть закэширован как False
+    assert checker.check("folder", "b", "view", "user", "u1")["can"] == CHECK_ALLOWED
+
+
+def test_cycle_without_grant_is_denied(tmp_path):
+    checker = make_checker(tmp_path, [
+        make_tuple("folder", "a", "parent", "folder", "b"),
+        make_tuple("folder", "b", "parent", "folder", "a"),
+    ])
+
+    assert checker.check("folder", "a", "view", "user", "u1")["can"] == CHECK_DENIED
+    assert checker.check("folder", "b", "view", "user", "u1")["can"] == CHECK_DENIED
+
+
+def test_attribute_under_exclusion_is_undetermined(tmp_path):
+    checker = make_checker(tmp_path, [make_tuple("doc", "d1", "viewer", "user", "u1")], ABAC_SCHEMA)
+
+    result = checker.check("doc", "d1", "view", "user", "u1")
+
+    assert result["can"] == CHECK_UNDETERMINED
+    assert "is_locked" in result["metadata"]["error"]
+    # Без отношения viewer атрибут не влияет на ответ
+    assert checker.check("doc", "d1", "view", "user", "u2")["can"] == CHECK_DENIED
+
+
+def test_rule_call_in_intersection_is_undetermined(tmp_path):
+    checker = make_checker(tmp_path, [make_tuple("doc", "d1", "viewer", "user", "u1")], ABAC_SCHEMA)
+
+    result = checker.check("doc", "d1", "edit", "user", "u1")
+
+    assert result["can"] == CHECK_UNDETERMINED
+    assert "is_weekday" in result["metadata"]["error"]
+    assert checker.check("doc", "d1", "edit", "user", "u2")["can"] == CHECK_DENIED
+
+
+def test_cycle_through_exclusion_is_undetermined(tmp_path):
+    # a.view = viewer not b.hidden, b.hidden = banned or a.view: допущение «a.view ложно» под not неверно
+    checker = make_checker(tmp_path, [
+        make_tuple("folder", "a", "parent", "folder", "b"),
+        make_tuple("folder", "b", "parent", "folder", "a"),
+        make_tuple("folder", "a", "viewer", "user", "u1"),
+    ], NEGATED_CYCLE_SCHEMA)
+
+    assert checker.check("folder", "a", "view", "user", "u1")["can"] == CHECK_UNDETERMINED
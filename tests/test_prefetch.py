@@ -0,0 +1,48 @@
+import time
+
+from app.controllers.prefetch import Prefetcher
+from app.models.resilience import remaining_budget, request_budget
+from app.models.unit_of_work import current_unit_of_work, unit_of_work
+
+
+def test_loaders_get_their_own_unit_of_work():
+    prefetcher = Prefetcher(max_workers=2, timeout=5)
+
+    with unit_of_work() as page_uow:
+        result = prefetcher.load({
+            "first": current_unit_of_work,
+            "second": current_unit_of_work
+        })
+
+    first, second = result.get("first"), result.get("second")
+    assert first is not None and second is not None
+    assert first is not page_uow and second is not page_uow and first is not second
+
+
+def test_slow_loader_is_reported_as_failed():
+    prefetcher = Prefetcher(max_workers=2, timeout=5)
+
+    result = prefetcher.load({"fast": lambda: 1, "slow": lambda: time.sleep(0.5)},
+                             timeouts={"slow": 0.05})
+
+    assert result.get("fast") == 1
+    assert not result.ok("slow") and "slow" in result.failed
+
+
+def test_loader_requests_are_bounded_by_its_deadline():
+    prefetcher = Prefetcher(max_workers=2, timeout=5)
+
+    result = prefetcher.load({"budget": remaining_budget, "short": remaining_budget},
+                             timeouts={"short": 0.5})
+
+    assert 4 < result.get("budget") <= 5
+    assert 0 < result.get("short") <= 0.5
+
+
+def test_loader_deadline_does_not_extend_page_budget():
+    prefetcher = Prefetcher(max_workers=2, timeout=5)
+
+    with request_budget(1):
+        result = prefetcher.load({"budget": remaining_budget})
+
+    assert result.get("budget") <= 1
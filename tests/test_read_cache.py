@@ -0,0 +1,26 @@
+from app.controllers.read_cache import ReadCache
+from app.models.storage import JsonStorage
+from app.models.unit_of_work import unit_of_work
+
+
+def test_reads_bypass_cache_while_unit_of_work_has_pending_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ReadCache(ttl=60)
+    storage = JsonStorage(str(tmp_path / "data"))
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get("apps", loader) == 1
+    assert cache.get("apps", loader) == 1
+
+    with unit_of_work() as uow:
+        uow.upsert_items(storage, "apps", [{"name": "crm"}])
+        # Незаписанные изменения: кэш не отдает и не сохраняет значение
+        assert cache.get("apps", loader) == 2
+        assert cache.get("apps", loader) == 3
+        uow.rollback()
+
+    assert cache.get("apps", loader) == 1
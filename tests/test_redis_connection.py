@@ -0,0 +1,14 @@
+import redis
+from redis.retry import Retry
+
+from app.controllers.redis_connection import RedisConnection
+
+
+def test_pool_connections_retry_on_connection_errors():
+    connection = RedisConnection("localhost", 6379, 0)
+
+    kwargs = connection.pool.connection_kwargs
+    assert isinstance(kwargs["retry"], Retry)
+    assert set(kwargs["retry_on_error"]) >= {redis.ConnectionError, redis.TimeoutError}
+    # Параметры доходят до соединений пула
+    assert connection.pool.make_connection().retry._retries == 2
@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+
+from app.controllers.redis_controller import (
+    RedisController, entity_index_key, permission_key, user_index_key
+)
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = RedisController()
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(controller.connection, "get_client", lambda: client)
+    controller.key_indexing = True
+    return controller
+
+
+def test_delete_indexed_removes_keys_and_both_index_entries(controller):
+    client = controller.redis_client
+    for user_id in ("u1", "u2"):
+        controller.cache_permission(user_id, "view", "doc", "d1", "1")
+    controller.cache_permission("u1", "view", "doc", "d2", "1")
+
+    success, result = controller.delete_indexed(entity_index_key("doc", "d1"))
+
+    assert success and result["deleted"] == 2
+    assert not client.exists(permission_key("u1", "view", "doc", "d1"))
+    assert client.exists(permission_key("u1", "view", "doc", "d2"))
+    assert client.smembers(user_index_key("u1")) == {permission_key("u1", "view", "doc", "d2")}
+    assert not client.exists(user_index_key("u2"))
+
+
+def test_delete_indexed_keeps_entries_added_during_scan(controller):
+    client = controller.redis_client
+    controller.cache_permission("u1", "view", "doc", "d1", "1")
+    added_key = permission_key("u2", "view", "doc", "d1")
+
+    def progress(deleted, pages):
+        # Решение записано другой сессией, пока идет обход индекса
+        controller.cache_permission("u2", "view", "doc", "d1", "1")
+
+    controller.delete_indexed(entity_index_key("doc", "d1"), progress)
+
+    assert client.exists(added_key)
+    assert client.smembers(entity_index_key("doc", "d1")) == {added_key}
+
+
+def test_sample_keys_is_exact_for_small_keyspace(controller):
+    client = controller.redis_client
+    for entity_id in range(5):
+        client.set(permission_key("u1", "view", "doc", str(entity_id)), "1", ex=30)
+    client.set("other", "1")
+
+    result = controller._sample_keys(client, client.dbsize(), sample_size=50, time_budget=5)
+
+    assert result["sample_size"] == 6 and not result["estimated"]
+    assert result["permission_keys"] == 5
+    assert result["ttl_distribution"]["без TTL"] == round(1 / 6, 4)
+
+
+def test_sample_keys_does_not_repeat_keys(controller):
+    client = controller.redis_client
+    for entity_id in range(20):
+        client.set(permission_key("u1", "view", "doc", str(entity_id)), "1")
+
+    result = controller._sample_keys(client, client.dbsize(), sample_size=10, time_budget=5)
+
+    assert result["sample_size"] == 10 and result["estimated"]
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from app.models import resilience
+from app.models.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, PermifyResilience, RetryBudget, request_budget
+)
+
+
+@pytest.fixture
+def layer():
+    return PermifyResilience("http://localhost:9010")
+
+
+def test_exhausted_budget_stops_reads_but_not_writes(layer):
+    timeouts = []
+
+    def operation(timeout):
+        timeouts.append(timeout)
+        return True, {}, False
+
+    with request_budget(0.001):
+        while resilience.remaining_budget() > 0:
+            pass
+        assert layer.call(operation, idempotent=True)[0] is False
+        assert layer.call(operation, idempotent=False) == (True, {})
+
+    assert timeouts == [layer.read_timeout]
+    assert layer.counters["deadline_exceeded"] == 1
+
+
+def make_breaker(**overrides):
+    options = dict(window=4, min_calls=2, error_rate=0.5, slow_call_seconds=1.0,
+                   slow_rate=0.5, open_seconds=0.05)
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def test_breaker_opens_on_error_rate_and_closes_after_successful_probe():
+    breaker = make_breaker()
+
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Пока пробный вызов выполняется, остальные не пропускаются
+    assert not breaker.allow()
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.status()["window_calls"] == 0
+
+
+def test_breaker_reopens_when_probe_fails_or_is_slow():
+    breaker = make_breaker()
+    breaker.record(False, 0.01)
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_breaker_opens_on_slow_calls_and_needs_min_calls():
+    breaker = make_breaker(min_calls=3)
+
+    breaker.record(True, 2.0)
+    breaker.record(True, 2.0)
+    assert breaker.state == CLOSED
+    breaker.record(True, 0.01)
+    assert breaker.state == OPEN and "медленных" in breaker.status()["reason"]
+
+
+def test_retry_budget_limits_retries_to_share_of_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=2)
+
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_retry_budget_refills_over_time():
+    budget = RetryBudget(ratio=0, min_per_second=100, max_tokens=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    time.sleep(0.02)
+    assert budget.withdraw()
+
+
+def test_idempotent_reads_are_retried_within_retry_budget(layer):
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        return (True, {}, False) if len(attempts) == 3 else (False, "Ошибка API: 503", True)
+
+    layer.base_delay = 0.001
+    assert layer.call(flaky, idempotent=True) == (True, {})
+    assert len(attempts) == 3 and layer.counters["retries"] == 2
+
+    attempts.clear()
+    assert layer.call(flaky, idempotent=False) == (False, "Ошибка API: 503")
+    assert len(attempts) == 1
+
+
+def test_call_does_not_start_health_monitor(layer):
+    from app import health_monitor
+
+    assert layer.call(lambda timeout: (True, {}, False)) == (True, {})
+    assert health_monitor._health_monitor is None
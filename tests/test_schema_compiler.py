@@ -0,0 +1,146 @@
+from app.models.schema_compiler import compile_schema, compile_schema_text, diff_schemas
+
+ABAC_TEXT = """
+entity user {}
+
+rule check_balance(balance double) {
+    balance >= 100
+}
+
+entity account {
+    relation owner @user
+    attribute is_public boolean
+    attribute balance double
+    permission view = owner or is_public
+    permission withdraw = owner and check_balance(balance)
+}
+"""
+
+ABAC_JSON = {
+    "version": "v1",
+    "schema": {
+        "entity_definitions": {
+            "user": {},
+            "account": {
+                "relations": {"owner": {"relation_references": [{"type": "user"}]}},
+                "attributes": {"is_public": {"type": "ATTRIBUTE_TYPE_BOOLEAN"}, "balance": {"type": "ATTRIBUTE_TYPE_DOUBLE"}},
+                "permissions": {
+                    "view": {"child": {"rewrite": {"rewrite_operation": "OPERATION_UNION", "children": [
+                        {"leaf": {"computed_user_set": {"relation": "owner"}}},
+                        {"leaf": {"computed_attribute": {"name": "is_public"}}}
+                    ]}}},
+                    "withdraw": {"child": {"rewrite": {"rewrite_operation": "OPERATION_INTERSECTION", "children": [
+                        {"leaf": {"computed_user_set": {"relation": "owner"}}},
+                        {"leaf": {"call": {"rule_name": "check_balance", "arguments": [
+                            {"computed_attribute": {"name": "balance"}}
+                        ]}}}
+                    ]}}}
+                }
+            }
+        },
+        "rule_definitions": {
+            "check_balance": {
+                "name": "check_balance",
+                "arguments": {"balance": "ATTRIBUTE_TYPE_DOUBLE"},
+                "expression": {"expr": {"call_expr": {"function": "_>=_"}}}
+            }
+        }
+    }
+}
+
+BASE_TEXT = """
+entity user {}
+entity group {
+    relation member @user
+    relation manager @user
+    permission view = member or manager
+}
+entity doc {
+    relation owner @user
+    relation team @group
+    permission edit = owner
+    permission view = team.view or edit
+    permission remove = owner
+}
+"""
+
+
+def test_fingerprint_matches_between_json_and_text_for_abac_schema():
+    assert compile_schema(ABAC_JSON).fingerprint() == compile_schema_text(ABAC_TEXT).fingerprint()
+
+
+def test_fingerprint_ignores_formatting_and_order():
+    reordered = """
+    entity doc {
+        relation team @group
+        relation owner @user
+        permission remove = owner
+        permission view = edit or team.view
+        permission edit = owner
+    }
+    entity group { relation manager @user  relation member @user  permission view = manager or member }
+    entity user {}
+    """
+    assert compile_schema_text(BASE_TEXT).fingerprint() == compile_schema_text(reordered).fingerprint()
+
+
+def test_diff_propagates_changes_through_tuple_to():
+    changed = BASE_TEXT.replace("permission view = member or manager", "permission view = member")
+
+    assert diff_schemas(compile_schema_text(BASE_TEXT), compile_schema_text(changed)) == {
+        "doc": ["view"], "group": ["view"]
+    }
+
+
+def test_diff_of_identical_schemas_is_empty():
+    assert diff_schemas(compile_schema_text(BASE_TEXT), compile_schema_text(BASE_TEXT)) == {}
+
+
+def test_diff_reports_added_and_removed_names():
+    changed = BASE_TEXT.replace("permission remove = owner", "permission share = owner")
+
+    assert diff_schemas(compile_schema_text(BASE_TEXT), compile_schema_text(changed)) == {
+        "doc": ["remove", "share"]
+    }
+
+
+def test_diff_without_previous_schema_reports_everything():
+    changes = diff_schemas(None, compile_schema_text(BASE_TEXT))
+
+    assert changes["doc"] == ["edit", "owner", "remove", "team", "view"]
+    assert changes["group"] == ["manager", "member", "view"]
+
+
+RULE_TEXT = """
+entity user {}
+
+rule allowed_ip(ip string) {
+    ip == "10.0.0.1"
+}
+
+entity server {
+    relation admin @user
+    attribute ip string
+    permission reboot = admin and allowed_ip(ip)
+    permission view = admin
+}
+"""
+
+
+def test_diff_marks_permissions_using_a_changed_rule_body():
+    old = compile_schema_text(RULE_TEXT)
+    new = compile_schema_text(RULE_TEXT.replace('"10.0.0.1"', '"0.0.0.0"'))
+
+    assert diff_schemas(old, new) == {"server": ["reboot"]}
+
+
+def test_diff_marks_permissions_using_a_retyped_attribute():
+    old = compile_schema_text(RULE_TEXT)
+    new = compile_schema_text(RULE_TEXT.replace("attribute ip string", "attribute ip string[]"))
+
+    assert diff_schemas(old, new) == {"server": ["reboot"]}
+
+
+def test_rule_dependencies_compared_across_sources_are_treated_as_changed():
+    # Тело правила из ответа Permify (CEL) несравнимо с текстом: разрешение с вызовом считается измененным
+    assert diff_schemas(compile_schema(ABAC_JSON), compile_schema_text(ABAC_TEXT)) == {"account": ["withdraw"]}
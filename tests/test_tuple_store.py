@@ -0,0 +1,62 @@
+from app.models.storage import JsonStorage
+from app.models.tuple_store import TupleStore, make_tuple, tuple_key
+
+TUPLES = [
+    make_tuple("group", "admins", "member", "user", "u1"),
+    make_tuple("group", "admins", "member", "user", "u2"),
+    make_tuple("crm", "main", "admin", "user", "u1"),
+    make_tuple("crm", "main", "member", "group", "admins"),
+    make_tuple("crm", "main", "group_admin", "group", "admins"),
+    make_tuple("erp", "prod", "viewer", "user", "u3"),
+]
+
+
+def normalize(views):
+    """Порядок элементов после добавлений и удалений может отличаться от порядка файла."""
+    return {key: {field: sorted(map(repr, values)) for field, values in view.items()}
+            for key, view in views.items()}
+
+
+def snapshot(store):
+    return {
+        "tuples": sorted(tuple_key(t) for t in store.all()),
+        "by_entity": {key: set(bucket) for key, bucket in store._by_entity.items()},
+        "by_subject": {key: set(bucket) for key, bucket in store._by_subject.items()},
+        "by_relation": {key: set(bucket) for key, bucket in store._by_relation.items()},
+        "user_views": normalize(store.user_views()),
+        "group_views": normalize(store.group_views()),
+        "app_views": normalize(store.app_views()),
+    }
+
+
+def test_incremental_updates_match_full_rebuild(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    incremental = TupleStore(storage)
+    incremental.replace_all(TUPLES)
+
+    incremental.remove(tuple_key(TUPLES[1]))
+    incremental.remove(tuple_key(TUPLES[3]))
+    incremental.remove(tuple_key(TUPLES[5]))
+    incremental.add(make_tuple("group", "admins", "member", "user", "u4"))
+    incremental.add(TUPLES[3])
+    assert not incremental.add(TUPLES[0])
+    assert incremental.remove(tuple_key(TUPLES[5])) is None
+
+    expected = TupleStore(storage)
+    expected.replace_all([TUPLES[0], TUPLES[2], TUPLES[3], TUPLES[4],
+                          make_tuple("group", "admins", "member", "user", "u4")])
+
+    assert snapshot(incremental) == snapshot(expected)
+    # Пустые корзины индексов и представлений удаляются
+    assert ("erp", "prod") not in incremental._by_entity
+    assert "u3" not in incremental.user_views() and ("erp", "prod") not in incremental.app_views()
+
+
+def test_find_uses_indexes_consistently(tmp_path):
+    store = TupleStore(JsonStorage(str(tmp_path)))
+    store.replace_all(TUPLES)
+
+    assert store.find(subject_type="group", subject_id="admins", relation="member") == [TUPLES[3]]
+    assert store.find(entity_type="crm", entity_id="main", subject_type="user", subject_id="u1") == [TUPLES[2]]
+    assert store.find(relation="member") == [TUPLES[0], TUPLES[1], TUPLES[3]]
+    assert store.contains("group", "admins", "member", "user", "u2")
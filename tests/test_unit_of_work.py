@@ -0,0 +1,81 @@
+import pytest
+
+from app.models.storage import JsonStorage
+from app.models.tuple_store import get_tuple_store, make_tuple, tuple_key
+from app.models.unit_of_work import CommitFailed, current_unit_of_work, in_unit_of_work, unit_of_work
+
+VIEWER = make_tuple("folder", "a", "viewer", "user", "u1")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = JsonStorage(str(tmp_path))
+    storage.write_tuples([make_tuple("folder", "a", "owner", "user", "u0")], [],
+                         lambda: [make_tuple("folder", "a", "owner", "user", "u0")])
+    return storage
+
+
+def test_staged_tuples_reach_shared_store_only_after_commit(storage):
+    shared = get_tuple_store(storage)
+
+    with unit_of_work() as uow:
+        staged = uow.tuple_store(storage, shared)
+        assert staged.add(VIEWER)
+        assert staged.contains(*tuple_key(VIEWER))
+        assert "u1" in staged.user_views()
+        # Другие сессии не видят незаписанное отношение, а перечитывание его не теряет
+        assert not shared.contains(*tuple_key(VIEWER))
+        shared.invalidate()
+        shared.refresh()
+        assert staged.contains(*tuple_key(VIEWER))
+
+    assert shared.contains(*tuple_key(VIEWER))
+    assert tuple_key(VIEWER) in {tuple_key(t) for t in storage.load_tuples()}
+
+
+def test_exception_discards_pending_tuples(storage):
+    shared = get_tuple_store(storage)
+
+    with pytest.raises(RuntimeError):
+        with unit_of_work() as uow:
+            staged = uow.tuple_store(storage, shared)
+            staged.add(VIEWER)
+            staged.remove(("folder", "a", "owner", "user", "u0"))
+            raise RuntimeError("render failed")
+
+    assert not shared.contains(*tuple_key(VIEWER))
+    assert shared.contains("folder", "a", "owner", "user", "u0")
+    assert [tuple_key(t) for t in storage.load_tuples()] == [("folder", "a", "owner", "user", "u0")]
+
+
+class FailingTupleStorage(JsonStorage):
+    def write_tuples(self, added, removed, snapshot=None):
+        return False
+
+
+def test_failed_commit_raises_and_keeps_shared_store(tmp_path):
+    storage = FailingTupleStorage(str(tmp_path))
+    shared = get_tuple_store(storage)
+
+    with pytest.raises(CommitFailed):
+        with unit_of_work() as uow:
+            uow.tuple_store(storage, shared).add(VIEWER)
+
+    assert not shared.contains(*tuple_key(VIEWER))
+
+
+def test_in_unit_of_work_reports_failed_commit_in_result_shape(tmp_path):
+    storage = FailingTupleStorage(str(tmp_path))
+    shared = get_tuple_store(storage)
+
+    def action(result):
+        @in_unit_of_work
+        def write():
+            current_unit_of_work().tuple_store(storage, shared).add(VIEWER)
+            return result
+        return write()
+
+    assert action((True, "Отношение успешно создано")) == (
+        False, "Ошибка при сохранении изменений в локальное хранилище")
+    assert [ok for ok, _ in action([(True, "создано"), (False, "ошибка API")])] == [False, False]
+    assert action((2, 0, []))[:2] == (0, 2)